@@ -51,8 +51,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
 # This application object is used by any ASGI server configured to use this file.
 django_application = get_asgi_application()
 
+from scram.route_manager.caches import active_routes  # noqa: E402
+
 from . import routing as scram_routing  # noqa: E402
 
+# Start building the index of active routes now, rather than on the first is_active lookup
+active_routes.warm()
+
 ws_application = URLRouter(scram_routing.websocket_urlpatterns)
 
 # Events are published to a specific channel via api/views.py.
@@ -2,12 +2,18 @@
 
 import logging
 import time
+from datetime import timedelta
+from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
 from django.core.cache import cache
+from django.db.models import Q
 
-from scram.route_manager.models import Entry, WebSocketSequenceElement
+from scram.route_manager.dispatch import ADD, dispatch_plans
+from scram.route_manager.messaging import BATCH_MESSAGE_TYPES, shard_of
+from scram.route_manager.models import Entry, TranslatorEvent
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +26,14 @@ class TranslatorConsumer(AsyncJsonWebsocketConsumer):
         logger.info("Translator connected")
         self.actiontype = self.scope["url_route"]["kwargs"]["actiontype"]
         self.translator_group = f"translator_{self.actiontype}"
+        self.capabilities = self.parse_capabilities(self.scope["query_string"])
+        self.last_seq = self.parse_last_seq(self.scope["query_string"])
+        try:
+            self.shard = self.parse_shard(self.scope["query_string"])
+        except ValueError as e:
+            logger.warning("Rejecting a %s translator: %s", self.actiontype, e)
+            await self.close()
+            return
 
         await self.channel_layer.group_add(self.translator_group, self.channel_name)
         await self.accept()
@@ -31,32 +45,266 @@ class TranslatorConsumer(AsyncJsonWebsocketConsumer):
 
         await database_sync_to_async(update_connect_cache)()
 
-        # Filter WebSocketSequenceElements by actiontype
-        elements = await database_sync_to_async(list)(
-            WebSocketSequenceElement.objects.filter(
-                action_type__name=self.actiontype
-            ).order_by("order_num"),
-        )
-        if not elements:
-            logger.warning("No elements found for actiontype=%s.", self.actiontype)
+        rebalancing = await database_sync_to_async(self.record_shards)()
+        if "resume" in self.capabilities and not rebalancing and await self.resume():
             return
 
-        # Avoid lazy evaluation
-        routes = await database_sync_to_async(list)(
-            Entry.objects.filter(is_active=True).values_list("route__route", flat=True)
+        if "reconcile" in self.capabilities:
+            # The translator will hold on to the replay, and then apply only the difference from what it has
+            await self.send_json({"type": "translator_reconcile_start", "message": {}})
+            replayed = await self.replay_active_entries()
+            await self.send_json(
+                {
+                    "type": "translator_reconcile_end",
+                    "message": {"routes": replayed},
+                }
+            )
+        else:
+            await self.replay_active_entries()
+
+    @staticmethod
+    def parse_capabilities(query_string):
+        """Return the set of optional protocol features a translator asked for when it connected.
+
+        Translators list them in the query string of the URL they connect to, e.g. ?capabilities=reconcile, and
+        older translators don't send any.
+        """
+        params = parse_qs(query_string.decode())
+        return {
+            capability
+            for value in params.get("capabilities", [])
+            for capability in value.split(",")
+            if capability
+        }
+
+    @staticmethod
+    def parse_last_seq(query_string):
+        """Return the sequence number of the last event a translator applied, if it told us when it connected.
+
+        Translators that ask for the "resume" capability send it as ?last_seq=, unless they've just started.
+        """
+        values = parse_qs(query_string.decode()).get("last_seq", [])
+        try:
+            return int(values[-1])
+        except (IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def parse_shard(query_string):
+        """Return which shard of its actiontype's routes a translator announces, and out of how many.
+
+        Translators that split a table between them connect with ?shard=&shards=, and are only sent the routes
+        shard_of() gives to their shard. Translators that don't send them get every route.
+
+        Returns:
+            tuple[int, int] | None: The shard and the number of shards, or None if it gets every route.
+
+        Raises:
+            ValueError: If they aren't numbers, or the shard isn't one of the shards.
+        """
+        params = parse_qs(query_string.decode())
+        if "shards" not in params:
+            return None
+        shard = int(params.get("shard", ["0"])[-1])
+        shards = int(params["shards"][-1])
+        if not 0 <= shard < shards:
+            msg = f"shard {shard} isn't one of {shards} shards"
+            raise ValueError(msg)
+        return shard, shards
+
+    def record_shards(self):
+        """Keep the number of shards our translator splits its actiontype into, for the health check.
+
+        When that changes, every route's owner may have too, so a translator that's sharded differently from the last
+        one to connect as its shard has to be replayed everything it now owns, rather than resume, to withdraw what it
+        no longer does and announce what it's been given. We keep that for each shard, rather than the actiontype, so
+        each of them is replayed as it's restarted with the new number, not only the first. A translator that isn't
+        sharded counts as the only shard.
+
+        Returns:
+            bool: Whether the number of shards changed.
+        """
+        shard, shards = self.shard or (0, 1)
+        if self.shard is not None:
+            cache.set(f"translator_shards:{self.actiontype}", shards, timeout=None)
+        key = self.cache_key("shards")
+        previous = cache.get(key)
+        cache.set(key, shards, timeout=None)
+        if previous is None or previous == shards:
+            return False
+        logger.warning(
+            "%s translator %d went from %d to %d shards, replaying everything to rebalance",
+            self.actiontype,
+            shard,
+            previous,
+            shards,
+        )
+        return True
+
+    def cache_key(self, name):
+        """Return the cache key we keep something about our translator under, e.g. its heartbeat stats.
+
+        Each shard's translator has its own, so they don't overwrite each other's; one that isn't sharded is shard 0.
+        """
+        shard, _ = self.shard or (0, 1)
+        return f"translator_{name}:{self.actiontype}:{shard}"
+
+    def owns(self, route):
+        """Return whether our translator announces a route, which it does unless it's sharded and another shard does.
+
+        Anything that isn't a route goes to every shard, and their translators can complain about it.
+        """
+        if self.shard is None or route is None:
+            return True
+        shard, shards = self.shard
+        try:
+            return shard_of(route, shards) == shard
+        except ValueError:
+            return True
+
+    async def resume(self):
+        """Send this translator only the events it missed since the last one it applied, if we still have them.
+
+        Returns:
+            bool: Whether we could, or whether it needs every active entry replayed instead.
+        """
+        started = time.monotonic()
+        missed = await database_sync_to_async(self._missed_events)(self.last_seq)
+        if missed is None:
+            logger.info(
+                "Can't resume a %s translator from event %s, replaying everything",
+                self.actiontype,
+                self.last_seq,
+            )
+            return False
+
+        for event in missed:
+            await self.send_event(event)
+        elapsed = time.monotonic() - started
+        logger.info(
+            "Resumed a %s translator from event %s with %d events in %.2fs",
+            self.actiontype,
+            self.last_seq,
+            len(missed),
+            elapsed,
+        )
+        await database_sync_to_async(cache.set)(
+            self.cache_key("resume"),
+            {
+                "from": self.last_seq,
+                "events": len(missed),
+                "seconds": elapsed,
+                "finished": time.time(),
+            },
+            timeout=None,
+        )
+        return True
+
+    def _missed_events(self, last_seq):
+        """Return the events for our group since last_seq, or None if we can't tell what the translator missed.
+
+        The events recorded in the overlap before last_seq, last_seq included, are sent again along with them, in
+        order, so that one of them applied again is never left undoing a later one.
+
+        We can't tell if the event has been pruned, or was never ours (e.g. the database has been restored since),
+        and we don't try if there are more than TRANSLATOR_RESUME_MAX_EVENTS of them.
+        """
+        if last_seq is None:
+            return None
+        events = TranslatorEvent.objects.filter(group=self.translator_group)
+        last = events.filter(seq=last_seq).first()
+        if last is None:
+            return None
+
+        overlap = last.created - timedelta(seconds=settings.TRANSLATOR_RESUME_OVERLAP)
+        missed = list(
+            events.filter(Q(seq__gt=last_seq) | Q(created__gte=overlap))
+            .order_by("seq")
+            .values_list("seq", "event")[: settings.TRANSLATOR_RESUME_MAX_EVENTS + 1]
+        )
+        if len(missed) > settings.TRANSLATOR_RESUME_MAX_EVENTS:
+            return None
+        return [{**event, "seq": seq} for seq, event in missed]
+
+    def _latest_seq(self):
+        """Return the sequence number of the last event sent to our group, if we have any."""
+        return (
+            TranslatorEvent.objects.filter(group=self.translator_group)
+            .order_by("-seq")
+            .values_list("seq", flat=True)
+            .first()
+        )
+
+    async def replay_active_entries(self):
+        """Send this translator everything that should currently be announced for its actiontype.
+
+        Routes are read in keyset-paginated chunks of TRANSLATOR_REPLAY_CHUNK_SIZE, so we only ever hold one chunk
+        of routes and frames in memory, and each send waits on the websocket before we build the next frame. How far
+        we've got is logged after each chunk, and the totals are kept in the cache for the health check.
+
+        Translators that can resume get the number of the last event sent before we started with each frame, so that
+        once they've applied the replay they can resume from there.
+
+        Returns:
+            int: The number of routes replayed.
+        """
+        plan = await database_sync_to_async(dispatch_plans.get_plan)(
+            self.actiontype, ADD
         )
+        if not plan.steps:
+            logger.warning("No elements found for actiontype=%s.", self.actiontype)
+            return 0
 
-        for route in routes:
-            for element in elements:
-                msg = await database_sync_to_async(lambda e: e.websocketmessage)(
-                    element
+        started = time.monotonic()
+        head = None
+        if "resume" in self.capabilities:
+            head = await database_sync_to_async(self._latest_seq)()
+        replayed = 0
+        last_pk = 0
+        while chunk := await database_sync_to_async(self._active_routes_after)(last_pk):
+            routes = [route for _, route in chunk if self.owns(route)]
+            for _, message in plan.batch_events(routes):
+                await self.send_event(
+                    message if head is None else {**message, "seq": head}
                 )
-                msg.msg_data[msg.msg_data_route_field] = str(route)
-                await self.send_json({"type": msg.msg_type, "message": msg.msg_data})
+            replayed += len(routes)
+            last_pk = chunk[-1][0]
+            logger.info(
+                "Replayed %d routes to a %s translator so far",
+                replayed,
+                self.actiontype,
+            )
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            "Replayed %d routes to a %s translator in %.2fs",
+            replayed,
+            self.actiontype,
+            elapsed,
+        )
+        await database_sync_to_async(cache.set)(
+            self.cache_key("replay"),
+            {"routes": replayed, "seconds": elapsed, "finished": time.time()},
+            timeout=None,
+        )
+        return replayed
+
+    def _active_routes_after(self, last_pk):
+        """Return the next chunk of (pk, route) for active entries of our actiontype."""
+        return list(
+            Entry.objects.filter(
+                actiontype__name=self.actiontype, is_active=True, pk__gt=last_pk
+            )
+            .order_by("pk")
+            .values_list("pk", "route__route")[: settings.TRANSLATOR_REPLAY_CHUNK_SIZE]
+        )
 
     async def disconnect(self, close_code):
         """Discard any remaining messages on disconnect."""
         logger.info("Disconnect received: %s", close_code)
+        if not hasattr(self, "shard"):
+            # We turned it away before it joined anything
+            return
         await self.channel_layer.group_discard(self.translator_group, self.channel_name)
 
         # Update connected translator count in cache
@@ -77,9 +325,14 @@ class TranslatorConsumer(AsyncJsonWebsocketConsumer):
             stats = {
                 "v4_count": msg["v4_count"],
                 "v6_count": msg["v6_count"],
+                # Older translators don't report their work queue, GoBGP's table stats or
+                # how each GoBGP they announce to is keeping up
+                "queue": msg.get("queue"),
+                "rib": msg.get("rib"),
+                "targets": msg.get("targets"),
                 "last_seen": time.time(),
             }
-            cache_key = f"translator_stats:{self.actiontype}"
+            cache_key = self.cache_key("stats")
             logger.info(
                 "Received heartbeat for %s: %s (Key: %s)",
                 self.actiontype,
@@ -92,9 +345,66 @@ class TranslatorConsumer(AsyncJsonWebsocketConsumer):
             channel = content.pop("channel")
             content["type"] = "wui_check_resp"
             await self.channel_layer.send(channel, content)
+        elif content["type"] == "translator_reconcile_result":
+            # A translator has applied the difference between a replay and what it was announcing.
+            result = {**content["message"], "finished": time.time()}
+            logger.info("%s translator reconciled: %s", self.actiontype, result)
+            await database_sync_to_async(cache.set)(
+                self.cache_key("reconcile"), result, timeout=None
+            )
+        elif content["type"] == "translator_ack":
+            # A translator has applied every event up to and including this one.
+            ack = {"seq": content["message"]["seq"], "acked": time.time()}
+            await database_sync_to_async(cache.set)(
+                self.cache_key("ack"), ack, timeout=None
+            )
 
     async def _send_event(self, event):
-        await self.send_json(event)
+        if not self.owns(event["message"].get(event.get("route_field", "route"))):
+            return
+        # Older translators get exactly what they always have, and none of them need to know where the route is
+        hidden = (
+            {"route_field"} if "resume" in self.capabilities else {"route_field", "seq"}
+        )
+        await self.send_json(
+            {key: value for key, value in event.items() if key not in hidden}
+        )
+
+    async def _send_batch(self, event):
+        """Send a batch of routes as one frame, or as one frame per route if the translator can't take batches."""
+        message = event["message"]
+        if self.shard is not None:
+            message = {
+                **message,
+                "routes": [route for route in message["routes"] if self.owns(route)],
+            }
+            if not message["routes"]:
+                return
+        seq = {}
+        if "seq" in event and "resume" in self.capabilities:
+            seq = {"seq": event["seq"]}
+        if "batch" in self.capabilities:
+            await self.send_json({"type": event["type"], "message": message, **seq})
+            return
+
+        msg_type = event["type"].removesuffix("_batch")
+        route_field = event.get("route_field", "route")
+        payload = {key: value for key, value in message.items() if key != "routes"}
+        for route in message["routes"]:
+            await self.send_json(
+                {
+                    "type": msg_type,
+                    "message": {**payload, route_field: route},
+                    **seq,
+                }
+            )
+
+    async def send_event(self, event):
+        """Send an event to our translator, as we would if it came through the channel layer."""
+        if event["type"] in BATCH_MESSAGE_TYPES.values():
+            await self._send_batch(event)
+        else:
+            await self._send_event(event)
 
     # Tell all translators of this actiontype of an addition of a route.
     translator_add = _send_event
@@ -104,6 +414,9 @@ class TranslatorConsumer(AsyncJsonWebsocketConsumer):
     translator_remove_all = _send_event
     # Send a query to all translators if a route is announced.
     translator_check = _send_event
+    # Tell all translators of this actiontype of the addition or withdrawal of many routes.
+    translator_add_batch = _send_batch
+    translator_remove_batch = _send_batch
 
 
 class WebUIConsumer(AsyncJsonWebsocketConsumer):
@@ -274,6 +274,8 @@ CHANNEL_LAYERS = {
 # Pagination
 # -------------------------------------------------------------------------------
 PAGINATION_SIZE = 100
+# Show the query planner's estimate instead of an exact COUNT(*) for the size of each list of entries
+PAGINATION_APPROXIMATE_COUNT = False
 
 # django-rest-framework
 # -------------------------------------------------------------------------------
@@ -401,3 +403,28 @@ RECENT_LIMIT = 10
 # What is the largest cidr range we'll accept entries for
 V4_MINPREFIX = 32
 V6_MINPREFIX = 128
+# How many entries a client can create in a single bulk request
+BULK_ENTRY_LIMIT = 10000
+# How many rows the entry export fetches from the database at a time
+EXPORT_CHUNK_SIZE = 2000
+# How many routes a translator is sent at a time when it connects and we replay the active entries to it
+TRANSLATOR_REPLAY_CHUNK_SIZE = 2000
+# How many routes go in one translator_add_batch or translator_remove_batch message
+TRANSLATOR_BATCH_SIZE = 1000
+# How long (in seconds) we keep the events sent to translators, so that one that reconnects can be sent just what it
+# missed; a translator that's been gone longer than this gets every active entry again instead
+TRANSLATOR_EVENT_RETENTION = 3600
+# The most events we'll send a reconnecting translator before it's cheaper to send it every active entry
+TRANSLATOR_RESUME_MAX_EVENTS = 10000
+# Events can be numbered in a different order from the one they're sent in, so a reconnecting translator is also
+# sent its last one again, and every event recorded up to this many seconds before it
+TRANSLATOR_RESUME_OVERLAP = 5
+# How long (in seconds) a worker trusts its in-memory index of active routes before rebuilding it anyway
+ACTIVE_ROUTE_INDEX_MAX_AGE = 300
+# The most changes a worker applies from the shared change log to catch its index up before it rebuilds it instead
+ACTIVE_ROUTE_INDEX_MAX_CHANGES = 1000
+# Answer is_active lookups from the database while that index builds in the background, instead of waiting for it
+ACTIVE_ROUTE_INDEX_SQL_FALLBACK = True
+# How long (in seconds) an API client's authorization can be cached, and how many clients each worker remembers
+CLIENT_AUTHORIZATION_CACHE_TTL = 300
+CLIENT_AUTHORIZATION_CACHE_SIZE = 1024
@@ -40,6 +40,9 @@ EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 
 # Your stuff...
 # ------------------------------------------------------------------------------
+# A background thread can't see a test's uncommitted data, so build the active route index in the request instead
+ACTIVE_ROUTE_INDEX_SQL_FALLBACK = False
+
 # These variables are required by the ESnetAuthBackend called in our OidcTest case
 OIDC_OP_JWKS_ENDPOINT = (
     "https://example.com/auth/realms/example/protocol/openid-connect/certs"
@@ -2,6 +2,8 @@
 
 import pytest
 
+from scram.route_manager.caches import active_routes, client_authorizations, ignore_list
+from scram.route_manager.dispatch import dispatch_plans
 from scram.users.models import User
 from scram.users.tests.factories import UserFactory
 
@@ -12,6 +14,15 @@ def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
 
 
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    """Rebuild the in-process caches for each test, since rolling back a test's data doesn't send any signals."""
+    ignore_list.invalidate()
+    active_routes.invalidate()
+    client_authorizations.invalidate()
+    dispatch_plans.invalidate()
+
+
 @pytest.fixture
 def user() -> User:
     """Return the UserFactory."""
@@ -0,0 +1,40 @@
+"""Pagination classes for the API."""
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+from ..pagination import approximate_count
+
+
+class EntryCursorPagination(CursorPagination):
+    """Page through Entries with an opaque keyset cursor on pk, newest first.
+
+    Unlike page numbers, this never runs a COUNT(*) or an OFFSET scan, so page 5000 costs the same as page 1. Clients
+    that want a total can ask for ?approximate_count=true and get the query planner's estimate.
+    """
+
+    ordering = "-pk"
+    page_size = settings.PAGINATION_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Remember whether we were asked for a count before paginating as usual."""
+        self.approximate_count = None
+        if request.query_params.get("approximate_count", "").lower() == "true":
+            self.approximate_count = approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        """Add the approximate count to the response if one was asked for."""
+        response = super().get_paginated_response(data)
+        if self.approximate_count is not None:
+            response.data["approximate_count"] = self.approximate_count
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        """Document the optional approximate_count alongside the cursor fields."""
+        paginated_schema = super().get_paginated_response_schema(schema)
+        paginated_schema["properties"]["approximate_count"] = {
+            "type": "integer",
+            "example": 123,
+        }
+        return paginated_schema
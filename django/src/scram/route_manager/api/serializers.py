@@ -2,6 +2,7 @@
 
 import logging
 
+from django.conf import settings
 from drf_spectacular.utils import extend_schema_field
 from netfields import rest_framework
 from rest_framework import serializers
@@ -66,6 +67,19 @@ class IsActiveSerializer(serializers.ModelSerializer):
         fields = ["is_active", "route"]
 
 
+class IsActiveBatchSerializer(serializers.Serializer):
+    """Accept a list of IPs or CIDRs to look up in one request.
+
+    Each item is parsed and normalized by the view, so that one bad input doesn't fail the whole batch.
+    """
+
+    cidrs = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.BULK_ENTRY_LIMIT,
+    )
+
+
 class EntrySerializer(serializers.HyperlinkedModelSerializer):
     """Due to the use of ForeignKeys, this follows some relationships to make sense via the API."""
 
@@ -131,6 +145,31 @@ class EntrySerializer(serializers.HyperlinkedModelSerializer):
         return entry
 
 
+class BulkEntrySerializer(serializers.Serializer):
+    """Wrap a list of entries so that many can be created in one request.
+
+    Each item is validated with the EntrySerializer; this only checks the envelope.
+    """
+
+    uuid = serializers.UUIDField(required=False)
+    entries = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=settings.BULK_ENTRY_LIMIT,
+    )
+
+
+class BulkWithdrawSerializer(serializers.Serializer):
+    """Accept a list of Entry pks or CIDRs to withdraw in one request."""
+
+    routes = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.BULK_ENTRY_LIMIT,
+    )
+    comment = serializers.CharField(required=False, allow_blank=True, default="")
+
+
 class IgnoreEntrySerializer(serializers.ModelSerializer):
     """Map the route to the right field type."""
 
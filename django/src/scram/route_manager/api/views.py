@@ -1,37 +1,51 @@
 """Views provide mappings between the underlying model and how they're listed in the API."""
 
+import csv
+import datetime
+import io
 import ipaddress
+import json
 import logging
 import time
 from typing import Any
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import InvalidCacheBackendError, cache
 from django.core.exceptions import PermissionDenied
-from django.db import OperationalError, connection
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, transaction
 from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from drf_spectacular.utils import OpenApiResponse, extend_schema
+from django.utils.dateparse import parse_datetime
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 from redis.exceptions import RedisError
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from simple_history.utils import update_change_reason
+from simple_history.utils import (
+    bulk_create_with_history,
+    bulk_update_with_history,
+    update_change_reason,
+)
 
 from scram import __version__ as scram_version
 
-
+from ..caches import active_routes, client_authorizations, ignore_list
+from ..dispatch import ADD, dispatch_plans
+from ..messaging import send_to_translators
 from ..models import (
     ActionType,
     Client,
     Entry,
     IgnoreEntry,
     Route,
-    WebSocketSequenceElement,
+    entries_changed,
 )
 from .exceptions import (
     ActiontypeNotAllowed,
@@ -39,17 +53,32 @@ from .exceptions import (
     NoActiveEntryFound,
     PrefixTooLarge,
 )
+from .pagination import EntryCursorPagination
 from .serializers import (
     ActionTypeSerializer,
+    BulkEntrySerializer,
+    BulkWithdrawSerializer,
     ClientSerializer,
     EntrySerializer,
     IgnoreEntrySerializer,
+    IsActiveBatchSerializer,
     IsActiveSerializer,
 )
 
-channel_layer = get_channel_layer()
 logger = logging.getLogger(__name__)
 
+# The columns of an entry export, and the queryset lookup each one comes from
+EXPORT_FIELDS = {
+    "id": "pk",
+    "route": "route__route",
+    "actiontype": "actiontype__name",
+    "comment": "comment",
+    "who": "who",
+    "when": "when",
+    "expiration": "expiration",
+    "originating_scram_instance": "originating_scram_instance",
+}
+
 
 @extend_schema(
     description="API endpoint for actiontypes.",
@@ -182,30 +211,43 @@ class IsActiveViewSet(viewsets.ReadOnlyModelViewSet):
 
     serializer_class = IsActiveSerializer
     permission_classes = (AllowAny,)
-    http_method_names = ["get"]
+    http_method_names = ["get", "post"]
 
     normalization_warning: str | None
     normalized_cidr_for_response: ipaddress.IPv4Network | ipaddress.IPv6Network | None
 
+    @staticmethod
+    def normalize_cidr(cidr):
+        """Parse a CIDR leniently, explaining any normalization we had to do.
+
+        Returns:
+            tuple: The network, and a warning string (or None if the input was already canonical).
+
+        Raises:
+            ValueError: If cidr isn't an IP address or network at all.
+        """
+        normalized_cidr = ipaddress.ip_network(cidr, strict=False)
+        warning = None
+        if str(cidr) != str(normalized_cidr):
+            warning = f"Input CIDR '{cidr}' was not canonical and was normalized to '{normalized_cidr!s}' for the search."
+        return normalized_cidr, warning
+
     def get_queryset(self):
         """Focus queryset on active routes."""
         cidr = self.request.query_params.get("cidr")
         if not cidr:
             raise ValidationError(detail={"error": "cidr parameter is required"})
         try:
-            normalized_cidr = ipaddress.ip_network(cidr, strict=False)
+            normalized_cidr, warning = self.normalize_cidr(cidr)
         except ValueError:
             raise ValidationError(
                 detail={"error": "invalid ip address or network"}
             ) from None
 
-        self.normalization_warning = None
+        # save the warning so we can use it in the list response
+        self.normalization_warning = warning
         self.normalized_cidr_for_response = normalized_cidr
 
-        if str(cidr) != str(normalized_cidr):
-            # save the warning so we can use it in the list response
-            self.normalization_warning = f"Input CIDR '{cidr}' was not canonical and was normalized to '{normalized_cidr!s}' for the search."
-
         return Entry.objects.filter(
             route__route__net_contained_or_equal=normalized_cidr, is_active=True
         )
@@ -214,21 +256,105 @@ class IsActiveViewSet(viewsets.ReadOnlyModelViewSet):
         """Override the list function to just return a boolean instead of other metadata."""
         queryset = self.get_queryset()
 
-        if not queryset.exists() and hasattr(self, "normalized_cidr_for_response"):
-            response_data: dict[str, Any] = {
-                "results": [
-                    {
-                        "is_active": False,
-                        "route": str(self.normalized_cidr_for_response),
-                    }
-                ]
-            }
+        contained = active_routes.contained(self.normalized_cidr_for_response)
+        if contained is not None:
+            results = [
+                {"is_active": True, "route": str(route)} for _, route in contained
+            ]
         else:
-            serializer = self.get_serializer(queryset, many=True)
-            response_data = {"results": serializer.data}
-        response_data["warning"] = self.normalization_warning
+            results = self.get_serializer(queryset, many=True).data
+
+        if not results:
+            results = [
+                {
+                    "is_active": False,
+                    "route": str(self.normalized_cidr_for_response),
+                }
+            ]
+
+        return Response({"results": results, "warning": self.normalization_warning})
+
+    @staticmethod
+    def find_active_routes(networks):
+        """Map each network to the active routes within it, and the active routes covering it.
+
+        This is answered from the in-process index of active routes when it's warm, and with a single query when not.
+
+        Returns:
+            dict: Network to a (contained, covering) pair of sorted lists of active routes.
+        """
+        if not networks:
+            return {}
+        found = active_routes.lookup(networks)
+        if found is not None:
+            return found
+
+        with connection.cursor() as cursor:
+            # The table names come from our own model metadata; the networks are passed as a bound parameter.
+            cursor.execute(
+                "SELECT DISTINCT candidate::text, route.route::text, "  # noqa: S608
+                "route.route <<= candidate, route.route >>= candidate "
+                "FROM unnest(%s::cidr[]) AS candidate "
+                f"JOIN {Route._meta.db_table} AS route ON route.route && candidate "
+                f"JOIN {Entry._meta.db_table} AS entry "
+                "ON entry.route_id = route.id AND entry.is_active",
+                [[str(network) for network in networks]],
+            )
+            rows = cursor.fetchall()
+
+        active = {network: (set(), set()) for network in networks}
+        for candidate, route, is_contained, is_covering in rows:
+            contained, covering = active[ipaddress.ip_network(candidate)]
+            if is_contained:
+                contained.add(ipaddress.ip_network(route))
+            if is_covering:
+                covering.add(ipaddress.ip_network(route))
+        return {
+            network: (sorted(contained), sorted(covering))
+            for network, (contained, covering) in active.items()
+        }
+
+    @extend_schema(
+        description="API endpoint to check if many routes are active in one request.",
+        parameters=[],
+        request=IsActiveBatchSerializer,
+        responses={
+            200: OpenApiResponse(
+                description="One result per input, in order, with 'is_active', the active routes within it "
+                "('routes') and covering it ('covered_by'), and any normalization warning or error."
+            ),
+            400: OpenApiResponse(description="The 'cidrs' list is missing or invalid."),
+        },
+    )
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch(self, request):
+        """Look up many CIDRs at once, returning one result per input."""
+        serializer = IsActiveBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = []
+        for cidr in serializer.validated_data["cidrs"]:
+            try:
+                normalized_cidr, warning = self.normalize_cidr(cidr)
+            except ValueError:
+                results.append({"cidr": cidr, "error": "invalid ip address or network"})
+                continue
+            results.append({"cidr": cidr, "route": normalized_cidr, "warning": warning})
+
+        active = self.find_active_routes(
+            {result["route"] for result in results if "route" in result}
+        )
+        for result in results:
+            if "route" in result:
+                contained, covering = active[result["route"]]
+                result.update(
+                    route=str(result["route"]),
+                    is_active=bool(contained),
+                    routes=[str(route) for route in contained],
+                    covered_by=[str(route) for route in covering],
+                )
 
-        return Response(response_data)
+        return Response({"results": results})
 
 
 @extend_schema(
@@ -257,6 +383,7 @@ class EntryViewSet(viewsets.ModelViewSet):
     queryset = Entry.objects.filter(is_active=True)
     permission_classes = (IsAuthenticated,)
     serializer_class = EntrySerializer
+    pagination_class = EntryCursorPagination
     lookup_value_regex = ".*"
     http_method_names = ["get", "post", "head", "delete"]
 
@@ -264,9 +391,9 @@ class EntryViewSet(viewsets.ModelViewSet):
         """Override the permissions classes for POST method since we want to accept Entry creates from any client.
 
         Note: We make authorization decisions on whether to actually create the object in the perform_create method
-        later.
+        later. Bulk withdrawals are a POST too, but they need the same authentication as a DELETE.
         """
-        if self.request.method == "POST":
+        if self.request.method == "POST" and self.action != "bulk_withdraw":
             return [AllowAny()]
         return super().get_permissions()
 
@@ -274,22 +401,20 @@ class EntryViewSet(viewsets.ModelViewSet):
         """Ensure that a given client is authorized to use a given actiontype."""
         uuid = self.request.data.get("uuid")
         if uuid:
-            try:
-                client = Client.objects.get(uuid=uuid)
-            except Client.DoesNotExist as client_dne:
+            authorization = client_authorizations.get(uuid)
+            if not authorization.exists:
                 msg = "Client does not exist"
-                raise PermissionDenied(msg) from client_dne
+                raise PermissionDenied(msg)
 
             # Check if client is authorized for the action type
             if (
-                not client.is_authorized
-                or actiontype
-                not in client.authorized_actiontypes.values_list("name", flat=True)
+                not authorization.is_authorized
+                or actiontype not in authorization.actiontypes
             ):
                 logger.debug(
                     "Client: %s, actiontypes: %s",
                     uuid,
-                    list(client.authorized_actiontypes.values_list("name", flat=True)),
+                    sorted(authorization.actiontypes),
                 )
                 logger.info(
                     "%s is not allowed to add an entry to the %s list.",
@@ -304,12 +429,9 @@ class EntryViewSet(viewsets.ModelViewSet):
     @staticmethod
     def check_ignore_list(route):
         """Ensure that we're not trying to block something from the ignore list."""
-        overlapping_ignore = IgnoreEntry.objects.filter(route__net_overlaps=route)
-        if overlapping_ignore.count():
-            ignore_entries = [
-                str(ignore_entry["route"])
-                for ignore_entry in overlapping_ignore.values()
-            ]
+        overlapping_ignore = ignore_list.overlapping(route)
+        if overlapping_ignore:
+            ignore_entries = [str(ignore_route) for ignore_route in overlapping_ignore]
             logger.info(
                 "Cannot proceed adding %s. The ignore list contains %s.",
                 route,
@@ -323,7 +445,10 @@ class EntryViewSet(viewsets.ModelViewSet):
         route = serializer.validated_data["route"]
 
         route_instance, _ = Route.objects.get_or_create(route=route)
-        actiontype_instance = ActionType.objects.get(name=actiontype)
+        plan = dispatch_plans.get_plan(actiontype, ADD)
+        if plan.actiontype is None:
+            msg = f"ActionType {actiontype} does not exist."
+            raise ActionType.DoesNotExist(msg)
 
         if serializer.validated_data.get("who"):
             # This is set if we pass the "who" through the json data in an API call (like from Zeek)
@@ -341,24 +466,14 @@ class EntryViewSet(viewsets.ModelViewSet):
         self.check_client_authorization(actiontype)
         self.check_ignore_list(route_instance)
 
-        elements = WebSocketSequenceElement.objects.filter(
-            action_type__name=actiontype
-        ).order_by("order_num")
-        if not elements:
+        if not plan.steps:
             logger.warning("No elements found for actiontype: %s", actiontype)
-
-        for element in elements:
-            msg = element.websocketmessage
-            msg.msg_data[msg.msg_data_route_field] = str(route_instance)
-            # Must match a channel name defined in asgi.py
-            async_to_sync(channel_layer.group_send)(
-                f"translator_{actiontype}",
-                {"type": msg.msg_type, "message": msg.msg_data},
-            )
+        # The group must match a channel name defined in asgi.py
+        send_to_translators(plan.events(route_instance))
 
         serializer.save(
             route=route_instance,
-            actiontype=actiontype_instance,
+            actiontype=plan.actiontype,
             who=who,
             is_active=True,
             comment=comment,
@@ -368,6 +483,207 @@ class EntryViewSet(viewsets.ModelViewSet):
         update_change_reason(entry, comment)
         logger.info("Created entry %s for route %s", actiontype, route)
 
+    @staticmethod
+    def find_ignored_routes(routes):
+        """Return the subset of routes that overlap anything on the ignore list, using at most a single query."""
+        if not routes:
+            return set()
+        trie = ignore_list.get()
+        if trie is not None:
+            return {
+                ipaddress.ip_network(route) for route in routes if trie.overlaps(route)
+            }
+        with connection.cursor() as cursor:
+            # The table name comes from our own model metadata; the routes are passed as a bound parameter.
+            cursor.execute(
+                "SELECT DISTINCT candidate::text FROM unnest(%s::cidr[]) AS candidate "  # noqa: S608
+                f"JOIN {IgnoreEntry._meta.db_table} AS ignored ON ignored.route && candidate",
+                [[str(route) for route in routes]],
+            )
+            return {ipaddress.ip_network(row[0]) for row in cursor.fetchall()}
+
+    @extend_schema(
+        description="API endpoint to create or reactivate many entries in one request.",
+        request=BulkEntrySerializer,
+        responses={
+            201: OpenApiResponse(description="Every entry was created or reactivated."),
+            207: OpenApiResponse(
+                description="Some entries were rejected; see the per-item results."
+            ),
+            400: OpenApiResponse(
+                description="The request did not contain a usable list of entries."
+            ),
+            403: OpenApiResponse(
+                description="The client is not authorized to create entries."
+            ),
+        },
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """Create many Entries at once, validating them together and reporting the outcome of each one."""
+        bulk_serializer = BulkEntrySerializer(data=request.data)
+        bulk_serializer.is_valid(raise_exception=True)
+        items = bulk_serializer.validated_data["entries"]
+
+        results: list[dict[str, Any]] = [{} for _ in items]
+        pending = {}
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                pending[index] = serializer.validated_data
+            else:
+                results[index] = {
+                    "route": str(item.get("route", "")),
+                    "status": "error",
+                    "errors": serializer.errors,
+                }
+
+        actiontypes = self._reject_bulk_items(pending, results)
+        entries = self._save_bulk_items(pending, actiontypes, results)
+        self._publish_entries(entries)
+
+        failed = sum(result["status"] == "error" for result in results)
+        logger.info(
+            "Bulk request created or updated %d entries, rejected %d",
+            len(entries),
+            failed,
+        )
+        http_status = (
+            status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED
+        )
+        return Response({"results": results}, status=http_status)
+
+    def _reject_bulk_items(self, pending, results):
+        """Drop pending items that fail the prefix, actiontype, authorization or ignore list checks.
+
+        Every check is done once for the whole batch rather than once per item.
+
+        Returns:
+            dict[str, ActionType]: The actiontypes referenced by the batch, by name.
+        """
+        names = {data["actiontype"] for data in pending.values()}
+        actiontypes = {at.name: at for at in ActionType.objects.filter(name__in=names)}
+
+        allowed = set()
+        for name in actiontypes:
+            try:
+                self.check_client_authorization(name)
+            except ActiontypeNotAllowed:
+                continue
+            allowed.add(name)
+
+        ignored = self.find_ignored_routes({data["route"] for data in pending.values()})
+
+        for index, data in list(pending.items()):
+            error = self._bulk_item_error(data, actiontypes, allowed, ignored)
+            if error:
+                results[index] = {
+                    "route": str(data["route"]),
+                    "actiontype": data["actiontype"],
+                    "status": "error",
+                    "errors": {"non_field_errors": [str(error)]},
+                }
+                del pending[index]
+        return actiontypes
+
+    @staticmethod
+    def _bulk_item_error(data, actiontypes, allowed, ignored):
+        """Return why a single validated item can't be created, or None if it can."""
+        route = data["route"]
+        if route.prefixlen < getattr(settings, f"V{route.version}_MINPREFIX", 0):
+            return PrefixTooLarge.default_detail
+        if data["actiontype"] not in actiontypes:
+            return f"Unknown actiontype: {data['actiontype']}"
+        if data["actiontype"] not in allowed:
+            return ActiontypeNotAllowed.default_detail
+        if route in ignored:
+            return IgnoredRoute.default_detail
+        return None
+
+    def _save_bulk_items(self, pending, actiontypes, results):
+        """Upsert the routes and entries for every pending item, writing their history in bulk.
+
+        Returns:
+            list[Entry]: The entries that were created or reactivated.
+        """
+        routes = {data["route"] for data in pending.values()}
+        Route.objects.bulk_create(
+            [Route(route=route) for route in routes], ignore_conflicts=True
+        )
+        route_instances = {r.route: r for r in Route.objects.filter(route__in=routes)}
+        existing = {
+            (entry.route_id, entry.actiontype_id): entry
+            for entry in Entry.objects.filter(
+                route__in=route_instances.values(),
+                actiontype__in=actiontypes.values(),
+            )
+        }
+
+        to_create: dict[tuple[int, int], Entry] = {}
+        to_update: dict[tuple[int, int], Entry] = {}
+        for index, data in pending.items():
+            route = route_instances[data["route"]]
+            actiontype = actiontypes[data["actiontype"]]
+            key = (route.pk, actiontype.pk)
+            if key in existing:
+                entry = to_update.setdefault(key, existing[key])
+                outcome = "updated"
+            else:
+                entry = to_create.setdefault(
+                    key, Entry(route=route, actiontype=actiontype)
+                )
+                outcome = "created"
+            self._apply_bulk_item(entry, data)
+            results[index] = {
+                "route": str(route),
+                "actiontype": actiontype.name,
+                "status": outcome,
+            }
+
+        with transaction.atomic():
+            bulk_create_with_history(list(to_create.values()), Entry)
+            bulk_update_with_history(
+                list(to_update.values()),
+                Entry,
+                fields=[
+                    "is_active",
+                    "comment",
+                    "who",
+                    "expiration",
+                    "originating_scram_instance",
+                ],
+            )
+        saved = [*to_create.values(), *to_update.values()]
+        entries_changed.send(sender=Entry, entries=saved)
+        return saved
+
+    def _apply_bulk_item(self, entry, data):
+        """Copy the validated fields of a bulk item onto its Entry, the same way perform_create would."""
+        entry.is_active = True
+        entry.comment = data["comment"]
+        entry.who = data.get("who") or self.request.user.username
+        entry.originating_scram_instance = settings.SCRAM_HOSTNAME
+        if "expiration" in data:
+            entry.expiration = data["expiration"]
+        # simple_history reads this when writing the historical records in bulk
+        entry._change_reason = data["comment"]  # noqa: SLF001
+
+    @staticmethod
+    def _publish_entries(entries):
+        """Send the websocket sequence for every entry to the translators, batching the routes per actiontype."""
+        routes_by_actiontype = {}
+        for entry in entries:
+            routes_by_actiontype.setdefault(entry.actiontype.name, []).append(
+                entry.route
+            )
+        events = []
+        for actiontype, routes in routes_by_actiontype.items():
+            plan = dispatch_plans.get_plan(actiontype, ADD)
+            if not plan.steps:
+                logger.warning("No elements found for actiontype: %s", plan.name)
+            events.extend(plan.batch_events(routes))
+        send_to_translators(events)
+
     def perform_update(self, serializer):
         """Update an existing Entry."""
         comment = serializer.validated_data.get("comment", "")
@@ -401,15 +717,18 @@ class EntryViewSet(viewsets.ModelViewSet):
         return entries.first()
 
     @staticmethod
-    def find_entries(arg, active_filter=None):
-        """Query entries either by pk or overlapping route."""
-        if not arg:
-            return Entry.objects.none()
+    def _entry_arg(arg):
+        """Parse an argument identifying Entries either by pk or by overlapping route.
 
+        Returns:
+            int | IPv4Network | IPv6Network: The pk, or the CIDR.
+
+        Raises:
+            ValueError: If the argument is neither an integer nor a CIDR.
+        """
         # Is our argument an integer?
         try:
-            pk = int(arg)
-            query = Q(pk=pk)
+            return int(arg)
         except ValueError as exc:
             # Maybe a CIDR? We want the ValueError at this point, if not.
             cidr = ipaddress.ip_network(arg, strict=False)
@@ -418,7 +737,44 @@ class EntryViewSet(viewsets.ModelViewSet):
             if cidr.prefixlen < min_prefix:
                 raise PrefixTooLarge from exc
 
-            query = Q(route__route__net_overlaps=cidr)
+            return cidr
+
+    @classmethod
+    def _entry_query(cls, arg):
+        """Build a query matching Entries either by pk or by overlapping route.
+
+        Raises:
+            ValueError: If the argument is neither an integer nor a CIDR.
+        """
+        parsed = cls._entry_arg(arg)
+        if isinstance(parsed, int):
+            return Q(pk=parsed)
+        return Q(route__route__net_overlaps=parsed)
+
+    @staticmethod
+    def _overlapping_entries(cidrs):
+        """Select the pks of the Entries whose routes overlap any of the CIDRs, as a subquery.
+
+        The CIDRs are joined against as a single array, however many there are, rather than each being a clause.
+
+        Returns:
+            RawSQL: The subquery.
+        """
+        # The table names come from our own model metadata; the CIDRs are passed as a bound parameter.
+        return RawSQL(
+            "SELECT entry.id FROM unnest(%s::cidr[]) AS candidate "  # noqa: S608
+            f"JOIN {Route._meta.db_table} AS route ON route.route && candidate "
+            f"JOIN {Entry._meta.db_table} AS entry ON entry.route_id = route.id",
+            [[str(cidr) for cidr in cidrs]],
+        )
+
+    @classmethod
+    def find_entries(cls, arg, active_filter=None):
+        """Query entries either by pk or overlapping route."""
+        if not arg:
+            return Entry.objects.none()
+
+        query = cls._entry_query(arg)
 
         if active_filter is not None:
             query &= Q(is_active=active_filter)
@@ -433,11 +789,146 @@ class EntryViewSet(viewsets.ModelViewSet):
 
     def destroy(self, request, pk=None, *args, **kwargs):
         """Only delete active (e.g. announced) entries."""
-        for entry in self.find_entries(pk, active_filter=True):
-            entry.delete()
+        self.find_entries(pk, active_filter=True).deactivate()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @extend_schema(
+        description="API endpoint to withdraw many entries in one request.",
+        request=BulkWithdrawSerializer,
+        responses={
+            200: OpenApiResponse(
+                description="The routes of the entries that were withdrawn."
+            ),
+            400: OpenApiResponse(
+                description="An item was not a pk or CIDR, or the prefix is too large."
+            ),
+            403: OpenApiResponse(
+                description="Authentication credentials were not provided."
+            ),
+        },
+    )
+    @action(detail=False, methods=["post"], url_path="bulk_withdraw")
+    def bulk_withdraw(self, request):
+        """Deactivate every active entry matching any of the given pks or CIDRs."""
+        serializer = BulkWithdrawSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        pks, cidrs = [], []
+        for arg in serializer.validated_data["routes"]:
+            try:
+                parsed = self._entry_arg(arg)
+            except ValueError:
+                raise ValidationError(
+                    detail={"routes": [f"Not a pk or CIDR: {arg}"]}
+                ) from None
+            (pks if isinstance(parsed, int) else cidrs).append(parsed)
+
+        query = Q(pk__in=pks)
+        if cidrs:
+            query |= Q(pk__in=self._overlapping_entries(cidrs))
+        withdrawn = Entry.objects.filter(query).deactivate(
+            serializer.validated_data["comment"] or None
+        )
+        return Response({"withdrawn": [str(entry.route) for entry in withdrawn]})
+
+    @extend_schema(
+        description="API endpoint to stream every active entry as NDJSON (default) or CSV.",
+        parameters=[
+            OpenApiParameter(
+                "actiontype", str, description="Only export this actiontype."
+            ),
+            OpenApiParameter(
+                "since",
+                str,
+                description="Only export entries created at or after this ISO 8601 datetime.",
+            ),
+            OpenApiParameter(
+                "output", str, enum=["ndjson", "csv"], description="Output format."
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(description="One active entry per line."),
+            400: OpenApiResponse(
+                description="The 'since' or 'output' parameter is invalid."
+            ),
+        },
+    )
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream active entries a chunk at a time as they're sent, so memory use doesn't grow with the table."""
+        queryset = Entry.objects.filter(is_active=True).order_by("pk")
+
+        actiontype = request.query_params.get("actiontype")
+        if actiontype:
+            queryset = queryset.filter(actiontype__name=actiontype)
+
+        since = request.query_params.get("since")
+        if since:
+            when = parse_datetime(since)
+            if when is None:
+                raise ValidationError(detail={"error": "invalid since datetime"})
+            if timezone.is_naive(when):
+                when = timezone.make_aware(when, datetime.UTC)
+            queryset = queryset.filter(when__gte=when)
+
+        output = request.query_params.get("output", "ndjson")
+        if output == "ndjson":
+            return StreamingHttpResponse(
+                self._export_ndjson(queryset), content_type="application/x-ndjson"
+            )
+        if output == "csv":
+            return StreamingHttpResponse(
+                self._export_csv(queryset), content_type="text/csv"
+            )
+        raise ValidationError(detail={"error": "output must be ndjson or csv"})
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        """Leave the export out of ATOMIC_REQUESTS, since its response is read from the database after we return."""
+        view = super().as_view(actions, **initkwargs)
+        if actions and actions.get("get") == "export":
+            return transaction.non_atomic_requests(view)
+        return view
+
+    @staticmethod
+    async def _export_records(queryset):
+        """Yield each entry in the queryset as a flat dict, fetching EXPORT_CHUNK_SIZE rows at a time.
+
+        Each chunk is its own query, picking up after the last primary key of the one before, so the response is
+        streamed as it's read, without holding a cursor (or a transaction) open between chunks.
+        """
+        rows = queryset.values_list(*EXPORT_FIELDS.values())
+        last_pk = None
+        while True:
+            chunk = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            fetched = await sync_to_async(list)(chunk[: settings.EXPORT_CHUNK_SIZE])
+            for row in fetched:
+                record = dict(zip(EXPORT_FIELDS, row, strict=True))
+                record["route"] = str(record["route"])
+                yield record
+            if len(fetched) < settings.EXPORT_CHUNK_SIZE:
+                return
+            last_pk = record["id"]
+
+    @classmethod
+    async def _export_ndjson(cls, queryset):
+        """Yield one JSON line per entry."""
+        async for record in cls._export_records(queryset):
+            yield json.dumps(record, cls=DjangoJSONEncoder) + "\n"
+
+    @classmethod
+    async def _export_csv(cls, queryset):
+        """Yield the CSV header and then one CSV line per entry."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(EXPORT_FIELDS))
+        writer.writeheader()
+        async for record in cls._export_records(queryset):
+            writer.writerow(record)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
 
 @extend_schema(
     description="API endpoint for health data",
@@ -472,31 +963,63 @@ class HealthCheckView(APIView):
         return "cache", "ok"
 
     @staticmethod
-    def _get_translator_stats() -> dict[str, dict]:
-        """Check for translator stats."""
+    def _get_shard_stats(actiontype: str, shard: int, now: float) -> dict[str, Any]:
+        """Collect what the translator for one shard of an actiontype has told us."""
         translator_heartbeat_timeout = 90
+        names = ("stats", "replay", "reconcile", "resume", "ack")
+        cached = cache.get_many(
+            [f"translator_{name}:{actiontype}:{shard}" for name in names]
+        )
+        bgp_stats = cached.get(f"translator_stats:{actiontype}:{shard}")
+
+        # Filter out stale heartbeats (e.g., > 90s)
+        if (
+            not bgp_stats
+            or now - bgp_stats["last_seen"] >= translator_heartbeat_timeout
+        ):
+            bgp_stats = {}
+        return {
+            "shard": shard,
+            "gobgp_routes": {
+                "v4": bgp_stats.get("v4_count", 0),
+                "v6": bgp_stats.get("v6_count", 0),
+            },
+            "queue": bgp_stats.get("queue"),
+            "rib": bgp_stats.get("rib"),
+            "targets": bgp_stats.get("targets"),
+            "last_replay": cached.get(f"translator_replay:{actiontype}:{shard}"),
+            "last_reconcile": cached.get(f"translator_reconcile:{actiontype}:{shard}"),
+            "last_resume": cached.get(f"translator_resume:{actiontype}:{shard}"),
+            "last_ack": cached.get(f"translator_ack:{actiontype}:{shard}"),
+        }
+
+    @staticmethod
+    def _get_translator_stats() -> dict[str, dict]:
+        """Check for translator stats.
+
+        Each shard's translator announces part of its actiontype's table, so the route counts are summed, and what
+        each one reports about itself is listed by shard. A translator that isn't sharded is shard 0 of 1.
+        """
         translator_stats: dict[str, Any] = {}
         try:
+            now = time.time()
             for at in ActionType.objects.filter(available=True):
                 count = cache.get(f"translator_count:{at.name}", 0)
-                # Fetch GoBGP stats from heartbeats
-                bgp_stats = cache.get(f"translator_stats:{at.name}")
-
-                # Filter out stale heartbeats (e.g., > 90s)
-                now = time.time()
-                active_bgp_stat = {"v4": 0, "v6": 0}
-                if (
-                    bgp_stats
-                    and now - bgp_stats["last_seen"] < translator_heartbeat_timeout
-                ):
-                    active_bgp_stat = {
-                        "v4": bgp_stats["v4_count"],
-                        "v6": bgp_stats["v6_count"],
-                    }
-
+                shards = cache.get(f"translator_shards:{at.name}")
+                by_shard = [
+                    HealthCheckView._get_shard_stats(at.name, shard, now)
+                    for shard in range(shards or 1)
+                ]
                 translator_stats[at.name] = {
                     "count": count,
-                    "gobgp_routes": active_bgp_stat,
+                    "gobgp_routes": {
+                        version: sum(
+                            stats["gobgp_routes"][version] for stats in by_shard
+                        )
+                        for version in ("v4", "v6")
+                    },
+                    "shards": shards,
+                    "by_shard": by_shard,
                 }
         except (OperationalError, RedisError, TypeError) as e:
             translator_stats["error"] = str(e)
@@ -7,3 +7,8 @@ class RouteManagerConfig(AppConfig):
     """Define the name of the module that's the main app."""
 
     name = "scram.route_manager"
+
+    @staticmethod
+    def ready():
+        """Connect the signals that keep our in-process caches coherent."""
+        import scram.route_manager.signals  # noqa: F401, PLC0415
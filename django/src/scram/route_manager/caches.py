@@ -0,0 +1,395 @@
+"""Process-local copies of tables we look things up in on hot paths, kept coherent across workers.
+
+Each worker holds its own copy in memory, tagged with the generation it was built from. The generation lives in the
+shared Django cache (Redis in production), and any worker that changes the underlying table bumps it, so every other
+worker notices on its next lookup and rebuilds, or for the active route index, applies the change itself. If the
+shared cache is unavailable we can't tell whether our copy is current, so callers fall back to asking the database.
+"""
+
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+
+from .models import Client, Entry, IgnoreEntry
+from .prefix_trie import PrefixTrie
+
+logger = logging.getLogger(__name__)
+
+
+class SharedGeneration:
+    """A generation counter in the shared cache that workers bump whenever they change the data behind our caches.
+
+    Subclasses set `generation_key`.
+    """
+
+    generation_key: str
+
+    def current_generation(self):
+        """Return the shared generation, seeding it if nobody has yet, or None if the shared cache is unavailable."""
+        generation = cache.get(self.generation_key)
+        if generation is None:
+            # Seed with something random rather than 0, so that if the key is evicted and re-seeded, a worker that
+            # built its copy before the eviction can't mistake it for current.
+            cache.add(self.generation_key, secrets.randbits(48), timeout=None)
+            generation = cache.get(self.generation_key)
+        return generation
+
+    def invalidate(self):
+        """Tell every worker to throw away what they have cached."""
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:
+            # Nobody has seeded it yet (or it was evicted), so there's nothing for anyone to be stale against
+            pass
+
+    def invalidate_on_commit(self):
+        """Invalidate now, for the rest of this transaction, and again once it commits.
+
+        A worker that rebuilds between now and the commit can't see our change yet, so it needs telling a second time.
+        """
+        self.invalidate()
+        transaction.on_commit(self.invalidate)
+
+
+class GenerationalCache(SharedGeneration):
+    """A process-local value rebuilt whenever the shared generation counter moves.
+
+    Subclasses set `generation_key` and implement `load`.
+    """
+
+    def __init__(self):
+        """Start empty; the first lookup builds the value."""
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._generation = None
+        self._value = None
+
+    def load(self):
+        """Build the value from the database."""
+        raise NotImplementedError
+
+    def is_current(self, generation):
+        """Whether our copy was built at the given generation."""
+        return generation == self._generation
+
+    def rebuild(self, generation):
+        """Load a fresh copy, tagged with the generation we read before loading it."""
+        value = self.load()
+        with self._lock:
+            self._value, self._generation = value, generation
+        logger.debug("Rebuilt %s at generation %s", self.generation_key, generation)
+
+    def get(self):
+        """Return the current value, rebuilding it if another worker has invalidated it, or None if we can't tell."""
+        generation = self.current_generation()
+        if generation is None:
+            return None
+        if not self.is_current(generation):
+            with self._rebuild_lock:
+                if not self.is_current(generation):
+                    self.rebuild(generation)
+        return self._value
+
+    def invalidate(self):
+        """Throw away our copy, and tell every other worker to throw away theirs."""
+        self._generation = None
+        super().invalidate()
+
+
+class IgnoreListCache(GenerationalCache):
+    """A prefix trie of every IgnoreEntry, so that checking a route against the ignore list costs no queries."""
+
+    generation_key = "route_manager:ignore_list:generation"
+
+    def load(self):  # noqa: PLR6301
+        """Build a trie of the ignore list."""
+        return PrefixTrie(IgnoreEntry.objects.values_list("route", flat=True))
+
+    def overlapping(self, route):
+        """Return the ignore list networks that overlap the route."""
+        trie = self.get()
+        if trie is None:
+            return list(
+                IgnoreEntry.objects.filter(route__net_overlaps=route).values_list(
+                    "route", flat=True
+                )
+            )
+        return [network for network, _ in trie.overlaps(route)]
+
+
+class ActiveRouteIndex(GenerationalCache):
+    """A prefix trie of the routes of active entries, per actiontype.
+
+    Unlike the ignore list, entries change all the time, so we don't rebuild on every change. A worker that makes a
+    change applies it to its own copy straight away, and once it commits, bumps the generation and logs the change in
+    the shared cache under the new generation (see `record`). The other workers apply the changes logged since their
+    copy's generation (see `catch_up`), and only rebuild if one of them is missing from the log, or they're more than
+    ACTIVE_ROUTE_INDEX_MAX_CHANGES behind. We also rebuild after ACTIVE_ROUTE_INDEX_MAX_AGE seconds regardless, in case
+    a change we applied locally was then rolled back.
+
+    With ACTIVE_ROUTE_INDEX_SQL_FALLBACK set, a stale index is rebuilt in a background thread and lookups return None
+    (so callers ask the database) until it's ready, rather than making the request wait.
+    """
+
+    generation_key = "route_manager:active_routes:generation"
+    change_log_key = "route_manager:active_routes:changes"
+
+    def __init__(self):
+        """Start empty and cold."""
+        super().__init__()
+        self._built_at = None
+        self._warming = False
+
+    def load(self):  # noqa: PLR6301
+        """Build a trie of active routes for each actiontype."""
+        index = {}
+        for route, actiontype in Entry.objects.filter(is_active=True).values_list(
+            "route__route", "actiontype__name"
+        ):
+            index.setdefault(actiontype, PrefixTrie()).insert(route)
+        return index
+
+    def is_current(self, generation):
+        """Whether our copy was built at the given generation, and recently enough to trust."""
+        return (
+            super().is_current(generation)
+            and self._built_at is not None
+            and time.monotonic() - self._built_at < settings.ACTIVE_ROUTE_INDEX_MAX_AGE
+        )
+
+    def rebuild(self, generation):
+        """Load a fresh copy and note when we did it."""
+        started = time.monotonic()
+        super().rebuild(generation)
+        self._built_at = started
+
+    def get(self):
+        """Return the index, or None if the caller should ask the database instead."""
+        generation = self.current_generation()
+        if generation is None:
+            return None
+        if self.is_current(generation) or self.catch_up(generation):
+            return self._value
+        if not settings.ACTIVE_ROUTE_INDEX_SQL_FALLBACK:
+            return super().get()
+        self.warm(generation)
+        return None
+
+    def catch_up(self, generation):
+        """Apply the changes the other workers have logged since our copy's generation, up to the given one.
+
+        Returns:
+            bool: Whether we could, which we can't if our copy is too old to trust, too far behind, or any of the
+                changes have gone from the log.
+        """
+        with self._lock:
+            start = self._generation
+            if (
+                start is None
+                or self._built_at is None
+                or time.monotonic() - self._built_at
+                >= settings.ACTIVE_ROUTE_INDEX_MAX_AGE
+                or not 0 < generation - start <= settings.ACTIVE_ROUTE_INDEX_MAX_CHANGES
+            ):
+                return False
+        keys = [
+            f"{self.change_log_key}:{logged}"
+            for logged in range(start + 1, generation + 1)
+        ]
+        logged = cache.get_many(keys)
+        if len(logged) < len(keys):
+            logger.debug(
+                "Missing changes to %s since %s, rebuilding", self.generation_key, start
+            )
+            return False
+        with self._lock:
+            if self._generation != start:
+                # Somebody else caught up, or rebuilt, while we were fetching the changes
+                return self.is_current(generation)
+            for key in keys:
+                self.apply(self._value, logged[key])
+            self._generation = generation
+        return True
+
+    @staticmethod
+    def apply(index, changes):
+        """Add or remove each (actiontype, route, is_active) change from the index."""
+        for actiontype, route, is_active in changes:
+            trie = index.setdefault(actiontype, PrefixTrie())
+            if is_active:
+                trie.insert(route)
+            else:
+                trie.remove(route)
+
+    def warm(self, generation=None):
+        """Start building the index in the background, unless that's already happening."""
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+        threading.Thread(
+            target=self._warm,
+            args=(generation,),
+            name="active-route-index",
+            daemon=True,
+        ).start()
+
+    def _warm(self, generation):
+        try:
+            if generation is None:
+                generation = self.current_generation()
+            self.rebuild(generation)
+        except DatabaseError:
+            logger.exception("Could not build the active route index")
+        finally:
+            self._warming = False
+            # This thread has its own database connection, which nobody else will close for us
+            connection.close()
+
+    def record(self, entries):
+        """Bring our copy in line with whether each of these entries is now active, and once that commits, publish it.
+
+        Until the transaction commits, the other workers couldn't see the change in the database anyway.
+        """
+        changes = [
+            (entry.actiontype.name, entry.route.route, entry.is_active)
+            for entry in entries
+        ]
+        with self._lock:
+            if self._value is not None:
+                self.apply(self._value, changes)
+        transaction.on_commit(lambda: self.publish(changes))
+
+    def publish(self, changes):
+        """Bump the generation, and log the changes under it for the other workers to apply."""
+        try:
+            generation = cache.incr(self.generation_key)
+        except ValueError:
+            # Nobody has seeded it yet (or it was evicted), so nobody has a copy to keep current
+            return
+        cache.set(
+            f"{self.change_log_key}:{generation}",
+            changes,
+            timeout=settings.ACTIVE_ROUTE_INDEX_MAX_AGE,
+        )
+
+    def contained(self, network):
+        """Find the active routes within the network, for each actiontype.
+
+        Returns:
+            list | None: Sorted (actiontype, route) pairs, or None if the caller should ask the database instead.
+        """
+        index = self.get()
+        if index is None:
+            return None
+        return sorted(
+            (actiontype, route)
+            for actiontype, trie in index.items()
+            for route, _ in trie.subnets(network)
+        )
+
+    def lookup(self, networks):
+        """Find the active routes within, and covering, each of the networks.
+
+        Returns:
+            dict | None: Network to a (contained, covering) pair of sorted lists of active routes, or None if the
+                caller should ask the database instead.
+        """
+        index = self.get()
+        if index is None:
+            return None
+        results = {}
+        for network in networks:
+            contained, covering = set(), set()
+            for trie in index.values():
+                contained.update(route for route, _ in trie.subnets(network))
+                covering.update(route for route, _ in trie.supernets(network))
+            results[network] = (sorted(contained), sorted(covering))
+        return results
+
+
+class ClientAuthorization(NamedTuple):
+    """What a client is allowed to do."""
+
+    exists: bool
+    is_authorized: bool
+    actiontypes: frozenset[str]
+
+
+class ClientAuthorizationCache(SharedGeneration):
+    """Authorization decisions for API clients, by UUID.
+
+    Decisions are kept in a small per-process LRU, backed by the shared cache, each for up to
+    CLIENT_AUTHORIZATION_CACHE_TTL seconds. Both are keyed by the shared generation, so a change to any Client (or
+    its actiontypes) is seen by every worker on its next lookup.
+    """
+
+    generation_key = "route_manager:client_authorization:generation"
+
+    def __init__(self):
+        """Start with an empty LRU."""
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+
+    @staticmethod
+    def load(uuid):
+        """Look the client and its actiontypes up in a single query."""
+        rows = Client.objects.filter(uuid=uuid).values_list(
+            "is_authorized", "authorized_actiontypes__name"
+        )
+        if not rows:
+            return ClientAuthorization(
+                exists=False, is_authorized=False, actiontypes=frozenset()
+            )
+        return ClientAuthorization(
+            exists=True,
+            is_authorized=bool(rows[0][0]),
+            actiontypes=frozenset(name for _, name in rows if name is not None),
+        )
+
+    def get(self, uuid):
+        """Return the authorization for the client with this UUID, from our LRU, the shared cache, or the database."""
+        generation = self.current_generation()
+        if generation is None:
+            return self.load(uuid)
+
+        uuid = str(uuid)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._local.get(uuid)
+            if cached is not None and cached[0] == generation and cached[1] > now:
+                self._local.move_to_end(uuid)
+                return cached[2]
+
+        shared_key = f"route_manager:client_authorization:{generation}:{uuid}"
+        authorization = cache.get(shared_key)
+        if authorization is None:
+            authorization = self.load(uuid)
+            cache.set(
+                shared_key,
+                authorization,
+                timeout=settings.CLIENT_AUTHORIZATION_CACHE_TTL,
+            )
+
+        with self._lock:
+            self._local[uuid] = (
+                generation,
+                now + settings.CLIENT_AUTHORIZATION_CACHE_TTL,
+                authorization,
+            )
+            self._local.move_to_end(uuid)
+            while len(self._local) > settings.CLIENT_AUTHORIZATION_CACHE_SIZE:
+                self._local.popitem(last=False)
+        return authorization
+
+
+ignore_list = IgnoreListCache()
+active_routes = ActiveRouteIndex()
+client_authorizations = ClientAuthorizationCache()
@@ -0,0 +1,168 @@
+"""Turn an Entry into the websocket messages the translators need, without asking the database how.
+
+What to send for each actiontype is configured with WebSocketSequenceElements, which almost never change, so rather
+than querying them for every entry we compile them once per (actiontype, verb) into a `DispatchPlan`, and keep the
+plans in a per-process cache that's invalidated whenever the configuration changes.
+"""
+
+import logging
+from typing import NamedTuple
+
+from .caches import GenerationalCache
+from .messaging import BATCH_MESSAGE_TYPES, batch_events
+from .models import ActionType, WebSocketSequenceElement
+
+logger = logging.getLogger(__name__)
+
+ADD = "A"
+CHECK = "C"
+REMOVE = "R"
+
+
+class DispatchStep(NamedTuple):
+    """One message in a sequence: its type, the payload to start from, and where in the payload the route goes."""
+
+    msg_type: str
+    template: dict
+    route_field: str
+
+
+class DispatchPlan(NamedTuple):
+    """Everything needed to dispatch one verb for one actiontype."""
+
+    name: str
+    verb: str
+    actiontype: ActionType | None
+    steps: tuple[DispatchStep, ...]
+
+    @property
+    def group(self):
+        """The channel layer group the translators for this actiontype listen on."""
+        return f"translator_{self.name}"
+
+    def messages(self, route, msg_type=None):
+        """Build the messages for a route, in order.
+
+        Args:
+            route: The route to fill in to each payload.
+            msg_type (str): Send every message with this type, rather than the one configured for it.
+
+        Returns:
+            list[dict]: The messages, ready for send_json or group_send.
+        """
+        return [
+            {
+                "type": msg_type or step.msg_type,
+                "message": {**step.template, step.route_field: str(route)},
+            }
+            for step in self.steps
+        ]
+
+    def events(self, route, msg_type=None):
+        """Build (group, message) pairs for a route, ready for send_to_translators.
+
+        Each message says where its route is, so that sharded translators are only sent the routes they own.
+        """
+        return [
+            (self.group, {**message, "route_field": step.route_field})
+            for step, message in zip(
+                self.steps, self.messages(route, msg_type), strict=True
+            )
+        ]
+
+    def batch_events(self, routes, msg_type=None):
+        """Build (group, message) pairs for many routes, batching each step that can be batched.
+
+        Each step is sent for every route before the next step, so the order of the steps for any one route is kept.
+
+        Args:
+            routes (list): The routes to fill in to each payload.
+            msg_type (str): Send every message with this type, rather than the one configured for it.
+
+        Returns:
+            list[tuple[str, dict]]: The events, ready for send_to_translators.
+        """
+        events = []
+        for step in self.steps:
+            step_type = msg_type or step.msg_type
+            if step_type in BATCH_MESSAGE_TYPES:
+                events.extend(
+                    batch_events(
+                        self.group, step_type, routes, step.template, step.route_field
+                    )
+                )
+            else:
+                events.extend(
+                    (
+                        self.group,
+                        {
+                            "type": step_type,
+                            "route_field": step.route_field,
+                            "message": {**step.template, step.route_field: str(route)},
+                        },
+                    )
+                    for route in routes
+                )
+        return events
+
+
+class DispatchPlanCache(GenerationalCache):
+    """Every dispatch plan, compiled from two queries and rebuilt when the configuration changes."""
+
+    generation_key = "route_manager:dispatch_plans:generation"
+
+    def load(self):  # noqa: PLR6301
+        """Compile a plan for every (actiontype, verb) that has any configuration."""
+        actiontypes = {}
+        for actiontype in ActionType.objects.order_by("-pk"):
+            # Names aren't unique, and we've always looked actiontypes up by name, so prefer the oldest
+            actiontypes[actiontype.name] = actiontype
+
+        steps = {}
+        for element in WebSocketSequenceElement.objects.select_related(
+            "websocketmessage", "action_type"
+        ).order_by("order_num", "pk"):
+            msg = element.websocketmessage
+            steps.setdefault((element.action_type.name, element.verb), []).append(
+                DispatchStep(msg.msg_type, msg.msg_data, msg.msg_data_route_field)
+            )
+
+        return {
+            "actiontypes": actiontypes,
+            "plans": {
+                (name, verb): DispatchPlan(
+                    name, verb, actiontypes.get(name), tuple(plan_steps)
+                )
+                for (name, verb), plan_steps in steps.items()
+            },
+        }
+
+    def get_plan(self, name, verb):
+        """Return the plan for an actiontype (by name) and verb, which has no steps if none are configured."""
+        compiled = self.get()
+        if compiled is None:
+            # Without the shared cache we can't know whether our plans are current, so compile them afresh
+            compiled = self.load()
+        plan = compiled["plans"].get((name, verb))
+        if plan is None:
+            plan = DispatchPlan(name, verb, compiled["actiontypes"].get(name), ())
+        return plan
+
+    def get_entry_plan(self, name, is_active):
+        """Return the plan for announcing (if active) or withdrawing (if not) an entry of the named actiontype.
+
+        Removal sequences used to be the add sequence sent as translator_remove, so we still do that if no R
+        sequence is configured.
+
+        Returns:
+            tuple[DispatchPlan, str | None]: The plan, and the message type to send it with, if it's overridden.
+        """
+        if is_active:
+            return self.get_plan(name, ADD), None
+        plan = self.get_plan(name, REMOVE)
+        if plan.steps:
+            return plan, None
+        return self.get_plan(name, ADD), "translator_remove"
+
+
+dispatch_plans = DispatchPlanCache()
@@ -0,0 +1,141 @@
+"""Publish events to the translators over the channel layer."""
+
+import hashlib
+import ipaddress
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.apps import apps
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Message types that can carry many routes at once. Translators that ask for the "batch" capability get these as a
+# single frame, and TranslatorConsumer splits them back into one frame per route for everyone else.
+BATCH_MESSAGE_TYPES = {
+    "translator_add": "translator_add_batch",
+    "translator_remove": "translator_remove_batch",
+}
+# Message types that change what translators announce. These are numbered and kept as TranslatorEvents, so that a
+# translator that reconnects can be sent just what it missed.
+SEQUENCED_MESSAGE_TYPES = {
+    "translator_add",
+    "translator_remove",
+    "translator_remove_all",
+    *BATCH_MESSAGE_TYPES.values(),
+}
+
+
+def send_to_translators(events):
+    """Publish a batch of events to their translator groups with a single sync-to-async hop.
+
+    Every call to `async_to_sync` has to hand off to an event loop and wait for it, so publishing thousands of events
+    one call at a time is dominated by that overhead. Events are sent in the order given, so per-group ordering is
+    preserved.
+
+    Args:
+        events (list[tuple[str, dict]]): (group name, event) pairs, e.g. ("translator_block", {"type": ...}).
+
+    Returns:
+        list[tuple[str, dict]]: The events as they were sent, numbered by record_events.
+    """
+    if not events:
+        return events
+    logger.debug("Publishing %d events to translators", len(events))
+    events = record_events(events)
+    async_to_sync(_group_send_all)(events)
+    return events
+
+
+def record_events(events):
+    """Number the events that change what translators announce, keeping each one as a TranslatorEvent.
+
+    The events are all recorded with one INSERT, and their sequence numbers increase in the order given.
+
+    Args:
+        events (list[tuple[str, dict]]): (group name, event) pairs.
+
+    Returns:
+        list[tuple[str, dict]]: The same events, with a "seq" added to each of those we recorded.
+    """
+    translator_event = apps.get_model("route_manager", "TranslatorEvent")
+    sequenced = [
+        index
+        for index, (_, event) in enumerate(events)
+        if event["type"] in SEQUENCED_MESSAGE_TYPES
+    ]
+    if not sequenced:
+        return events
+    recorded = translator_event.objects.bulk_create(
+        [
+            translator_event(group=events[index][0], event=events[index][1])
+            for index in sequenced
+        ]
+    )
+    events = list(events)
+    for index, row in zip(sequenced, recorded, strict=True):
+        group, event = events[index]
+        events[index] = (group, {**event, "seq": row.seq})
+    return events
+
+
+def batch_events(group, msg_type, routes, payload=None, route_field="route"):
+    """Build events that announce or withdraw many routes at once, up to TRANSLATOR_BATCH_SIZE routes to an event.
+
+    Args:
+        group (str): The translator group to send them to.
+        msg_type (str): The message type for a single route, e.g. translator_add; it must be in BATCH_MESSAGE_TYPES.
+        routes (list): The routes.
+        payload (dict): Anything to send along with every route, e.g. an ASN or community.
+        route_field (str): Where the route goes in the payload, for translators that get one frame per route.
+
+    Returns:
+        list[tuple[str, dict]]: (group name, event) pairs, ready for send_to_translators.
+    """
+    routes = [str(route) for route in routes]
+    return [
+        (
+            group,
+            {
+                "type": BATCH_MESSAGE_TYPES[msg_type],
+                "route_field": route_field,
+                "message": {
+                    **(payload or {}),
+                    "routes": routes[start : start + settings.TRANSLATOR_BATCH_SIZE],
+                },
+            },
+        )
+        for start in range(0, len(routes), settings.TRANSLATOR_BATCH_SIZE)
+    ]
+
+
+def shard_of(route, shards):
+    """Return which of a number of shards owns a route.
+
+    We hash the network rather than use hash(), which differs between processes, so that every Django instance agrees
+    on where a route lives, and keeps agreeing across restarts.
+
+    Args:
+        route (str): The route, e.g. "192.0.2.1/32" or "192.0.2.1".
+        shards (int): How many shards there are.
+
+    Returns:
+        int: The owning shard, from 0 to shards - 1.
+
+    Raises:
+        ValueError: If the route isn't an IP address or network.
+    """
+    network = ipaddress.ip_interface(route).network
+    digest = hashlib.blake2b(
+        network.network_address.packed + bytes([network.prefixlen]), digest_size=8
+    ).digest()
+    return int.from_bytes(digest) % shards
+
+
+async def _group_send_all(events):
+    for group, event in events:
+        await channel_layer.group_send(group, event)
+
+
+channel_layer = get_channel_layer()
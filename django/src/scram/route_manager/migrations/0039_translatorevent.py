@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("route_manager", "0038_merge_20260310_2137"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TranslatorEvent",
+            fields=[
+                ("seq", models.BigAutoField(primary_key=True, serialize=False)),
+                ("group", models.CharField(max_length=255, verbose_name="The channel layer group it was sent to")),
+                ("event", models.JSONField()),
+                ("created", models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["group", "seq"], name="route_manag_group_36785f_idx")],
+            },
+        ),
+    ]
@@ -4,15 +4,21 @@ import datetime
 import logging
 import uuid as uuid_lib
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.dispatch import Signal
 from django.urls import reverse
+from django.utils import timezone
 from netfields import CidrAddressField
 from simple_history.models import HistoricalRecords
 
+from .messaging import send_to_translators
+
 logger = logging.getLogger(__name__)
 
+# Sent with entries=[...] when Entries are saved in bulk, which skips post_save
+entries_changed = Signal()
+
 
 class Route(models.Model):
     """Define a route as a CIDR route and a UUID."""
@@ -93,6 +99,56 @@ class WebSocketSequenceElement(models.Model):
         )
 
 
+class EntryQuerySet(models.QuerySet):
+    """Set-based operations on Entries."""
+
+    def deactivate(self, change_reason=None):
+        """Deactivate every active entry in this queryset and tell the translators to withdraw them.
+
+        This is the set-based equivalent of calling Entry.delete() on each entry: one UPDATE, one bulk insert of
+        history records sharing a change reason, and one batch of the messages their actiontypes withdraw routes with.
+
+        Args:
+            change_reason (str): Recorded on each of the history records.
+
+        Returns:
+            list[Entry]: The entries that were deactivated.
+        """
+        with transaction.atomic():
+            entries = list(
+                self.filter(is_active=True).select_related("route", "actiontype")
+            )
+            if not entries:
+                return []
+
+            logger.info("Deactivating %d entries", len(entries))
+            self.model.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+                is_active=False
+            )
+            for entry in entries:
+                entry.is_active = False
+            self.model.history.bulk_history_create(
+                entries, update=True, default_change_reason=change_reason
+            )
+            entries_changed.send(sender=self.model, entries=entries)
+
+        # The dispatch plans are compiled from the models, so they can't be imported until the models are
+        from .dispatch import dispatch_plans  # noqa: PLC0415
+
+        routes_by_actiontype = {}
+        for entry in entries:
+            routes_by_actiontype.setdefault(entry.actiontype.name, []).append(
+                entry.route
+            )
+        events = []
+        for name, routes in routes_by_actiontype.items():
+            # The same messages process_updates sends when the other instances reprocess these entries
+            plan, message_type = dispatch_plans.get_entry_plan(name, is_active=False)
+            events.extend(plan.batch_events(routes, message_type))
+        send_to_translators(events)
+        return entries
+
+
 class Entry(models.Model):
     """An instance of an action taken on a route."""
 
@@ -117,6 +173,8 @@ class Entry(models.Model):
         default="",
     )
 
+    objects = EntryQuerySet.as_manager()
+
     class Meta:
         """Ensure that multiple routes can be added as long as they have different action types."""
 
@@ -138,18 +196,11 @@ class Entry(models.Model):
             # We've already expired this route, don't send another message
             return
         # We don't actually delete records; we set them to inactive and then tell the translator to remove them
-        logger.info("Deactivating %s", self.route)
-        self.is_active = False
-        self.save()
-
-        # Unblock it
-        async_to_sync(channel_layer.group_send)(
-            f"translator_{self.actiontype}",
-            {
-                "type": "translator_remove",
-                "message": {"route": str(self.route)},
-            },
+        # simple_history reads _change_reason when we save, so pass along any the caller set
+        Entry.objects.filter(pk=self.pk).deactivate(
+            getattr(self, "_change_reason", None)
         )
+        self.is_active = False
 
     def get_change_reason(self):
         """Traverse some complex relationships to determine the most recent change reason.
@@ -190,4 +241,41 @@ class Client(models.Model):
         return str(self.client_name)
 
 
-channel_layer = get_channel_layer()
+class TranslatorEventQuerySet(models.QuerySet):
+    """Operations on the record of events sent to the translators."""
+
+    def prune(self):
+        """Delete events older than TRANSLATOR_EVENT_RETENTION seconds.
+
+        Returns:
+            int: The number of events deleted.
+        """
+        cutoff = timezone.now() - datetime.timedelta(
+            seconds=settings.TRANSLATOR_EVENT_RETENTION
+        )
+        deleted, _ = self.filter(created__lt=cutoff).delete()
+        return deleted
+
+
+class TranslatorEvent(models.Model):
+    """An event that changed what the translators announce, numbered so a translator that reconnects can catch up.
+
+    The primary key is the event's sequence number. Translators acknowledge the last one they've applied, and present
+    it when they reconnect, so that we only need to send them what they missed rather than every active entry.
+    """
+
+    seq = models.BigAutoField(primary_key=True)
+    group = models.CharField("The channel layer group it was sent to", max_length=255)
+    event = models.JSONField()
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = TranslatorEventQuerySet.as_manager()
+
+    class Meta:
+        """Make finding the events for a group after a sequence number cheap."""
+
+        indexes = [models.Index(fields=["group", "seq"])]
+
+    def __str__(self):
+        """Summarize the event by its number, group and type."""
+        return f"#{self.seq} to {self.group}: {self.event.get('type')}"
@@ -0,0 +1,126 @@
+"""Keyset pagination, so that a deep page costs the same as the first one.
+
+Page numbers need a COUNT(*) and an OFFSET scan that grows with the page number. Instead, we hand out an opaque cursor
+that remembers the last pk we showed and which way we were going, and let the index on pk do the work.
+"""
+
+import base64
+import binascii
+import json
+import logging
+
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+def encode_cursor(direction, pk):
+    """Build an opaque cursor pointing just past the given pk.
+
+    Returns:
+        str: A URL safe cursor.
+    """
+    return base64.urlsafe_b64encode(f"{direction}:{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Unpack a cursor from encode_cursor, treating anything we didn't hand out as the first page.
+
+    Returns:
+        tuple[str, int] | None: The direction and pk, or None for the first page.
+    """
+    if not cursor:
+        return None
+    try:
+        direction, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        logger.debug("Ignoring invalid cursor %r", cursor)
+        return None
+    if direction not in {NEXT, PREVIOUS}:
+        return None
+    return direction, pk
+
+
+class KeysetPage:
+    """One page of results, newest first, and the cursors for its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        """Hold the objects on this page and the cursors to either side of it."""
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        """Iterate over the objects on this page."""
+        return iter(self.object_list)
+
+    def __len__(self):
+        """Return the number of objects on this page."""
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        """Whether there are older objects after this page."""
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        """Whether there are newer objects before this page."""
+        return self.previous_cursor is not None
+
+
+def keyset_page(queryset, cursor, page_size):
+    """Return the page of the queryset (ordered newest first by pk) that the cursor points to.
+
+    Returns:
+        KeysetPage: The requested page, or the first page if the cursor is invalid or stale.
+    """
+    position = decode_cursor(cursor)
+    if position is not None and position[0] == PREVIOUS:
+        rows = list(queryset.filter(pk__gt=position[1]).order_by("pk")[: page_size + 1])
+        if rows:
+            more_newer = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            return KeysetPage(
+                rows,
+                next_cursor=encode_cursor(NEXT, rows[-1].pk),
+                previous_cursor=encode_cursor(PREVIOUS, rows[0].pk)
+                if more_newer
+                else None,
+            )
+        # Nothing newer than the cursor any more, so fall back to the first page
+        position = None
+
+    if position is not None:
+        queryset = queryset.filter(pk__lt=position[1])
+    rows = list(queryset.order_by("-pk")[: page_size + 1])
+    more_older = len(rows) > page_size
+    rows = rows[:page_size]
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(NEXT, rows[-1].pk) if more_older else None,
+        previous_cursor=encode_cursor(PREVIOUS, rows[0].pk)
+        if position and rows
+        else None,
+    )
+
+
+def approximate_count(queryset):
+    """Estimate how many rows the queryset would return from the query planner's statistics.
+
+    This is a single EXPLAIN, so it costs the same however big the table is, but it's only as good as the last
+    ANALYZE. We fall back to an exact count if the planner can't give us an answer.
+
+    Returns:
+        int: The estimated number of rows.
+    """
+    try:
+        plan = json.loads(queryset.explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except (DatabaseError, KeyError, IndexError, TypeError, ValueError):
+        logger.warning("Could not estimate row count, counting instead", exc_info=True)
+        return queryset.count()
@@ -0,0 +1,131 @@
+"""A binary radix trie of IP networks, for answering overlap questions without a database round-trip.
+
+IPv4 and IPv6 live in separate trees, so a lookup only ever walks at most 32 or 128 levels.
+"""
+
+import ipaddress
+
+
+class _Node:
+    __slots__ = ("children", "network", "value")
+
+    def __init__(self):
+        self.children = [None, None]
+        # Only set on nodes that hold a stored prefix
+        self.network = None
+        self.value = None
+
+
+def _bits(network):
+    """Yield the bits of the network's prefix, most significant first."""
+    address = int(network.network_address)
+    for shift in range(
+        network.max_prefixlen - 1, network.max_prefixlen - 1 - network.prefixlen, -1
+    ):
+        yield (address >> shift) & 1
+
+
+class PrefixTrie:
+    """Map IP networks to values, and find the stored networks that contain, or are contained by, another network."""
+
+    def __init__(self, networks=()):
+        """Build a trie, optionally from an iterable of networks (stored with a value of None)."""
+        self._roots = {4: _Node(), 6: _Node()}
+        self._len = 0
+        for network in networks:
+            self.insert(network)
+
+    def __len__(self):
+        """Return the number of stored networks."""
+        return self._len
+
+    def __contains__(self, network):
+        """Whether exactly this network is stored."""
+        node = self._find(ipaddress.ip_network(network, strict=False))
+        return node is not None and node.network is not None
+
+    def __iter__(self):
+        """Iterate over every stored network."""
+        for root in self._roots.values():
+            for node in self._walk(root):
+                yield node.network
+
+    def insert(self, network, value=None):
+        """Store a network (and optional value), replacing the value if it's already stored."""
+        network = ipaddress.ip_network(network, strict=False)
+        node = self._roots[network.version]
+        for bit in _bits(network):
+            if node.children[bit] is None:
+                node.children[bit] = _Node()
+            node = node.children[bit]
+        if node.network is None:
+            self._len += 1
+        node.network = network
+        node.value = value
+
+    def remove(self, network):
+        """Forget a network, returning whether it was stored.
+
+        Empty branches are left in place; they cost a little memory but nothing in correctness.
+        """
+        node = self._find(ipaddress.ip_network(network, strict=False))
+        if node is None or node.network is None:
+            return False
+        node.network = None
+        node.value = None
+        self._len -= 1
+        return True
+
+    def get(self, network, default=None):
+        """Return the value stored for exactly this network."""
+        node = self._find(ipaddress.ip_network(network, strict=False))
+        if node is None or node.network is None:
+            return default
+        return node.value
+
+    def supernets(self, network):
+        """Return (network, value) for every stored network that contains this one, including itself.
+
+        This walks a single path from the root, so it's O(prefix length) whatever the size of the trie.
+        """
+        network = ipaddress.ip_network(network, strict=False)
+        node = self._roots[network.version]
+        found = [(node.network, node.value)] if node.network is not None else []
+        for bit in _bits(network):
+            node = node.children[bit]
+            if node is None:
+                break
+            if node.network is not None:
+                found.append((node.network, node.value))
+        return found
+
+    def subnets(self, network):
+        """Return (network, value) for every stored network contained in this one, including itself."""
+        node = self._find(ipaddress.ip_network(network, strict=False))
+        if node is None:
+            return []
+        return [(found.network, found.value) for found in self._walk(node)]
+
+    def overlaps(self, network):
+        """Return (network, value) for every stored network that overlaps this one."""
+        network = ipaddress.ip_network(network, strict=False)
+        return self.supernets(network) + [
+            (found, value) for found, value in self.subnets(network) if found != network
+        ]
+
+    def _find(self, network):
+        node = self._roots[network.version]
+        for bit in _bits(network):
+            node = node.children[bit]
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _walk(node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.network is not None:
+                yield node
+            stack.extend(child for child in node.children if child is not None)
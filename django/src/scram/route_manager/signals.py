@@ -0,0 +1,56 @@
+"""Keep the in-process caches in step with the tables they copy."""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .caches import active_routes, client_authorizations, ignore_list
+from .dispatch import dispatch_plans
+from .models import (
+    ActionType,
+    Client,
+    Entry,
+    IgnoreEntry,
+    WebSocketMessage,
+    WebSocketSequenceElement,
+    entries_changed,
+)
+
+
+@receiver(post_save, sender=IgnoreEntry)
+@receiver(post_delete, sender=IgnoreEntry)
+def invalidate_ignore_list(**kwargs):
+    """Rebuild the ignore list trie everywhere after it changes."""
+    ignore_list.invalidate_on_commit()
+
+
+@receiver(post_save, sender=Entry)
+def record_entry(instance, **kwargs):
+    """Add or remove a saved Entry's route from the active route index."""
+    active_routes.record([instance])
+
+
+@receiver(entries_changed, sender=Entry)
+def record_entries(entries, **kwargs):
+    """Add or remove Entries saved in bulk from the active route index."""
+    active_routes.record(entries)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(m2m_changed, sender=Client.authorized_actiontypes.through)
+@receiver(post_save, sender=ActionType)
+@receiver(post_delete, sender=ActionType)
+def invalidate_client_authorizations(**kwargs):
+    """Forget every cached client authorization after a client, its actiontypes, or an actiontype's name changes."""
+    client_authorizations.invalidate_on_commit()
+
+
+@receiver(post_save, sender=WebSocketSequenceElement)
+@receiver(post_delete, sender=WebSocketSequenceElement)
+@receiver(post_save, sender=WebSocketMessage)
+@receiver(post_delete, sender=WebSocketMessage)
+@receiver(post_save, sender=ActionType)
+@receiver(post_delete, sender=ActionType)
+def invalidate_dispatch_plans(**kwargs):
+    """Recompile the dispatch plans everywhere after the websocket configuration changes."""
+    dispatch_plans.invalidate_on_commit()
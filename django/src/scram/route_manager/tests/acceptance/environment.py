@@ -3,6 +3,8 @@
 from django.test import Client
 from rest_framework.test import APIClient
 
+from scram.route_manager.caches import active_routes, client_authorizations, ignore_list
+from scram.route_manager.dispatch import dispatch_plans
 from scram.users.tests.factories import UserFactory
 
 
@@ -14,3 +16,9 @@ def django_ready(context):
     # Default to using the API client.
     context.test.client = APIClient()
     context.test.web_client = Client()
+
+    # Each scenario starts with fresh data, but clearing the old data doesn't send any signals
+    ignore_list.invalidate()
+    active_routes.invalidate()
+    client_authorizations.invalidate()
+    dispatch_plans.invalidate()
@@ -0,0 +1,65 @@
+"""Benchmark checking routes against the ignore list.
+
+These aren't collected with the rest of the tests; run them explicitly with `make benchmark-django`, or:
+
+    pytest -s -o python_files='bench_*.py' src/scram/route_manager/tests/benchmarks
+"""
+
+import ipaddress
+import random
+import time
+
+import pytest
+
+from scram.route_manager.caches import ignore_list
+from scram.route_manager.models import IgnoreEntry
+
+IGNORE_ENTRIES = 500
+CHECKS = 2000
+
+
+def database_check(route):
+    """Check the ignore list the way we did before the trie: a count, and then the values."""
+    overlapping_ignore = IgnoreEntry.objects.filter(route__net_overlaps=route)
+    if overlapping_ignore.count():
+        return [ignore_entry["route"] for ignore_entry in overlapping_ignore.values()]
+    return []
+
+
+def rate(check, routes):
+    """Return how many checks per second we managed."""
+    start = time.perf_counter()
+    for route in routes:
+        check(route)
+    return len(routes) / (time.perf_counter() - start)
+
+
+@pytest.mark.django_db
+def test_ignore_list_checks_per_second():
+    """Compare ignore list checks per second against the database and the in-process trie."""
+    rng = random.Random(0)  # noqa: S311
+    IgnoreEntry.objects.bulk_create(
+        [
+            IgnoreEntry(route=f"10.{i // 256}.{i % 256}.0/24", comment="benchmark")
+            for i in range(IGNORE_ENTRIES)
+        ]
+    )
+    ignore_list.invalidate()
+    routes = [
+        ipaddress.ip_network(
+            f"10.{rng.randrange(4)}.{rng.randrange(256)}.{rng.randrange(256)}/32"
+        )
+        for _ in range(CHECKS)
+    ]
+
+    for route in routes[:50]:
+        assert sorted(database_check(route)) == sorted(ignore_list.overlapping(route))
+
+    before = rate(database_check, routes)
+    after = rate(ignore_list.overlapping, routes)
+
+    print(  # noqa: T201
+        f"\nignore list checks/s with {IGNORE_ENTRIES} entries: "
+        f"database {before:,.0f}, trie {after:,.0f} ({after / before:,.1f}x)"
+    )
+    assert after > before
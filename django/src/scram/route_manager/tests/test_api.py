@@ -1,11 +1,17 @@
 """Use pytest to unit test the API."""
 
+import csv
+import json
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 
-from scram.route_manager.models import ActionType, Client, Entry, Route
+from scram.route_manager.models import ActionType, Client, Entry, IgnoreEntry, Route
 
 
 class TestAddRemoveIP(APITestCase):
@@ -227,3 +233,328 @@ class TestIsActive(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 1)
         self.assertEqual(response.data["results"][0]["is_active"], True)
+
+    def test_batch_lookup(self):
+        """Check many CIDRs at once, getting one result per input in order."""
+        url = reverse("api:v1:is_active-batch")
+        cidrs = [
+            "192.0.2.100/32",
+            "192.0.2.200",
+            "192.0.2.0/24",
+            "2001:db8::1/64",
+            "bogus",
+        ]
+
+        response = self.client.post(url, {"cidrs": cidrs}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([result["cidr"] for result in results], cidrs)
+
+        self.assertTrue(results[0]["is_active"])
+        self.assertEqual(results[0]["route"], "192.0.2.100/32")
+        self.assertEqual(results[0]["routes"], ["192.0.2.100/32"])
+        self.assertEqual(results[0]["covered_by"], ["192.0.2.100/32"])
+        self.assertIsNone(results[0]["warning"])
+
+        self.assertFalse(results[1]["is_active"])
+        self.assertEqual(results[1]["routes"], [])
+
+        self.assertTrue(results[2]["is_active"])
+        self.assertEqual(results[2]["routes"], ["192.0.2.100/32"])
+        self.assertEqual(results[2]["covered_by"], [])
+
+        self.assertTrue(results[3]["is_active"])
+        self.assertEqual(results[3]["route"], "2001:db8::/64")
+        self.assertIn("normalized", results[3]["warning"])
+
+        self.assertEqual(results[4]["error"], "invalid ip address or network")
+
+    def test_batch_lookup_is_one_query(self):
+        """The number of queries doesn't grow with the number of CIDRs."""
+        url = reverse("api:v1:is_active-batch")
+        cidrs = [f"198.51.100.{host}" for host in range(200)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {"cidrs": cidrs}, format="json")
+
+        selects = [q for q in queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(len(response.data["results"]), 200)
+
+    def test_batch_requires_cidrs(self):
+        """An empty batch is rejected."""
+        response = self.client.post(
+            reverse("api:v1:is_active-batch"), {"cidrs": []}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestBulkCreate(APITestCase):
+    """Ensure that many entries can be created in one request, with per-item results."""
+
+    def setUp(self):
+        """Set up an authorized client and an ignore entry to collide with."""
+        self.url = reverse("api:v1:entry-bulk-create")
+        self.uuid = "0e7e1cbd-7d73-4968-bc4b-ce3265dc2fd3"
+        self.authorized_client = Client.objects.create(
+            client_name="authorized_client.es.net",
+            uuid=self.uuid,
+            is_authorized=True,
+        )
+        self.authorized_client.authorized_actiontypes.set([1])
+        IgnoreEntry.objects.create(route="192.0.2.128/25", comment="ours")
+
+    def post_entries(self, entries):
+        """Post a list of entries as our authorized client."""
+        return self.client.post(
+            self.url, {"uuid": self.uuid, "entries": entries}, format="json"
+        )
+
+    def test_bulk_create(self):
+        """Every valid entry in the batch is created and marked active."""
+        routes = ["192.0.2.1/32", "192.0.2.2/32", "2001:db8::1/128"]
+        response = self.post_entries(
+            [{"route": route, "comment": "bulk", "who": "zeek"} for route in routes]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["created"] * 3,
+        )
+        active = Entry.objects.filter(is_active=True)
+        self.assertEqual(sorted(str(entry.route) for entry in active), sorted(routes))
+        self.assertEqual(active.first().get_change_reason(), "bulk")
+
+    def test_bulk_create_reports_rejections(self):
+        """Ignored, too large, and malformed routes are rejected without blocking the rest of the batch."""
+        response = self.post_entries(
+            [
+                {"route": "192.0.2.1", "comment": "ok"},
+                {"route": "192.0.2.200", "comment": "ignored"},
+                {"route": "198.51.100.0/24", "comment": "too large"},
+                {"route": "not an ip", "comment": "invalid"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["created", "error", "error", "error"],
+        )
+        self.assertEqual(Entry.objects.count(), 1)
+
+    def test_bulk_create_reactivates_existing(self):
+        """An inactive entry in the batch is reactivated rather than duplicated."""
+        route = Route.objects.create(route="192.0.2.3/32")
+        Entry.objects.create(
+            route=route, actiontype_id=1, is_active=False, comment="old", who="test"
+        )
+
+        response = self.post_entries([{"route": "192.0.2.3", "comment": "again"}])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["results"][0]["status"], "updated")
+        entry = Entry.objects.get(route=route)
+        self.assertTrue(entry.is_active)
+        self.assertEqual(entry.get_change_reason(), "again")
+
+    def test_bulk_create_unauthorized_actiontype(self):
+        """Entries for an actiontype the client isn't authorized for are rejected."""
+        ActionType.objects.create(name="shunt")
+
+        response = self.post_entries(
+            [{"route": "192.0.2.4", "comment": "test", "actiontype": "shunt"}]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertFalse(Entry.objects.exists())
+
+    def test_bulk_create_unknown_client(self):
+        """An unregistered client can't create anything in bulk."""
+        response = self.client.post(
+            self.url,
+            {
+                "uuid": "11111111-2222-3333-4444-555555555555",
+                "entries": [{"route": "192.0.2.5", "comment": "test"}],
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestBulkWithdraw(APITestCase):
+    """Ensure that many entries can be withdrawn in one request."""
+
+    def setUp(self):
+        """Create a handful of active host blocks."""
+        self.url = reverse("api:v1:entry-bulk-withdraw")
+        get_user_model().objects.create_superuser(
+            "admin", "admin@es.net", "admintestpassword"
+        )
+        self.client.login(username="admin", password="admintestpassword")
+        self.actiontype = ActionType.objects.get(name="block")
+        self.entries = [
+            Entry.objects.create(
+                route=Route.objects.create(route=f"192.0.2.{host}/32"),
+                actiontype=self.actiontype,
+                who="test",
+            )
+            for host in range(1, 6)
+        ]
+
+    def test_bulk_withdraw(self):
+        """Entries matched by CIDR or pk are deactivated, and the rest are left alone."""
+        response = self.client.post(
+            self.url,
+            {
+                "routes": ["192.0.2.1", "192.0.2.2/32", self.entries[2].pk],
+                "comment": "incident cleanup",
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(response.data["withdrawn"]),
+            ["192.0.2.1/32", "192.0.2.2/32", "192.0.2.3/32"],
+        )
+        self.assertEqual(Entry.objects.filter(is_active=True).count(), 2)
+        self.assertEqual(self.entries[0].get_change_reason(), "incident cleanup")
+
+    def test_bulk_withdraw_is_set_based(self):
+        """However many CIDRs are sent, they're matched in one query and withdrawn in one UPDATE."""
+        # So the dispatch plans are already cached for both
+        self.client.post(self.url, {"routes": ["192.0.2.5"]}, format="json")
+        with CaptureQueriesContext(connection) as one:
+            self.client.post(self.url, {"routes": ["192.0.2.1"]}, format="json")
+
+        unmatched = [f"198.51.{i // 256}.{i % 256}/32" for i in range(1000)]
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.post(
+                self.url, {"routes": ["192.0.2.2", *unmatched]}, format="json"
+            )
+
+        self.assertEqual(response.data["withdrawn"], ["192.0.2.2/32"])
+        self.assertEqual(len(many), len(one))
+        self.assertEqual(max(q["sql"].count("&&") for q in many), 1)
+        updates = [q["sql"] for q in many if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+    def test_bulk_withdraw_invalid_route(self):
+        """Anything that isn't a pk or CIDR fails the whole request."""
+        response = self.client.post(
+            self.url, {"routes": ["192.0.2.1", "nope"]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Entry.objects.filter(is_active=True).count(), 5)
+
+    def test_bulk_withdraw_requires_authentication(self):
+        """Unlike creates, withdrawals can't be done anonymously."""
+        self.client.logout()
+        response = self.client.post(self.url, {"routes": ["192.0.2.1"]}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Entry.objects.filter(is_active=True).count(), 5)
+
+
+class TestExport(APITransactionTestCase):
+    """Ensure that active entries can be streamed out as NDJSON or CSV.
+
+    The export runs outside of ATOMIC_REQUESTS, so the tests can't be wrapped in a transaction of their own.
+    """
+
+    def setUp(self):
+        """Create active entries in two actiontypes, plus an inactive one."""
+        self.url = reverse("api:v1:entry-export")
+        self.superuser = get_user_model().objects.create_superuser(
+            "admin", "admin@es.net", "admintestpassword"
+        )
+        self.client.login(username="admin", password="admintestpassword")
+        self.block, _ = ActionType.objects.get_or_create(name="block")
+        shunt = ActionType.objects.create(name="shunt")
+        for route, actiontype, is_active in [
+            ("192.0.2.1/32", self.block, True),
+            ("192.0.2.2/32", shunt, True),
+            ("192.0.2.3/32", self.block, False),
+        ]:
+            Entry.objects.create(
+                route=Route.objects.create(route=route),
+                actiontype=actiontype,
+                is_active=is_active,
+                who="test",
+            )
+
+    async def export(self, **params):
+        """Fetch an export through the ASGI handler, returning the response and its body.
+
+        Returns:
+            tuple: The response, and the body as text.
+        """
+        await self.async_client.aforce_login(self.superuser)
+        response = await self.async_client.get(self.url, params)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        return response, body.decode()
+
+    async def test_export_ndjson(self):
+        """Each active entry is a JSON object on its own line."""
+        response, body = await self.export()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(
+            [(r["route"], r["actiontype"]) for r in records],
+            [("192.0.2.1/32", "block"), ("192.0.2.2/32", "shunt")],
+        )
+
+    async def test_export_filters(self):
+        """The actiontype and since filters narrow the export."""
+        _, body = await self.export(actiontype="shunt")
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["route"], "192.0.2.2/32")
+
+        _, body = await self.export(since="9999-01-01T00:00:00")
+        self.assertEqual(body, "")
+
+    async def test_export_csv(self):
+        """CSV output has a header row followed by one row per active entry."""
+        _, body = await self.export(output="csv")
+
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["route"], "192.0.2.1/32")
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    async def test_export_is_streamed(self):
+        """Entries are read a chunk at a time as the response is sent, not before it's returned."""
+        await self.async_client.aforce_login(self.superuser)
+        response = await self.async_client.get(self.url)
+        self.assertTrue(response.is_async)
+        chunks = aiter(response.streaming_content)
+        first = json.loads(await anext(chunks))
+
+        # Added after the response was returned, so it's only in the export if we read it as we go
+        route = await Route.objects.acreate(route="192.0.2.4/32")
+        await Entry.objects.acreate(route=route, actiontype=self.block, who="test")
+
+        rest = [json.loads(chunk) async for chunk in chunks]
+        self.assertEqual(
+            [record["route"] for record in [first, *rest]],
+            ["192.0.2.1/32", "192.0.2.2/32", "192.0.2.4/32"],
+        )
+
+    def test_export_invalid_parameters(self):
+        """Unknown formats and unparseable datetimes are rejected."""
+        self.assertEqual(
+            self.client.get(self.url, {"output": "xml"}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(
+            self.client.get(self.url, {"since": "yesterday"}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
@@ -0,0 +1,355 @@
+"""Test the prefix trie and the in-process caches built on it."""
+
+import ipaddress
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from scram.route_manager.api.views import IsActiveViewSet
+from scram.route_manager.caches import (
+    ActiveRouteIndex,
+    IgnoreListCache,
+    active_routes,
+    client_authorizations,
+    ignore_list,
+)
+from scram.route_manager.models import ActionType, Client, Entry, IgnoreEntry, Route
+from scram.route_manager.prefix_trie import PrefixTrie
+
+
+def networks(found):
+    """Return just the networks from a list of (network, value) pairs, as sorted strings."""
+    return sorted(str(network) for network, _ in found)
+
+
+class TestPrefixTrie(TestCase):
+    """Check the trie's answers against what ipaddress says they should be."""
+
+    def setUp(self):
+        """Store a mix of nested and disjoint v4 and v6 networks."""
+        self.trie = PrefixTrie()
+        for network in [
+            "10.0.0.0/8",
+            "10.1.0.0/16",
+            "10.1.2.3/32",
+            "192.0.2.0/24",
+            "2001:db8::/32",
+            "2001:db8:1::/48",
+        ]:
+            self.trie.insert(network, value=network)
+
+    def test_len_and_contains(self):
+        """Exact membership doesn't match containing or contained networks."""
+        self.assertEqual(len(self.trie), 6)
+        self.assertIn("10.1.0.0/16", self.trie)
+        self.assertNotIn("10.1.0.0/17", self.trie)
+        self.assertNotIn("10.0.0.0/7", self.trie)
+        self.assertEqual(self.trie.get("192.0.2.0/24"), "192.0.2.0/24")
+
+    def test_supernets(self):
+        """Every stored network on the path down to a prefix contains it."""
+        self.assertEqual(
+            networks(self.trie.supernets("10.1.2.3/32")),
+            ["10.0.0.0/8", "10.1.0.0/16", "10.1.2.3/32"],
+        )
+        self.assertEqual(networks(self.trie.supernets("172.16.0.1/32")), [])
+
+    def test_subnets(self):
+        """Everything stored under a prefix is contained in it."""
+        self.assertEqual(
+            networks(self.trie.subnets("10.0.0.0/8")),
+            ["10.0.0.0/8", "10.1.0.0/16", "10.1.2.3/32"],
+        )
+        self.assertEqual(
+            networks(self.trie.subnets("2001:db8::/16")),
+            ["2001:db8:1::/48", "2001:db8::/32"],
+        )
+
+    def test_overlaps_match_ipaddress(self):
+        """Overlaps agree with a brute force check, and v4 and v6 never mix."""
+        stored = [ipaddress.ip_network(network) for network in self.trie]
+        for query in [
+            "10.0.0.0/15",
+            "10.2.0.0/16",
+            "0.0.0.0/0",
+            "::/0",
+            "2001:db8:1:2::/64",
+            "192.0.2.128/25",
+        ]:
+            query = ipaddress.ip_network(query)
+            expected = sorted(
+                str(network)
+                for network in stored
+                if network.version == query.version and network.overlaps(query)
+            )
+            self.assertEqual(networks(self.trie.overlaps(query)), expected, query)
+
+    def test_remove(self):
+        """Removing a network leaves the ones around it alone."""
+        self.assertTrue(self.trie.remove("10.1.0.0/16"))
+        self.assertFalse(self.trie.remove("10.1.0.0/16"))
+        self.assertEqual(len(self.trie), 5)
+        self.assertEqual(
+            networks(self.trie.supernets("10.1.2.3")), ["10.0.0.0/8", "10.1.2.3/32"]
+        )
+
+
+class TestIgnoreListCache(TestCase):
+    """The ignore list is answered from memory, and stays in step with the table."""
+
+    def setUp(self):
+        """Put something on the ignore list."""
+        IgnoreEntry.objects.create(route="192.0.2.0/24", comment="ours")
+
+    def test_no_queries_once_built(self):
+        """After the first lookup builds the trie, checks don't touch the database."""
+        ignore_list.overlapping(ipaddress.ip_network("198.51.100.1/32"))
+
+        with CaptureQueriesContext(connection) as queries:
+            overlapping = ignore_list.overlapping(ipaddress.ip_network("192.0.2.7/32"))
+
+        self.assertEqual(overlapping, [ipaddress.ip_network("192.0.2.0/24")])
+        self.assertEqual(len(queries), 0)
+
+    def test_signals_invalidate(self):
+        """Adding or removing an IgnoreEntry is seen by the next lookup."""
+        route = ipaddress.ip_network("203.0.113.5/32")
+        self.assertEqual(ignore_list.overlapping(route), [])
+
+        ignore_entry = IgnoreEntry.objects.create(route="203.0.113.0/24", comment="new")
+        self.assertEqual(
+            ignore_list.overlapping(route), [ipaddress.ip_network("203.0.113.0/24")]
+        )
+
+        ignore_entry.delete()
+        self.assertEqual(ignore_list.overlapping(route), [])
+
+    def test_other_workers_notice(self):
+        """A second process-local copy is rebuilt when the first one invalidates."""
+        other_worker = IgnoreListCache()
+        route = ipaddress.ip_network("203.0.113.5/32")
+        self.assertEqual(other_worker.overlapping(route), [])
+
+        # Sneak a row in without signals, so only the generation bump can tell the other worker
+        IgnoreEntry.objects.bulk_create(
+            [IgnoreEntry(route="203.0.113.0/24", comment="new")]
+        )
+        self.assertEqual(other_worker.overlapping(route), [])
+
+        ignore_list.invalidate()
+        self.assertEqual(
+            other_worker.overlapping(route), [ipaddress.ip_network("203.0.113.0/24")]
+        )
+
+    def test_falls_back_without_shared_cache(self):
+        """If we can't read the generation, we ask the database instead of trusting our copy."""
+        other_worker = IgnoreListCache()
+        other_worker.generation_key = "route_manager:ignore_list:unavailable"
+        other_worker.current_generation = lambda: None
+
+        IgnoreEntry.objects.bulk_create(
+            [IgnoreEntry(route="203.0.113.0/24", comment="new")]
+        )
+
+        self.assertEqual(
+            other_worker.overlapping(ipaddress.ip_network("203.0.113.5/32")),
+            [ipaddress.ip_network("203.0.113.0/24")],
+        )
+        self.assertIsNone(cache.get(other_worker.generation_key))
+
+
+class TestActiveRouteIndex(TestCase):
+    """The active route index gives the same answers as the database, and keeps up with changes."""
+
+    def setUp(self):
+        """Create active and inactive entries across two actiontypes, some nested inside others."""
+        self.block = ActionType.objects.get(name="block")
+        self.shun = ActionType.objects.create(name="shun")
+        for route, actiontype, is_active in [
+            ("192.0.2.0/24", self.block, True),
+            ("192.0.2.8/29", self.shun, True),
+            ("192.0.2.9/32", self.block, True),
+            ("192.0.2.10/32", self.block, False),
+            ("198.51.100.7/32", self.shun, True),
+            ("2001:db8::/48", self.block, True),
+            ("2001:db8::1/128", self.shun, False),
+        ]:
+            Entry.objects.create(
+                route=Route.objects.create(route=route),
+                actiontype=actiontype,
+                is_active=is_active,
+            )
+        self.queries = [
+            ipaddress.ip_network(network)
+            for network in [
+                "192.0.2.0/24",
+                "192.0.2.9/32",
+                "192.0.2.10/32",
+                "192.0.0.0/16",
+                "198.51.100.7/32",
+                "203.0.113.1/32",
+                "2001:db8::1/128",
+                "2001:db8::/32",
+            ]
+        ]
+
+    def assert_matches_database(self):
+        """Check the index's answers against the database's for every query."""
+        from_index = IsActiveViewSet.find_active_routes(self.queries)
+        with patch.object(active_routes, "get", return_value=None):
+            from_database = IsActiveViewSet.find_active_routes(self.queries)
+        self.assertEqual(from_index, from_database)
+
+    def test_matches_database(self):
+        """A freshly built index agrees with the database."""
+        self.assert_matches_database()
+        contained, covering = active_routes.lookup(self.queries[:2]).values()
+        self.assertEqual(
+            [str(route) for route in contained[0]],
+            ["192.0.2.0/24", "192.0.2.8/29", "192.0.2.9/32"],
+        )
+        self.assertEqual(
+            [str(route) for route in covering[1]],
+            ["192.0.2.0/24", "192.0.2.8/29", "192.0.2.9/32"],
+        )
+
+    def test_changes_are_applied_in_place(self):
+        """Saves, deactivations, and bulk creates update the index without rebuilding it."""
+        self.assert_matches_database()
+
+        with patch.object(active_routes, "load", side_effect=AssertionError):
+            Entry.objects.get(route__route="192.0.2.8/29").delete()
+            Entry.objects.filter(
+                route__route__net_contained="2001:db8::/32"
+            ).deactivate()
+            reactivated = Entry.objects.get(route__route="192.0.2.10/32")
+            reactivated.is_active = True
+            reactivated.save()
+            self.assert_matches_database()
+
+        # This one goes in through bulk_create, which doesn't send post_save
+        uuid = "0e7e1cbd-7d73-4968-bc4b-ce3265dc2fd3"
+        client = Client.objects.create(
+            client_name="authorized_client.es.net", uuid=uuid, is_authorized=True
+        )
+        client.authorized_actiontypes.set([self.block])
+        response = self.client.post(
+            reverse("api:v1:entry-bulk-create"),
+            {
+                "uuid": uuid,
+                "entries": [
+                    {"route": "203.0.113.1/32", "comment": "bulk", "who": "test"}
+                ],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            active_routes.contained(self.queries[5]), [("block", self.queries[5])]
+        )
+        self.assert_matches_database()
+
+    def test_other_workers_apply_changes(self):
+        """Another worker applies the changes we publish to its copy, rather than rebuilding it."""
+        other_worker = ActiveRouteIndex()
+        route = ipaddress.ip_network("192.0.2.10/32")
+        self.assertEqual(other_worker.contained(route), [])
+
+        with (
+            patch.object(other_worker, "load", side_effect=AssertionError),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            reactivated = Entry.objects.get(route__route=route)
+            reactivated.is_active = True
+            reactivated.save()
+        with patch.object(other_worker, "load", side_effect=AssertionError):
+            self.assertEqual(other_worker.contained(route), [("block", route)])
+
+        # A change that's gone from the log leaves a gap, which only a rebuild can fill
+        with self.captureOnCommitCallbacks(execute=True):
+            reactivated.is_active = False
+            reactivated.save()
+        cache.delete(
+            f"{other_worker.change_log_key}:{cache.get(other_worker.generation_key)}"
+        )
+        with patch.object(other_worker, "load", wraps=other_worker.load) as load:
+            self.assertEqual(other_worker.contained(route), [])
+        load.assert_called_once()
+
+    @override_settings(ACTIVE_ROUTE_INDEX_SQL_FALLBACK=True)
+    def test_falls_back_while_warming(self):
+        """With the fallback on, a cold index sends lookups to the database while it builds in the background."""
+        with patch.object(active_routes, "warm") as warm:
+            self.assertIsNone(active_routes.lookup(self.queries))
+        warm.assert_called_once()
+
+        with patch.object(active_routes, "get", return_value=None):
+            response = self.client.get(
+                reverse("api:v1:is_active-list"), {"cidr": "192.0.2.9/32"}
+            )
+        self.assertEqual(
+            response.data["results"], [{"is_active": True, "route": "192.0.2.9/32"}]
+        )
+
+
+class TestClientAuthorizationCache(TestCase):
+    """Client authorizations are cached, and forgotten as soon as the client changes."""
+
+    def setUp(self):
+        """Create a client authorized for block."""
+        self.uuid = "0e7e1cbd-7d73-4968-bc4b-ce3265dc2fd3"
+        self.block = ActionType.objects.get(name="block")
+        self.api_client = Client.objects.create(
+            client_name="authorized_client.es.net", uuid=self.uuid, is_authorized=True
+        )
+        self.api_client.authorized_actiontypes.set([self.block])
+
+    def test_cached(self):
+        """The second lookup doesn't touch the database."""
+        client_authorizations.get(self.uuid)
+
+        with CaptureQueriesContext(connection) as queries:
+            authorization = client_authorizations.get(self.uuid)
+
+        self.assertEqual(len(queries), 0)
+        self.assertTrue(authorization.exists)
+        self.assertTrue(authorization.is_authorized)
+        self.assertEqual(authorization.actiontypes, frozenset({"block"}))
+
+    def test_changes_invalidate(self):
+        """Changing a client or its actiontypes is seen by the next lookup."""
+        shun = ActionType.objects.create(name="shun")
+        client_authorizations.get(self.uuid)
+
+        self.api_client.authorized_actiontypes.add(shun)
+        self.assertEqual(
+            client_authorizations.get(self.uuid).actiontypes,
+            frozenset({"block", "shun"}),
+        )
+
+        self.api_client.is_authorized = False
+        self.api_client.save()
+        self.assertFalse(client_authorizations.get(self.uuid).is_authorized)
+
+    def test_unknown_client(self):
+        """A client that registers after we looked it up isn't stuck as unknown."""
+        uuid = "a9e6c3c9-1f49-4cbb-9a3e-6f6d0f1e2b07"
+        self.assertFalse(client_authorizations.get(uuid).exists)
+
+        Client.objects.create(client_name="new_client.es.net", uuid=uuid)
+        authorization = client_authorizations.get(uuid)
+        self.assertTrue(authorization.exists)
+        self.assertFalse(authorization.is_authorized)
+
+    @override_settings(CLIENT_AUTHORIZATION_CACHE_SIZE=1)
+    def test_lru_is_bounded(self):
+        """The per-process LRU only keeps the most recently used clients."""
+        other = "a9e6c3c9-1f49-4cbb-9a3e-6f6d0f1e2b07"
+        client_authorizations.get(self.uuid)
+        client_authorizations.get(other)
+
+        self.assertEqual(list(client_authorizations._local), [other])  # noqa: SLF001
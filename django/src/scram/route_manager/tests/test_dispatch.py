@@ -0,0 +1,218 @@
+"""Test the compiled dispatch plans for websocket messages."""
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from scram.route_manager.dispatch import ADD, REMOVE, dispatch_plans
+from scram.route_manager.models import (
+    ActionType,
+    Entry,
+    Route,
+    WebSocketMessage,
+    WebSocketSequenceElement,
+)
+from scram.route_manager.views import reprocess_entries
+
+
+class TestDispatchPlans(TestCase):
+    """Plans follow the configured sequences, per verb, and cost no queries once compiled."""
+
+    def setUp(self):
+        """Configure a two step add sequence and a remove sequence for block."""
+        self.block = ActionType.objects.get(name="block")
+        WebSocketSequenceElement.objects.create(
+            websocketmessage=WebSocketMessage.objects.create(
+                msg_type="translator_check",
+                msg_data={"extra": 1},
+                msg_data_route_field="prefix",
+            ),
+            action_type=self.block,
+            verb=ADD,
+            order_num=5,
+        )
+        WebSocketSequenceElement.objects.create(
+            websocketmessage=WebSocketMessage.objects.create(
+                msg_type="translator_remove"
+            ),
+            action_type=self.block,
+            verb=REMOVE,
+        )
+
+    def test_plans_by_verb(self):
+        """Each verb gets only its own sequence, in order, with the route filled in."""
+        add = dispatch_plans.get_plan("block", ADD)
+        self.assertEqual(add.actiontype, self.block)
+        self.assertEqual(add.group, "translator_block")
+        self.assertEqual(
+            add.messages("192.0.2.1/32"),
+            [
+                {"type": "translator_add", "message": {"route": "192.0.2.1/32"}},
+                {
+                    "type": "translator_check",
+                    "message": {"extra": 1, "prefix": "192.0.2.1/32"},
+                },
+            ],
+        )
+        self.assertEqual(
+            dispatch_plans.get_plan("block", REMOVE).messages("192.0.2.1/32"),
+            [{"type": "translator_remove", "message": {"route": "192.0.2.1/32"}}],
+        )
+
+    def test_batch_events(self):
+        """Adds are batched, steps that can't be are sent per route, and each route's steps stay in order."""
+        routes = ["192.0.2.1/32", "192.0.2.2/32"]
+
+        self.assertEqual(
+            dispatch_plans.get_plan("block", ADD).batch_events(routes),
+            [
+                (
+                    "translator_block",
+                    {
+                        "type": "translator_add_batch",
+                        "route_field": "route",
+                        "message": {"routes": routes},
+                    },
+                ),
+                *(
+                    (
+                        "translator_block",
+                        {
+                            "type": "translator_check",
+                            "route_field": "prefix",
+                            "message": {"extra": 1, "prefix": route},
+                        },
+                    )
+                    for route in routes
+                ),
+            ],
+        )
+
+    @override_settings(TRANSLATOR_BATCH_SIZE=1)
+    def test_batch_size(self):
+        """Batches are split at TRANSLATOR_BATCH_SIZE routes."""
+        events = dispatch_plans.get_plan("block", REMOVE).batch_events(
+            [
+                "192.0.2.1/32",
+                "192.0.2.2/32",
+            ]
+        )
+        self.assertEqual(
+            [event["message"]["routes"] for _, event in events],
+            [["192.0.2.1/32"], ["192.0.2.2/32"]],
+        )
+        self.assertEqual(
+            {event["type"] for _, event in events}, {"translator_remove_batch"}
+        )
+
+    def test_removal_falls_back_to_add_sequence(self):
+        """Without an R sequence, withdrawing sends the A sequence as translator_remove."""
+        WebSocketSequenceElement.objects.filter(verb=REMOVE).delete()
+
+        plan, msg_type = dispatch_plans.get_entry_plan("block", is_active=False)
+
+        self.assertEqual(plan.verb, ADD)
+        self.assertEqual(
+            {message["type"] for message in plan.messages("192.0.2.1/32", msg_type)},
+            {"translator_remove"},
+        )
+
+    def test_withdrawing_sends_removal_sequence(self):
+        """Withdrawing an entry here sends what the other instances send when they reprocess the withdrawal."""
+        WebSocketSequenceElement.objects.filter(verb=REMOVE).update(
+            websocketmessage=WebSocketMessage.objects.create(
+                msg_type="translator_remove",
+                msg_data={"extra": 2},
+                msg_data_route_field="prefix",
+            )
+        )
+        entries = [
+            Entry.objects.create(
+                route=Route.objects.create(route=f"192.0.2.{host}/32"),
+                actiontype=self.block,
+            )
+            for host in (1, 2)
+        ]
+        routes = ["192.0.2.1/32", "192.0.2.2/32"]
+
+        def removal(*routes):
+            return (
+                "translator_block",
+                {
+                    "type": "translator_remove_batch",
+                    "route_field": "prefix",
+                    "message": {"extra": 2, "routes": list(routes)},
+                },
+            )
+
+        with mock.patch("scram.route_manager.models.send_to_translators") as send:
+            Entry.objects.filter(pk=entries[0].pk).deactivate()
+            entries[1].delete()
+        self.assertEqual(
+            [call.args[0] for call in send.call_args_list],
+            [[removal(routes[0])], [removal(routes[1])]],
+        )
+
+        with mock.patch("scram.route_manager.views.send_to_translators") as send:
+            reprocess_entries(list(Entry.objects.order_by("pk")))
+        send.assert_called_once_with([removal(*routes)])
+
+    def test_unknown_actiontype(self):
+        """An actiontype with no configuration gets an empty plan."""
+        plan = dispatch_plans.get_plan("nonexistent", ADD)
+        self.assertIsNone(plan.actiontype)
+        self.assertEqual(plan.messages("192.0.2.1/32"), [])
+
+    def test_configuration_changes_invalidate(self):
+        """Editing a message is seen by the next lookup."""
+        dispatch_plans.get_plan("block", ADD)
+        WebSocketMessage.objects.filter(msg_type="translator_check").update(
+            msg_type="translator_other"
+        )
+        # update() doesn't send signals, so save one to trigger the invalidation
+        WebSocketMessage.objects.get(msg_type="translator_other").save()
+
+        types = [
+            message["type"]
+            for message in dispatch_plans.get_plan("block", ADD).messages(
+                "192.0.2.1/32"
+            )
+        ]
+        self.assertEqual(types, ["translator_add", "translator_other"])
+
+    def test_no_metadata_queries_when_creating(self):
+        """Creating an entry doesn't look up the actiontype or its sequence."""
+        get_user_model().objects.create_superuser(
+            "admin", "admin@es.net", "admintestpassword"
+        )
+        self.client.login(username="admin", password="admintestpassword")
+        dispatch_plans.get_plan("block", ADD)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("api:v1:entry-list"),
+                {
+                    "route": "192.0.2.1/32",
+                    "actiontype": "block",
+                    "comment": "test",
+                    "who": "admin",
+                },
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 201)
+        metadata_tables = {
+            ActionType._meta.db_table,
+            WebSocketMessage._meta.db_table,
+            WebSocketSequenceElement._meta.db_table,
+        }
+        for query in queries:
+            if query["sql"].startswith("SELECT"):
+                self.assertFalse(
+                    any(f'FROM "{table}"' in query["sql"] for table in metadata_tables),
+                    query["sql"],
+                )
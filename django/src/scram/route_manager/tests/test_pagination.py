@@ -1,5 +1,7 @@
 """Define simple tests for pagination."""
 
+from unittest.mock import patch
+
 import pytest
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -8,7 +10,9 @@ from django.urls import reverse
 from faker import Faker
 from faker.providers import internet
 
+from scram.route_manager.api.pagination import EntryCursorPagination
 from scram.route_manager.models import ActionType, Entry, Route
+from scram.route_manager.pagination import approximate_count
 
 
 @pytest.mark.django_db
@@ -108,7 +112,7 @@ class TestEntriesListView(TestCase):
         assert entries_context[self.atype1]["total"] == len(self.entries["type1"])
         assert entries_context[self.atype2]["total"] == len(self.entries["type2"])
 
-    @override_settings(PAGINATION_SIZE=5)
+    @override_settings(PAGINATION_SIZE=TEST_PAGINATION_SIZE)
     def test_pagination(self):
         """Test pagination when there's multiple action types."""
         self.client.login(username="testuser", password="testpass123")
@@ -119,44 +123,109 @@ class TestEntriesListView(TestCase):
         entries_context = response.context["entries"]
 
         # First page should have PAGINATION_SIZE entries for actiontype with more entries than pagination size
-        assert len(entries_context[self.atype1]["objs"]) == settings.PAGINATION_SIZE
-        assert entries_context[self.atype1]["page_param"] == "page_type1"
-        assert str(entries_context[self.atype1]["page_number"]) == "1"
+        page = entries_context[self.atype1]["objs"]
+        assert len(page) == settings.PAGINATION_SIZE
+        assert entries_context[self.atype1]["cursor_param"] == "cursor_type1"
+        assert page.has_next
+        assert not page.has_previous
 
         # First page should include all entries for actiontype with less entries than pagination size
         assert len(entries_context[self.atype2]["objs"]) == len(self.entries["type2"])
+        assert not entries_context[self.atype2]["objs"].has_next
 
         # Second page should have the rest of the entries for actiontype with more entries than pagination size
-        page2_response = self.client.get(f"{url}?page_type1=2")
-        page2_context = page2_response.context["entries"]
+        page2_response = self.client.get(f"{url}?cursor_type1={page.next_cursor}")
+        page2 = page2_response.context["entries"][self.atype1]["objs"]
+
+        assert len(page2) == 3
+        assert not page2.has_next
+        assert page2.has_previous
 
-        assert str(page2_context[self.atype1]["page_number"]) == "2"
-        assert len(page2_context[self.atype1]["objs"]) == 3
+        # And going back from the second page should land us on the first page again
+        page1_response = self.client.get(f"{url}?cursor_type1={page2.previous_cursor}")
+        page1 = page1_response.context["entries"][self.atype1]["objs"]
+
+        assert [e.pk for e in page1] == [e.pk for e in page]
+        assert not page1.has_previous
 
     @override_settings(PAGINATION_SIZE=TEST_PAGINATION_SIZE)
     def test_invalid_page_handling(self):
-        """Test handling of invalid page numbers."""
+        """Test handling of invalid cursors."""
         self.client.login(username="testuser", password="testpass123")
 
         url = reverse("route_manager:entry-list")
-        response = self.client.get(f"{url}?page_type1=999")
+        response = self.client.get(f"{url}?cursor_type1=999")
 
         entries_context = response.context["entries"]
 
-        # Should default to page 1
-        assert entries_context[self.atype1]["objs"].number == 1
+        # Should default to the first page
+        assert not entries_context[self.atype1]["objs"].has_previous
+        assert len(entries_context[self.atype1]["objs"]) == self.TEST_PAGINATION_SIZE
 
     def test_multiple_page_parameters(self):
-        """Test that we can have separate pages when we have more than one actiontype."""
+        """Test that we can have separate cursors when we have more than one actiontype."""
         self.client.login(username="testuser", password="testpass123")
 
         url = reverse("route_manager:entry-list")
-        response = self.client.get(f"{url}?page_type1=2&page_type2=1")
+        response = self.client.get(f"{url}?cursor_type1=abc&cursor_type2=def")
 
         entries_context = response.context["entries"]
 
-        # Each type should have its own page number
-        assert str(entries_context[self.atype1]["page_number"]) == "2"
-        assert str(entries_context[self.atype2]["page_number"]) == "1"
-        assert "page_type1" in entries_context[self.atype1]["current_page_params"]
-        assert "page_type2" in entries_context[self.atype1]["current_page_params"]
+        # Each type should carry along the cursor of the other
+        assert "cursor_type1" in entries_context[self.atype1]["current_cursor_params"]
+        assert "cursor_type2" in entries_context[self.atype1]["current_cursor_params"]
+
+    @override_settings(PAGINATION_APPROXIMATE_COUNT=True)
+    def test_approximate_total(self):
+        """The planner's estimate is used for the totals when asked for."""
+        self.client.login(username="testuser", password="testpass123")
+
+        response = self.client.get(reverse("route_manager:entry-list"))
+
+        assert isinstance(response.context["entries"][self.atype1]["total"], int)
+
+
+@pytest.mark.django_db
+class TestEntriesApiPagination(TestCase):
+    """Test the keyset pagination of the entries API."""
+
+    def setUp(self):
+        """Create more active entries than fit on one page."""
+        get_user_model().objects.create_superuser(
+            "admin", "admin@example.net", "admintestpassword"
+        )
+        self.client.login(username="admin", password="admintestpassword")
+        actiontype = ActionType.objects.get(name="block")
+        routes = Route.objects.bulk_create(
+            [Route(route=f"192.0.2.{host}/32") for host in range(1, 8)]
+        )
+        self.entries = Entry.objects.bulk_create(
+            [Entry(route=route, actiontype=actiontype) for route in routes]
+        )
+
+    @patch.object(EntryCursorPagination, "page_size", 5)
+    def test_cursor_pages(self):
+        """Following the next link walks the entries newest first without repeats."""
+        url = reverse("api:v1:entry-list")
+
+        first = self.client.get(url).json()
+        second = self.client.get(first["next"]).json()
+
+        assert "count" not in first
+        assert len(first["results"]) == 5
+        assert len(second["results"]) == 2
+        assert second["next"] is None
+        routes = [e["route"] for e in first["results"] + second["results"]]
+        assert routes == [f"192.0.2.{host}/32" for host in range(7, 0, -1)]
+
+    def test_approximate_count(self):
+        """Clients can ask for the planner's estimate of the total."""
+        response = self.client.get(
+            reverse("api:v1:entry-list"), {"approximate_count": "true"}
+        )
+
+        assert isinstance(response.json()["approximate_count"], int)
+
+    def test_approximate_count_helper(self):
+        """The estimate is an integer even on a tiny, unanalyzed table."""
+        assert approximate_count(Entry.objects.filter(is_active=True)) >= 0
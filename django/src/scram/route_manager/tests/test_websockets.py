@@ -3,18 +3,26 @@
 import json
 from asyncio import gather
 from contextlib import asynccontextmanager
+from datetime import timedelta
 
 from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
 from channels.routing import URLRouter
 from channels.testing import WebsocketCommunicator
 from django.contrib.auth import get_user_model
-from django.test import TransactionTestCase
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
 from config.routing import websocket_urlpatterns
+from scram.route_manager.messaging import send_to_translators, shard_of
 from scram.route_manager.models import (
     ActionType,
     Client,
+    Entry,
+    Route,
+    TranslatorEvent,
     WebSocketMessage,
     WebSocketSequenceElement,
 )
@@ -245,3 +253,496 @@ class TranslatorParametersTestCase(TestTranslatorBaseCase):
                 },
             },
         ]
+
+
+class TranslatorReplayTestCase(TransactionTestCase):
+    """A translator that connects is sent the active entries of its own actiontype, and nothing else."""
+
+    def setUp(self):
+        """Create active and inactive entries for two actiontypes."""
+        block, _ = ActionType.objects.get_or_create(name="block")
+        noop, _ = ActionType.objects.get_or_create(name="noop")
+        for actiontype in [block, noop]:
+            WebSocketSequenceElement.objects.create(
+                websocketmessage=WebSocketMessage.objects.create(
+                    msg_type="translator_add", msg_data_route_field="route"
+                ),
+                verb="A",
+                action_type=actiontype,
+            )
+
+        for route, actiontype, is_active in [
+            ("192.0.2.1/32", block, True),
+            ("192.0.2.2/32", block, False),
+            ("192.0.2.3/32", noop, True),
+            ("2001:db8::1/128", block, True),
+        ]:
+            Entry.objects.create(
+                route=Route.objects.create(route=route),
+                actiontype=actiontype,
+                is_active=is_active,
+            )
+
+    async def replayed_routes(self):
+        """Connect a block translator and collect everything it's sent."""
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), "/ws/route_manager/translator_block/"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        routes = []
+        while not await communicator.receive_nothing(timeout=0.2, interval=0.01):
+            message = json.loads(await communicator.receive_from())
+            assert message["type"] == "translator_add"
+            routes.append(message["message"]["route"])
+        await communicator.disconnect()
+        return routes
+
+    async def test_replay_is_scoped_to_actiontype(self):
+        """Only active block entries are replayed, in the order they were created."""
+        assert await self.replayed_routes() == ["192.0.2.1/32", "2001:db8::1/128"]
+
+        stats = await sync_to_async(cache.get)("translator_replay:block:0")
+        assert stats["routes"] == 2  # noqa: PLR2004
+
+    @override_settings(TRANSLATOR_REPLAY_CHUNK_SIZE=1)
+    async def test_replay_in_chunks(self):
+        """Reading one route at a time replays the same routes."""
+        assert await self.replayed_routes() == ["192.0.2.1/32", "2001:db8::1/128"]
+
+    async def test_reconcile(self):
+        """A translator that can reconcile gets the replay bracketed, and can report how it went."""
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            "/ws/route_manager/translator_block/?capabilities=reconcile",
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+
+        assert await communicator.receive_json_from() == {
+            "type": "translator_reconcile_start",
+            "message": {},
+        }
+        for route in ["192.0.2.1/32", "2001:db8::1/128"]:
+            message = await communicator.receive_json_from()
+            assert message["message"]["route"] == route
+        assert await communicator.receive_json_from() == {
+            "type": "translator_reconcile_end",
+            "message": {"routes": 2},
+        }
+
+        await communicator.send_json_to(
+            {
+                "type": "translator_reconcile_result",
+                "message": {"desired": 2, "added": 1, "removed": 3, "seconds": 0.5},
+            }
+        )
+        await communicator.receive_nothing()
+        result = await sync_to_async(cache.get)("translator_reconcile:block:0")
+        assert result["added"] == 1
+        assert result["removed"] == 3  # noqa: PLR2004
+        await communicator.disconnect()
+
+    async def test_heartbeat_queue_stats(self):
+        """The queue, table and target stats a translator reports with its heartbeat are kept."""
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), "/ws/route_manager/translator_block/"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        for _ in range(2):
+            await communicator.receive_json_from()  # the replay
+        queue = {"depth": 3, "apply_latency_p50": 0.01, "apply_latency_p99": 0.2}
+        rib = {
+            "mirrored": True,
+            "seconds_since_change": 12.5,
+            "v4_destinations": 2,
+            "v4_paths": 2,
+            "v6_destinations": 1,
+            "v6_paths": 1,
+        }
+        targets = [
+            {"target": "gobgp:50051", "up": True, "lag": 0, "queue": queue},
+            {"target": "gobgp-b:50051", "up": False, "lag": 1200, "queue": None},
+        ]
+
+        await communicator.send_json_to(
+            {
+                "type": "translator_heartbeat",
+                "message": {
+                    "v4_count": 2,
+                    "v6_count": 1,
+                    "queue": queue,
+                    "rib": rib,
+                    "targets": targets,
+                },
+            }
+        )
+        await communicator.receive_nothing()
+
+        stats = await sync_to_async(cache.get)("translator_stats:block:0")
+        assert stats["queue"] == queue
+        assert stats["rib"] == rib
+        assert stats["targets"] == targets
+        await communicator.disconnect()
+
+    async def test_batch_replay(self):
+        """A translator that can take batches gets the replay as a single frame."""
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            "/ws/route_manager/translator_block/?capabilities=batch",
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+
+        assert await communicator.receive_json_from() == {
+            "type": "translator_add_batch",
+            "message": {"routes": ["192.0.2.1/32", "2001:db8::1/128"]},
+        }
+        assert await communicator.receive_nothing()
+        await communicator.disconnect()
+
+    async def test_batch_split_for_older_translators(self):
+        """A translator that didn't ask for batches gets one frame per route, with the shared payload in each."""
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), "/ws/route_manager/translator_block/"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        for _ in range(2):
+            await communicator.receive_json_from()  # the replay
+
+        await get_channel_layer().group_send(
+            "translator_block",
+            {
+                "type": "translator_remove_batch",
+                "route_field": "prefix",
+                "message": {"asn": 65550, "routes": ["192.0.2.8/32", "192.0.2.9/32"]},
+            },
+        )
+
+        for route in ["192.0.2.8/32", "192.0.2.9/32"]:
+            assert await communicator.receive_json_from() == {
+                "type": "translator_remove",
+                "message": {"asn": 65550, "prefix": route},
+            }
+        await communicator.disconnect()
+
+
+class TranslatorResumeTestCase(TransactionTestCase):
+    """A translator that can resume is sent only what it missed while it was away."""
+
+    def setUp(self):
+        """Create one active block entry, and record two events for block translators and one for noop."""
+        block, _ = ActionType.objects.get_or_create(name="block")
+        WebSocketSequenceElement.objects.create(
+            websocketmessage=WebSocketMessage.objects.create(
+                msg_type="translator_add", msg_data_route_field="route"
+            ),
+            verb="A",
+            action_type=block,
+        )
+        Entry.objects.create(
+            route=Route.objects.create(route="192.0.2.1/32"), actiontype=block
+        )
+        self.events = send_to_translators(
+            [
+                (
+                    "translator_block",
+                    {"type": "translator_add", "message": {"route": "192.0.2.2/32"}},
+                ),
+                (
+                    "translator_noop",
+                    {"type": "translator_add", "message": {"route": "192.0.2.3/32"}},
+                ),
+                (
+                    "translator_block",
+                    {
+                        "type": "translator_remove",
+                        "message": {"route": "192.0.2.2/32"},
+                    },
+                ),
+            ]
+        )
+
+    @asynccontextmanager
+    async def connect(self, query):
+        """Connect a block translator with the given query string."""
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            f"/ws/route_manager/translator_block/?{query}",
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        try:
+            yield communicator
+        finally:
+            await communicator.disconnect()
+
+    def test_events_are_numbered(self):
+        """Events that change what's announced are recorded in the order they're sent, and checks aren't."""
+        seqs = [event["seq"] for _, event in self.events]
+        assert seqs == sorted(seqs)
+        assert TranslatorEvent.objects.count() == 3  # noqa: PLR2004
+
+        send_to_translators(
+            [("translator_block", {"type": "translator_check", "message": {}})]
+        )
+        assert TranslatorEvent.objects.count() == 3  # noqa: PLR2004
+
+    async def test_resume(self):
+        """Only the block events from the last one the translator applied are sent, instead of the active entries."""
+        first, _, last = (event for _, event in self.events)
+        async with self.connect(f"capabilities=resume&last_seq={first['seq']}") as c:
+            assert await c.receive_json_from() == first
+            assert await c.receive_json_from() == last
+            assert await c.receive_nothing()
+
+        result = await sync_to_async(cache.get)("translator_resume:block:0")
+        assert result["events"] == 2  # noqa: PLR2004
+
+    async def test_resume_from_last_event(self):
+        """A translator that applied everything is sent the overlap again in order, so older events don't win."""
+        first, _, last = (event for _, event in self.events)
+        (_, removed), (_, added) = await sync_to_async(send_to_translators)(
+            [
+                (
+                    "translator_block",
+                    {
+                        "type": "translator_remove",
+                        "message": {"route": "192.0.2.4/32"},
+                    },
+                ),
+                (
+                    "translator_block",
+                    {"type": "translator_add", "message": {"route": "192.0.2.4/32"}},
+                ),
+            ]
+        )
+        async with self.connect(f"capabilities=resume&last_seq={added['seq']}") as c:
+            for event in (first, last, removed, added):
+                assert await c.receive_json_from() == event
+            assert await c.receive_nothing()
+
+    async def test_resume_from_unknown_event(self):
+        """If we don't have the event it's resuming from, the translator gets everything, numbered as of now."""
+        _, _, last = (event for _, event in self.events)
+        async with self.connect("capabilities=resume&last_seq=0") as c:
+            assert await c.receive_json_from() == {
+                "type": "translator_add",
+                "message": {"route": "192.0.2.1/32"},
+                "seq": last["seq"],
+            }
+            assert await c.receive_nothing()
+
+    async def test_resume_too_far_behind(self):
+        """If the translator has missed too many events, it gets everything."""
+        first, _, _ = (event for _, event in self.events)
+        with override_settings(TRANSLATOR_RESUME_MAX_EVENTS=0):
+            async with self.connect(
+                f"capabilities=resume&last_seq={first['seq']}"
+            ) as c:
+                message = await c.receive_json_from()
+                assert message["message"]["route"] == "192.0.2.1/32"
+
+    async def test_live_events_are_numbered_for_resuming_translators(self):
+        """Translators that can resume see sequence numbers on live events, and older ones don't."""
+        async with (
+            self.connect("capabilities=resume&last_seq=0") as new,
+            self.connect("") as old,
+        ):
+            for c in (new, old):
+                await c.receive_json_from()  # the replay
+            (_, event), *_ = await sync_to_async(send_to_translators)(
+                [
+                    (
+                        "translator_block",
+                        {
+                            "type": "translator_add",
+                            "message": {"route": "192.0.2.4/32"},
+                        },
+                    )
+                ]
+            )
+
+            assert await new.receive_json_from() == event
+            assert "seq" not in await old.receive_json_from()
+
+    async def test_ack(self):
+        """The last event a translator says it applied is kept for the health check."""
+        async with self.connect("capabilities=resume") as c:
+            await c.receive_json_from()  # the replay
+            await c.send_json_to({"type": "translator_ack", "message": {"seq": 42}})
+            await c.receive_nothing()
+
+        ack = await sync_to_async(cache.get)("translator_ack:block:0")
+        assert ack["seq"] == 42  # noqa: PLR2004
+
+    def test_prune(self):
+        """Events older than TRANSLATOR_EVENT_RETENTION are pruned."""
+        TranslatorEvent.objects.filter(seq=self.events[0][1]["seq"]).update(
+            created=timezone.now() - timedelta(seconds=3601)
+        )
+        with override_settings(TRANSLATOR_EVENT_RETENTION=3600):
+            assert TranslatorEvent.objects.prune() == 1
+        assert TranslatorEvent.objects.count() == 2  # noqa: PLR2004
+
+
+class TranslatorShardTestCase(TransactionTestCase):
+    """Translators that split an actiontype between them are each sent only the routes their shard owns."""
+
+    routes = [f"192.0.2.{host}/32" for host in range(1, 21)]
+
+    def setUp(self):
+        """Create an active block entry for each route."""
+        block, _ = ActionType.objects.get_or_create(name="block")
+        WebSocketSequenceElement.objects.create(
+            websocketmessage=WebSocketMessage.objects.create(
+                msg_type="translator_add", msg_data_route_field="route"
+            ),
+            verb="A",
+            action_type=block,
+        )
+        for route in self.routes:
+            Entry.objects.create(
+                route=Route.objects.create(route=route), actiontype=block
+            )
+
+    def tearDown(self):
+        """Forget how the shards were split, so translators in other tests aren't rebalanced."""
+        cache.clear()
+
+    @asynccontextmanager
+    async def connect(self, query):
+        """Connect a block translator with the given query string."""
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            f"/ws/route_manager/translator_block/?{query}",
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        try:
+            yield communicator
+        finally:
+            await communicator.disconnect()
+
+    def test_shard_of(self):
+        """A route's shard depends only on its network, and every shard gets some of them."""
+        assert shard_of("192.0.2.1", 4) == shard_of("192.0.2.1/32", 4)
+        assert shard_of("2001:db8::/64", 4) == shard_of("2001:db8::1/64", 4)
+        assert {shard_of(route, 2) for route in self.routes} == {0, 1}
+
+    async def test_replay_is_split(self):
+        """Between them, the shards are replayed every route, and no route twice."""
+        replayed = []
+        for shard in range(2):
+            async with self.connect(f"capabilities=batch&shard={shard}&shards=2") as c:
+                message = await c.receive_json_from()
+                routes = message["message"]["routes"]
+                assert {shard_of(route, 2) for route in routes} == {shard}
+                replayed.append(set(routes))
+
+        assert replayed[0].isdisjoint(replayed[1])
+        assert replayed[0] | replayed[1] == set(self.routes)
+
+    async def test_live_events_go_to_the_owner(self):
+        """A route's events only go to its shard, and events about every route go to all of them."""
+        route = self.routes[0]
+        owner = shard_of(route, 2)
+        async with (
+            self.connect(f"shard={owner}&shards=2") as mine,
+            self.connect(f"shard={1 - owner}&shards=2") as theirs,
+        ):
+            for c in (mine, theirs):
+                while not await c.receive_nothing():
+                    await c.receive_json_from()  # the replay
+
+            await sync_to_async(send_to_translators)(
+                [
+                    (
+                        "translator_block",
+                        {
+                            "type": "translator_remove",
+                            "route_field": "route",
+                            "message": {"route": route},
+                        },
+                    ),
+                    (
+                        "translator_block",
+                        {"type": "translator_remove_all", "message": {}},
+                    ),
+                ]
+            )
+
+            assert await mine.receive_json_from() == {
+                "type": "translator_remove",
+                "message": {"route": route},
+            }
+            for c in (mine, theirs):
+                message = await c.receive_json_from()
+                assert message["type"] == "translator_remove_all"
+                assert await c.receive_nothing()
+
+    async def test_invalid_shard(self):
+        """A translator that isn't one of the shards it says there are is turned away."""
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            "/ws/route_manager/translator_block/?shard=2&shards=2",
+        )
+        connected, _ = await communicator.connect()
+        assert not connected
+
+    async def test_rebalance(self):
+        """A translator sharded differently from the last one is replayed everything it owns, rather than resumed."""
+        (_, event), *_ = await sync_to_async(send_to_translators)(
+            [("translator_block", {"type": "translator_remove_all", "message": {}})]
+        )
+        for shard in range(2):
+            await sync_to_async(cache.set)(f"translator_shards:block:{shard}", 2)
+
+        # Each shard is replayed as it's restarted, not only the first
+        for shard in range(2):
+            async with self.connect(
+                f"capabilities=resume&last_seq={event['seq']}&shard={shard}&shards=3"
+            ) as c:
+                message = await c.receive_json_from()
+                assert shard_of(message["message"]["route"], 3) == shard
+
+        assert await sync_to_async(cache.get)("translator_shards:block") == 3  # noqa: PLR2004
+
+        async with self.connect(f"capabilities=resume&last_seq={event['seq']}") as c:
+            # Unsharded, it owns everything it was sent before the remove_all
+            message = await c.receive_json_from()
+            assert message["type"] == "translator_add"
+
+    async def test_health_check_per_shard(self):
+        """Each shard's heartbeat and ack are kept apart, and the health check adds up their routes."""
+        for shard in range(2):
+            async with self.connect(f"capabilities=resume&shard={shard}&shards=2") as c:
+                while not await c.receive_nothing():
+                    await c.receive_json_from()  # the replay
+                await c.send_json_to(
+                    {
+                        "type": "translator_heartbeat",
+                        "message": {"v4_count": 10 + shard, "v6_count": shard},
+                    }
+                )
+                await c.send_json_to(
+                    {"type": "translator_ack", "message": {"seq": 100 + shard}}
+                )
+                await c.receive_nothing()
+
+        response = await self.async_client.get(reverse("route_manager:health"))
+        block = response.json()["connected_translators"]["block"]
+        assert block["shards"] == 2  # noqa: PLR2004
+        assert block["gobgp_routes"] == {"v4": 21, "v6": 1}
+        assert [shard["shard"] for shard in block["by_shard"]] == [0, 1]
+        for shard in block["by_shard"]:
+            assert shard["gobgp_routes"] == {
+                "v4": 10 + shard["shard"],
+                "v6": shard["shard"],
+            }
+            assert shard["last_ack"]["seq"] == 100 + shard["shard"]
+            assert shard["last_replay"]["routes"] == sum(
+                shard_of(route, 2) == shard["shard"] for route in self.routes
+            )
@@ -6,14 +6,11 @@ from datetime import datetime, timedelta
 from typing import Any
 
 import rest_framework.utils.serializer_helpers
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.db import transaction
 from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect, render
@@ -21,14 +18,14 @@ from django.utils import timezone
 from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import DetailView, ListView
 
-from scram.route_manager.models import WebSocketSequenceElement
-
 from ..route_manager.api.views import EntryViewSet
 from ..shared.shared_code import make_random_password
 from ..users.models import User
-from .models import ActionType, Entry
+from .dispatch import dispatch_plans
+from .messaging import send_to_translators
+from .models import ActionType, Entry, TranslatorEvent
+from .pagination import approximate_count, keyset_page
 
-channel_layer = get_channel_layer()
 logger = logging.getLogger(__name__)
 
 
@@ -228,23 +225,18 @@ def reprocess_entries(entries_to_process: list[Entry]) -> None:
     """
     logger.info("Reprocessing %d entries", len(entries_to_process))
 
+    routes = {}
     for entry in entries_to_process:
-        message_type = "translator_add" if entry.is_active else "translator_remove"
         logger.info("Processing entry %s (active=%s)", entry, entry.is_active)
-
-        translator_group = f"translator_{entry.actiontype}"
-        elements = (
-            WebSocketSequenceElement.objects.filter(action_type__name=entry.actiontype)
-            .order_by("order_num")
-            .select_related("websocketmessage")
+        routes.setdefault((entry.actiontype.name, entry.is_active), []).append(
+            entry.route
         )
 
-        for element in elements:
-            msg = element.websocketmessage
-            msg.msg_data[msg.msg_data_route_field] = str(entry.route)
-
-            json_to_send = {"type": message_type, "message": msg.msg_data}
-            async_to_sync(channel_layer.group_send)(translator_group, json_to_send)
+    events = []
+    for (actiontype, is_active), batch in routes.items():
+        plan, message_type = dispatch_plans.get_entry_plan(actiontype, is_active)
+        events.extend(plan.batch_events(batch, message_type))
+    send_to_translators(events)
 
 
 def process_updates(request):
@@ -260,10 +252,11 @@ def process_updates(request):
     entries_start = Entry.objects.filter(is_active=True).count()
 
     logger.debug("Looking for expired entries")
-    # More efficient to call objects.filter.delete, but that doesn't call the Entry.delete() method
-    for obj in Entry.objects.filter(is_active=True, expiration__lt=current_time):
-        logger.info("Found expired entry: %s. Deleting now", obj)
-        obj.delete()
+    expired = Entry.objects.filter(
+        is_active=True, expiration__lt=current_time
+    ).deactivate("Expired")
+    for obj in expired:
+        logger.info("Deactivated expired entry: %s", obj)
     entries_end = Entry.objects.filter(is_active=True).count()
 
     # Grab all of the other entries that need processing and... process them!
@@ -276,6 +269,9 @@ def process_updates(request):
     else:
         logger.info("No new entries to process")
 
+    pruned = TranslatorEvent.objects.prune()
+    logger.debug("Pruned %d translator events", pruned)
+
     return JsonResponse(
         {
             "entries_deleted": entries_start - entries_end,
@@ -298,43 +294,40 @@ class EntryListView(ListView):
     model = Entry
     template_name = "route_manager/entry_list.html"
     context_object_name = "object_list"
-    paginate_by = settings.PAGINATION_SIZE
 
     def get_context_data(self, **kwargs):
-        """Add action type grouping to context with separate paginators."""
+        """Add action type grouping to context, with a separate keyset cursor per action type."""
         context = super().get_context_data(**kwargs)
 
-        current_page_params = {}
+        current_cursor_params = {}
         for key, value in self.request.GET.items():
-            if key.startswith("page_"):
-                current_page_params[key] = value
+            if key.startswith("cursor_"):
+                current_cursor_params[key] = value
 
         entries_by_type = {}
 
         # Get all available action types
         for at in ActionType.objects.filter(available=True):
-            queryset = Entry.objects.filter(actiontype=at, is_active=True).order_by(
-                "-pk"
+            queryset = Entry.objects.filter(actiontype=at, is_active=True)
+
+            # Get the cursor from request with a unique parameter name per type
+            cursor_param = f"cursor_{at.name.lower()}"
+            page = keyset_page(
+                queryset,
+                self.request.GET.get(cursor_param),
+                settings.PAGINATION_SIZE,
             )
 
-            # Create a paginator for this action type
-            paginator = Paginator(queryset, settings.PAGINATION_SIZE)
-
-            # Get page number from request with a unique parameter name per type
-            page_param = f"page_{at.name.lower()}"
-            page_number = self.request.GET.get(page_param, 1)
-
-            try:
-                page_obj = paginator.page(page_number)
-            except (PageNotAnInteger, EmptyPage):
-                page_obj = paginator.page(1)
+            if settings.PAGINATION_APPROXIMATE_COUNT:
+                total = approximate_count(queryset)
+            else:
+                total = queryset.count()
 
             entries_by_type[at] = {
-                "total": queryset.count(),
-                "objs": page_obj,
-                "page_param": page_param,
-                "page_number": page_number,
-                "current_page_params": current_page_params.copy(),
+                "total": total,
+                "objs": page,
+                "cursor_param": cursor_param,
+                "current_cursor_params": current_cursor_params.copy(),
             }
 
         context["entries"] = entries_by_type
@@ -0,0 +1,230 @@
+"""What the translator announces routes to: GoBGP in production, or an in-memory stand-in for load tests.
+
+Every backend has the methods of the `Backend` protocol, which are the ones PathBatcher, Reconciler and Fanout call,
+and `make_backend` returns the one settings.backend asks for. The stand-ins don't need GoBGP, or its generated
+protobufs, so the translator can be run against Django on a laptop, and its own overhead measured apart from GoBGP's.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Protocol
+
+from .rib import RibMirror
+from .settings import BackendTypes, settings
+from .shared import IPV4, IPV6
+
+logger = logging.getLogger(__name__)
+
+
+class Backend(Protocol):
+    """Somewhere to announce routes, with `rib` mirroring what it's announcing while `follow` runs.
+
+    Routes are passed as an `ipaddress.ip_interface` along with the event data Django sent with them (ASN, community
+    and so on), which a backend may ignore.
+    """
+
+    rib: RibMirror
+
+    async def add_path(self, ip, event_data):
+        """Announce a single route."""
+        ...
+
+    async def add_paths(self, routes):
+        """Announce many routes, given as (ip, event_data) pairs."""
+        ...
+
+    async def del_path(self, ip, event_data):
+        """Withdraw a single route."""
+        ...
+
+    async def del_paths(self, routes):
+        """Withdraw many routes, given as (ip, event_data) pairs."""
+        ...
+
+    async def del_all_paths(self):
+        """Withdraw every route."""
+        ...
+
+    async def is_blocked(self, ip):
+        """Return whether at least one announced route contains the address."""
+        ...
+
+    async def get_route_count(self, ip_version):
+        """Return the number of announced routes for an IP version."""
+        ...
+
+    async def announced(self):
+        """Return the set of announced networks."""
+        ...
+
+    async def get_table(self, ip_version):
+        """Return the number of destinations and paths announced for an IP version."""
+        ...
+
+    async def rib_stats(self):
+        """Summarize what's announced, for the heartbeat."""
+        ...
+
+    async def follow(self):
+        """Keep `rib` current, until we lose track of what's announced."""
+        ...
+
+    async def close(self):
+        """Let go of anything we're holding on to."""
+        ...
+
+
+class MemoryBackend:
+    """Announce routes to a table in memory, taking as long over each call as we're told to.
+
+    The table is our RIB mirror, so it's always ready, and checks and counts never wait. `calls` and `routes` count
+    what we've been asked to do, by method and by whether the routes were announced or withdrawn.
+    """
+
+    def __init__(self, call_seconds=0.0, route_seconds=0.0):
+        """Start with nothing announced, taking call_seconds over each call and route_seconds more for each route."""
+        self.rib = RibMirror()
+        self.rib.replace([])
+        self.call_seconds = call_seconds
+        self.route_seconds = route_seconds
+        self.calls = Counter()
+        self.routes = Counter()
+
+    async def _call(self, method, routes=1):
+        """Count a call, and take as long over it as a real backend would."""
+        self.calls[method] += 1
+        # Even with no latency, give everything else a turn, as waiting on GoBGP would
+        await asyncio.sleep(self.call_seconds + self.route_seconds * routes)
+
+    def _announce(self, networks):
+        self.routes["announced"] += len(networks)
+        for network in networks:
+            self.rib.add(network)
+
+    def _withdraw(self, networks):
+        self.routes["withdrawn"] += len(networks)
+        for network in networks:
+            self.rib.discard(network)
+
+    def _withdraw_all(self):
+        self.routes["withdrawn"] += len(self.rib)
+        self.rib.clear()
+
+    async def add_path(self, ip, event_data):
+        """Announce a single route."""
+        await self._call("add_path")
+        self._announce([ip.network])
+
+    async def add_paths(self, routes):
+        """Announce many routes, given as (ip, event_data) pairs."""
+        await self._call("add_paths", len(routes))
+        self._announce([ip.network for ip, _ in routes])
+
+    async def del_path(self, ip, event_data):
+        """Withdraw a single route."""
+        await self._call("del_path")
+        self._withdraw([ip.network])
+
+    async def del_paths(self, routes):
+        """Withdraw many routes, given as (ip, event_data) pairs."""
+        await self._call("del_paths", len(routes))
+        self._withdraw([ip.network for ip, _ in routes])
+
+    async def del_all_paths(self):
+        """Withdraw every route."""
+        logger.warning("Withdrawing ALL routes")
+        await self._call("del_all_paths")
+        self._withdraw_all()
+
+    async def is_blocked(self, ip):
+        """Return whether at least one announced route contains the address.
+
+        Returns:
+            bool: Whether one does.
+        """
+        return self.rib.covers(ip.ip)
+
+    async def get_route_count(self, ip_version):
+        """Return the number of announced routes for an IP version.
+
+        Returns:
+            int: The number of routes.
+        """
+        return self.rib.count(ip_version)
+
+    async def announced(self):
+        """Return the set of announced networks.
+
+        Returns:
+            set: The networks.
+        """
+        return set(self.rib)
+
+    async def get_table(self, ip_version):
+        """Return the number of destinations and paths announced for an IP version.
+
+        Returns:
+            dict: The counts, which are the same, since we only hold one path per destination.
+        """
+        await self._call("get_table")
+        count = self.rib.count(ip_version)
+        return {"destinations": count, "paths": count}
+
+    async def rib_stats(self):
+        """Summarize what's announced, for the heartbeat.
+
+        Returns:
+            dict: What GoBGP.rib_stats returns.
+        """
+        stats = {
+            "mirrored": self.rib.ready,
+            "seconds_since_change": None if self.rib.last_change is None else time.monotonic() - self.rib.last_change,
+        }
+        for ip_version in (IPV4, IPV6):
+            table = await self.get_table(ip_version)
+            stats[f"v{ip_version}_destinations"] = table["destinations"]
+            stats[f"v{ip_version}_paths"] = table["paths"]
+        return stats
+
+    async def follow(self):  # noqa: PLR6301 (it's part of the protocol)
+        """Wait forever, since nobody else can change our table, so there's nothing to keep up with."""
+        await asyncio.Event().wait()
+
+    async def close(self):
+        """Log what we were asked to do, since there's nothing to close."""
+        logger.info("Closing %s after %s, for %s", type(self).__name__, dict(self.calls), dict(self.routes))
+
+
+class CountingBackend(MemoryBackend):
+    """Announce nothing, only counting the calls and routes we're asked for, so we cost next to nothing.
+
+    Nothing is ever announced, so checks always say so, and a reconciliation announces every route it's replayed.
+    """
+
+    def _announce(self, networks):
+        self.routes["announced"] += len(networks)
+
+    def _withdraw(self, networks):
+        self.routes["withdrawn"] += len(networks)
+
+    def _withdraw_all(self):
+        pass
+
+
+def make_backend(url):
+    """Return the backend settings.backend asks for, which for GoBGP is the one at url.
+
+    Returns:
+        Backend: The backend.
+    """
+    match settings.backend:
+        case BackendTypes.MEMORY:
+            return MemoryBackend(settings.memory_backend_call_seconds, settings.memory_backend_route_seconds)
+        case BackendTypes.NULL:
+            return CountingBackend()
+    # Only GoBGP needs the generated protobufs, so we don't import them unless we're using it
+    from .gobgp import GoBGP  # noqa: PLC0415
+
+    return GoBGP(url)
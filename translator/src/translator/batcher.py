@@ -0,0 +1,122 @@
+"""Group announcements and withdrawals into batches, so GoBGP sees one round-trip per batch rather than per route."""
+
+import asyncio
+import logging
+
+from grpc import RpcError
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+ADD = "add"
+REMOVE = "remove"
+
+
+class PathBatcher:
+    """Wrap a GoBGP (or any other Backend), queueing add_path and del_path calls and sending them in batches.
+
+    Consecutive calls of the same kind are collected until there are settings.gobgp_batch_size of them, or
+    settings.gobgp_batch_interval_seconds has passed since the first, and then sent together. A call of the other
+    kind sends what's pending first, as does anything that reads GoBGP's state, so nothing is ever reordered and
+    checks never see a stale table.
+
+    A batch that fails while being sent in the background is dropped, and the error is raised by the next call, so
+    that we reconnect and Django replays what we missed.
+    """
+
+    def __init__(self, g):
+        """Wrap a backend."""
+        self.g = g
+        self._kind = None
+        self._pending = []
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._error = None
+
+    async def add_path(self, ip, event_data):
+        """Queue a route to be announced."""
+        await self._queue(ADD, ip, event_data)
+
+    async def del_path(self, ip, event_data):
+        """Queue a route to be withdrawn."""
+        await self._queue(REMOVE, ip, event_data)
+
+    async def del_all_paths(self):
+        """Send what's pending, then withdraw everything."""
+        await self.flush()
+        await self.g.del_all_paths()
+
+    async def is_blocked(self, ip):
+        """Send what's pending, then check whether the route is announced.
+
+        Returns:
+            bool: Whether at least one route matching the prefix is being announced.
+        """
+        await self.flush()
+        return await self.g.is_blocked(ip)
+
+    async def announced(self):
+        """Send what's pending, then find out what GoBGP is announcing.
+
+        Returns:
+            set: The networks in the global RIB.
+        """
+        await self.flush()
+        return await self.g.announced()
+
+    async def get_route_count(self, ip_version):
+        """Return the number of routes in the global RIB for a given IP version, not counting what's pending."""
+        return await self.g.get_route_count(ip_version)
+
+    async def rib_stats(self):
+        """Summarize the global RIB, not counting what's pending.
+
+        Returns:
+            dict: What GoBGP.rib_stats returns.
+        """
+        return await self.g.rib_stats()
+
+    async def flush(self):
+        """Send whatever is pending."""
+        async with self._lock:
+            kind, routes = self._kind, self._pending
+            self._kind, self._pending = None, []
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+            if routes:
+                send = self.g.add_paths if kind == ADD else self.g.del_paths
+                await send(routes)
+        self._raise_error()
+
+    async def close(self):
+        """Drop whatever is pending and close the GoBGP channel."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._pending = []
+        await self.g.close()
+
+    async def _queue(self, kind, ip, event_data):
+        self._raise_error()
+        while self._pending and self._kind != kind:
+            await self.flush()
+        self._kind = kind
+        self._pending.append((ip, event_data))
+        if len(self._pending) >= settings.gobgp_batch_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(settings.gobgp_batch_interval_seconds)
+        try:
+            await self.flush()
+        except RpcError as e:
+            logger.warning("Failed to send a batch to GoBGP: %s", e)
+            self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -3,3 +3,7 @@
 
 class ASNError(TypeError):
     """ASNError provides an error class to use when there is an issue with an Autonomous System Number."""
+
+
+class TargetsDownError(RuntimeError):
+    """TargetsDownError is raised when every GoBGP we announce to has failed, so there's nowhere to apply messages."""
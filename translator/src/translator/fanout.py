@@ -0,0 +1,331 @@
+"""Apply Django's messages to every GoBGP we announce to, without letting a slow or broken one hold up the rest."""
+
+import asyncio
+import ipaddress
+import logging
+
+from grpc import RpcError
+
+from . import metrics
+from .backends import make_backend
+from .batcher import PathBatcher
+from .exceptions import TargetsDownError
+from .reconcile import Reconciler
+from .settings import settings
+from .shared import IPV4, IPV6
+from .workqueue import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+# How long we wait between checks on a GoBGP we've given up on, and between attempts to follow its RIB
+RETRY_INTERVAL_SECONDS = 10
+
+
+class Target:
+    """One GoBGP, or other backend: its batcher and RIB mirror, and while we're connected to Django, a work queue.
+
+    Messages reach the work queue through an intake queue of their own, so a target that's slow to take them doesn't
+    stop us handing messages to the others.
+    """
+
+    def __init__(self, url, on_failure):
+        """Open a channel to the GoBGP at url; on_failure(target, reason) is called if applying a message fails."""
+        self.url = url
+        self.backend = make_backend(url)
+        self.g = Reconciler(PathBatcher(self.backend))
+        self.up = False
+        self.queue = None
+        self._on_failure = on_failure
+        self._intake = None
+        self._feeder = None
+
+    @property
+    def depth(self):
+        """How many messages are waiting to be applied."""
+        if self.queue is None:
+            return 0
+        return self._intake.qsize() + self.queue.depth
+
+    def start(self, apply):
+        """Start taking messages for a new connection to Django, applying each with apply(target, message)."""
+        # If we lost the last connection part way through a reconciliation, Django will start a new one
+        self.g.cancel()
+        self.up = True
+        self.queue = WorkQueue(lambda item: apply(self, item))
+        self.queue.start()
+        self._intake = asyncio.Queue(maxsize=settings.queue_size)
+        self._feeder = asyncio.create_task(self._feed())
+
+    async def stop(self):
+        """Stop taking messages, abandoning anything still queued."""
+        if self._feeder is not None:
+            self._feeder.cancel()
+            await asyncio.gather(self._feeder, return_exceptions=True)
+            self._feeder = None
+        if self.queue is not None:
+            await self.queue.stop()
+
+    @property
+    def full(self):
+        """Whether there's no room to queue another message."""
+        return self._intake.full()
+
+    async def put(self, key, item):
+        """Queue a message, waiting for room."""
+        await self._intake.put((key, item))
+
+    def offer(self, key, item):
+        """Queue a message if there's room for it.
+
+        Returns:
+            bool: Whether there was.
+        """
+        try:
+            self._intake.put_nowait((key, item))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def discard(self):
+        """Throw away whatever's waiting in the intake queue, so nobody waits for it to drain."""
+        while not self._intake.empty():
+            self._intake.get_nowait()
+            self._intake.task_done()
+
+    async def drain(self):
+        """Wait until everything queued has been applied."""
+        try:
+            await self._intake.join()
+            await self.queue.drain()
+        except RpcError as e:
+            self._on_failure(self, e)
+
+    async def flush(self):
+        """Send whatever the batcher has pending."""
+        try:
+            await self.g.flush()
+        except RpcError as e:
+            self._on_failure(self, e)
+
+    def stats(self, submitted):
+        """Summarize how the target is doing, given how many messages have been submitted on this connection.
+
+        Returns:
+            dict: Whether it's up, how many messages it's behind, and its work queue stats.
+        """
+        return {
+            "target": self.url,
+            "up": self.up,
+            "lag": submitted - self.queue.applied if self.queue is not None else 0,
+            "queue": self.queue.stats() if self.queue is not None else None,
+        }
+
+    async def _feed(self):
+        while True:
+            key, item = await self._intake.get()
+            try:
+                await self.queue.submit(key, item)
+            except RpcError as e:
+                self._on_failure(self, e)
+                return
+            finally:
+                self._intake.task_done()
+
+
+class Fanout:
+    """Every GoBGP we announce to, each applying the same messages in the same order, independently of the others.
+
+    When a target's queue is full we wait for it to make room, which holds up reading the websocket, so a burst that
+    every target is slow to apply is taken at the pace of the slowest. A target that fails, or that makes no room for
+    settings.target_stall_seconds while another target has some, is dropped for the rest of the connection. We stop
+    acknowledging events, since it hasn't applied them, and once it answers again we set `resync`, so that we
+    reconnect and get a full replay that brings it back in line. With only one target there's nobody to keep up with,
+    so we wait for it however long it takes, as we always have.
+    """
+
+    def __init__(self, urls, progress):
+        """Open a channel to each GoBGP, keeping track of what we've applied everywhere in progress."""
+        self.targets = [Target(url, self.fail) for url in urls]
+        self.progress = progress
+        self.resync = asyncio.Event()
+        self.submitted = 0
+        self._tasks = set()
+        self._recoveries = {}
+        for target in self.targets:
+            metrics.TARGET_LAG.labels(target=target.url).set_function(
+                lambda target=target: target.stats(self.submitted)["lag"]
+            )
+            for ip_version in (IPV4, IPV6):
+                metrics.RIB_ROUTES.labels(target=target.url, ip_version=ip_version).set_function(
+                    lambda ip_version=ip_version, rib=target.backend.rib: rib.count(ip_version)
+                )
+
+    @property
+    def primary(self):
+        """The first target that's up, which answers for all of them in the heartbeat, or None if none are."""
+        return next((target for target in self.targets if target.up), None)
+
+    @property
+    def depth(self):
+        """How many messages are waiting to be applied, across every target."""
+        return sum(target.depth for target in self.targets)
+
+    @property
+    def applied(self):
+        """The number of the last message every target has applied along with everything before it.
+
+        None if any target is down, since it hasn't applied them.
+        """
+        if not all(target.up for target in self.targets):
+            return None
+        return min(target.queue.applied for target in self.targets)
+
+    @property
+    def reconciling(self):
+        """Whether any target is in the middle of a reconciliation."""
+        return any(target.g.reconciling for target in self.targets if target.up)
+
+    def open(self):
+        """Start mirroring each target's RIB."""
+        for target in self.targets:
+            self._spawn(self._follow(target))
+
+    def start(self, apply):
+        """Start taking messages for a new connection to Django, applying each with apply(target, message)."""
+        self.submitted = 0
+        # This connection brings every target back in line
+        self.resync.clear()
+        for task in self._recoveries.values():
+            task.cancel()
+        self._recoveries = {}
+        for target in self.targets:
+            target.start(apply)
+            metrics.TARGET_UP.labels(target=target.url).set(1)
+
+    async def stop(self):
+        """Stop taking messages, abandoning anything still queued."""
+        await asyncio.gather(*(target.stop() for target in self.targets))
+
+    async def restore(self, routes):
+        """Make every target announce just the routes we were last told to, before we've heard from Django.
+
+        Args:
+            routes (dict): The event data for each route, as kept by the Journal.
+
+        Returns:
+            bool: Whether every target could.
+        """
+        return all(await asyncio.gather(*(self._restore(target, routes) for target in self.targets)))
+
+    async def submit(self, key, item):
+        """Hand a message to every target that's up, waiting for room on any that don't have it.
+
+        Raises:
+            TargetsDownError: If there are none.
+        """
+        self.submitted += 1
+        live = [target for target in self.targets if target.up]
+        if not live:
+            raise TargetsDownError
+        full = [target for target in live if not target.offer(key, item)]
+        await asyncio.gather(*(self._put(target, key, item) for target in full))
+
+    async def drain(self):
+        """Wait until every target that's up has applied everything queued."""
+        await asyncio.gather(*(target.drain() for target in self.targets if target.up))
+
+    async def flush(self):
+        """Send whatever each target that's up has pending."""
+        await asyncio.gather(*(target.flush() for target in self.targets if target.up))
+
+    def fail(self, target, reason):
+        """Stop sending messages to a target until a full replay can bring it back in line."""
+        if not target.up:
+            return
+        logger.warning("Giving up on GoBGP at %s until it's back: %s", target.url, reason)
+        target.up = False
+        target.discard()
+        metrics.TARGET_UP.labels(target=target.url).set(0)
+        self.progress.reset()
+        self._recoveries[target.url] = asyncio.create_task(self._recover(target))
+
+    def stats(self):
+        """Summarize how each target is doing, for the heartbeat.
+
+        Returns:
+            list[dict]: What Target.stats returns, for each target.
+        """
+        return [target.stats(self.submitted) for target in self.targets]
+
+    async def close(self):
+        """Stop everything, and close each target's channel."""
+        tasks = [*self._tasks, *self._recoveries.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.stop()
+        await asyncio.gather(*(target.g.close() for target in self.targets))
+
+    async def _put(self, target, key, item):
+        """Queue a message for a target once it has room, unless it stalls while another target keeps up."""
+        while target.up:
+            try:
+                await asyncio.wait_for(target.put(key, item), settings.target_stall_seconds)
+            except TimeoutError:
+                if any(other.up and not other.full for other in self.targets if other is not target):
+                    self.fail(target, f"made no room for messages in {settings.target_stall_seconds}s")
+            else:
+                return
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _restore(target, routes):
+        """Reconcile a target with routes, as if Django had replayed them.
+
+        Returns:
+            bool: Whether it could.
+        """
+        target.g.begin()
+        try:
+            for data in routes.values():
+                await target.g.add_path(ipaddress.ip_interface(data["route"]), data)
+            result = await target.g.end()
+        except RpcError as e:
+            target.g.cancel()
+            logger.warning("Couldn't restore GoBGP at %s from the journal: %s", target.url, e)
+            return False
+        logger.info("Restored GoBGP at %s from the journal: %s", target.url, result)
+        return True
+
+    async def _recover(self, target):
+        """Wait for a target we gave up on to answer again, then ask for a full replay."""
+        while True:
+            await asyncio.sleep(RETRY_INTERVAL_SECONDS)
+            try:
+                await target.backend.get_table(IPV4)
+            except RpcError:
+                continue
+            logger.info("GoBGP at %s is back, asking Django for everything again", target.url)
+            self.resync.set()
+            return
+
+    async def _follow(self, target):
+        """Keep a target's RIB mirror current, restarting the watch whenever it ends."""
+        while True:
+            generation = target.backend.rib.generation
+            try:
+                await target.backend.follow()
+            except RpcError as e:
+                logger.warning(
+                    "Lost GoBGP's event stream at %s, checking against it until it's back: %s", target.url, e
+                )
+            # It may have restarted and lost our routes, so we can't resume from where we got to
+            self.progress.reset()
+            if target.backend.rib.generation != generation:
+                # We were following it, so this is news; if we never got that far, there's nothing to bring back
+                self.fail(target, "lost its event stream")
+            await asyncio.sleep(RETRY_INTERVAL_SECONDS)
@@ -1,45 +1,79 @@
 """A translator interface for GoBGP (https://github.com/osrg/gobgp)."""
 
+import asyncio
+import ipaddress
 import logging
+import time
 
 import grpc
 from api import attribute_pb2, common_pb2, gobgp_pb2, gobgp_pb2_grpc, nlri_pb2
 
 from .exceptions import ASNError
+from .metrics import GOBGP_RPC_SECONDS
+from .rib import RibMirror
 from .settings import settings
-from .shared import asn_is_valid
+from .shared import IPV4, IPV6, asn_is_valid
 
-_TIMEOUT_SECONDS = 1000
 MAX_SMALL_ASN = 2**16
 MAX_SMALL_COMM = 2**16
-IPV4 = 4
-IPV6 = 6
+# How many distinct (ip version, ASN, community, next hop) attribute sets to keep built
+ATTRIBUTE_CACHE_SIZE = 256
+# How long we give a new event stream to be set up before listing the table, if GoBGP doesn't tell us it's ready
+WATCH_SETUP_SECONDS = 1
+
+_FAMILIES = {
+    IPV4: common_pb2.Family(afi=common_pb2.Family.AFI_IP, safi=common_pb2.Family.SAFI_UNICAST),
+    IPV6: common_pb2.Family(afi=common_pb2.Family.AFI_IP6, safi=common_pb2.Family.SAFI_UNICAST),
+}
 
 logger = logging.getLogger(__name__)
 
 
 class GoBGP:
-    """Represents a GoBGP instance."""
+    """Represents a GoBGP instance.
+
+    All calls are made over an asyncio gRPC channel, so they don't block the event loop and any number of them can be
+    in flight at once. The channel is bound to the event loop that's running when it's created.
+
+    While `follow` is running, `rib` mirrors GoBGP's global table, and checks and counts are answered from it.
+    """
 
     def __init__(self, url):
         """Configure the channel used for communication."""
-        channel = grpc.insecure_channel(url)
-        self.stub = gobgp_pb2_grpc.GoBgpServiceStub(channel)
+        self.channel = grpc.aio.insecure_channel(
+            url,
+            options=[
+                ("grpc.keepalive_time_ms", settings.gobgp_keepalive_time_ms),
+                ("grpc.keepalive_timeout_ms", settings.gobgp_keepalive_timeout_ms),
+                # GoBGP is otherwise idle between blocks, and that's exactly when we want to notice it's gone
+                ("grpc.keepalive_permit_without_calls", 1),
+                ("grpc.http2.max_pings_without_data", 0),
+            ],
+        )
+        self.stub = gobgp_pb2_grpc.GoBgpServiceStub(self.channel)
+        self.rib = RibMirror()
+        self._attribute_cache = {}
+
+    async def close(self):
+        """Close the channel, cancelling any calls still in flight."""
+        await self.channel.close()
+
+    @staticmethod
+    def _path_network(path):
+        prefix = path.nlri.prefix
+        return ipaddress.ip_network(f"{prefix.prefix}/{prefix.prefix_len}", strict=False)
 
     @staticmethod
     def _family(ip_version):
-        afi = common_pb2.Family.AFI_IP6 if ip_version == IPV6 else common_pb2.Family.AFI_IP
-        return common_pb2.Family(afi=afi, safi=common_pb2.Family.SAFI_UNICAST)
+        return _FAMILIES[IPV6 if ip_version == IPV6 else IPV4]
 
-    def _build_path(self, ip, event_data=None):  # noqa: PLR0914
-        # Grab ASN and Community from our event_data, or use the defaults
-        if not event_data:
-            event_data = {}
-        asn = event_data.get("asn", settings.default_asn)
-        community = event_data.get("community", settings.default_community)
-        ip_version = ip.ip.version
-        family = self._family(ip_version)
+    @staticmethod
+    def _build_attributes(ip_version, asn, community, next_hop):
+        """Build the path attributes shared by every prefix announced with the same ASN, community and next hop.
 
+        Returns:
+            tuple: The origin, next hop, AS path and community attributes, in that order.
+        """
         # Make sure our asn is an acceptable value.
         asn_is_valid(asn)
 
@@ -49,26 +83,19 @@ class GoBGP:
         # from some other protocol, typically an IGP. - https://www.kwtrain.com/blog/bgp-pt2
         origin = attribute_pb2.Attribute(origin=attribute_pb2.OriginAttribute(origin=2))
 
-        # IP prefix and its associated length
-        nlri = nlri_pb2.NLRI(
-            prefix=nlri_pb2.IPAddressPrefix(prefix_len=ip.network.prefixlen, prefix=str(ip.ip)),
-        )
-
-        # Set the next hop to the correct value depending on IP family
+        # Set the next hop to the correct value depending on IP family. For IPv6 it's carried in MP_REACH_NLRI along
+        # with the prefix itself, which _build_path adds.
         if ip_version == IPV6:
-            next_hops = event_data.get("next_hop", settings.default_v6_nexthop)
             next_hop = attribute_pb2.Attribute(
                 mp_reach=attribute_pb2.MpReachNLRIAttribute(
-                    family=family,
-                    next_hops=[next_hops],
-                    nlris=[nlri],
+                    family=_FAMILIES[IPV6],
+                    next_hops=[next_hop],
                 ),
             )
         else:
-            next_hops = event_data.get("next_hop", settings.default_v4_nexthop)
             next_hop = attribute_pb2.Attribute(
                 next_hop=attribute_pb2.NextHopAttribute(
-                    next_hop=next_hops,
+                    next_hop=next_hop,
                 ),
             )
 
@@ -103,51 +130,154 @@ class GoBGP:
                 large_communities=attribute_pb2.LargeCommunitiesAttribute(communities=[large_community]),
             )
 
-        attributes = [origin, next_hop, as_path, communities]
+        return origin, next_hop, as_path, communities
+
+    def _attributes(self, ip_version, asn, community, next_hop):
+        """Return the path attributes for these settings, building them only the first time we see them.
 
-        return gobgp_pb2.Path(
-            nlri=nlri,
-            pattrs=attributes,
-            family=family,
+        Nearly every path uses the defaults from settings, so in practice this holds one or two entries.
+
+        Returns:
+            tuple: The attributes, which must not be modified, as they're shared between paths.
+        """
+        key = (ip_version, asn, community, next_hop)
+        try:
+            return self._attribute_cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Something unhashable came in the event data; _build_attributes will tell us what's wrong with it
+            return self._build_attributes(*key)
+        attributes = self._build_attributes(*key)
+        if len(self._attribute_cache) >= ATTRIBUTE_CACHE_SIZE:
+            self._attribute_cache.clear()
+        self._attribute_cache[key] = attributes
+        return attributes
+
+    def _build_path(self, ip, event_data=None):
+        # Grab ASN, Community and next hop from our event_data, or use the defaults
+        if not event_data:
+            event_data = {}
+        ip_version = ip.ip.version
+        default_next_hop = settings.default_v6_nexthop if ip_version == IPV6 else settings.default_v4_nexthop
+        attributes = self._attributes(
+            ip_version,
+            event_data.get("asn", settings.default_asn),
+            event_data.get("community", settings.default_community),
+            event_data.get("next_hop", default_next_hop),
+        )
+
+        # IP prefix and its associated length
+        nlri = nlri_pb2.NLRI(
+            prefix=nlri_pb2.IPAddressPrefix(prefix_len=ip.network.prefixlen, prefix=str(ip.ip)),
         )
 
-    def add_path(self, ip, event_data):
+        # The Path takes copies of the shared attributes, so we're free to add the prefix to its MP_REACH_NLRI
+        path = gobgp_pb2.Path(nlri=nlri, pattrs=attributes, family=self._family(ip_version))
+        if ip_version == IPV6:
+            path.pattrs[1].mp_reach.nlris.append(nlri)
+        return path
+
+    async def add_path(self, ip, event_data):
         """Announce a single route."""
         logger.info("Blocking %s", ip)
         try:
             path = self._build_path(ip, event_data)
 
-            self.stub.AddPath(
-                gobgp_pb2.AddPathRequest(table_type=gobgp_pb2.TABLE_TYPE_GLOBAL, path=path),
-                _TIMEOUT_SECONDS,
-            )
+            with GOBGP_RPC_SECONDS.labels("AddPath").time():
+                await self.stub.AddPath(
+                    gobgp_pb2.AddPathRequest(table_type=gobgp_pb2.TABLE_TYPE_GLOBAL, path=path),
+                    timeout=settings.gobgp_timeout_seconds,
+                )
+            self.rib.add(ip.network)
         except ASNError as e:
             logger.warning("ASN assertion failed with error: %s", e)
 
-    def del_all_paths(self):
+    def _build_paths(self, routes, *, is_withdraw=False):
+        """Build a path for each (ip, event_data) pair, skipping (and logging) any with an invalid ASN.
+
+        Returns:
+            list: The paths, marked as withdrawn if is_withdraw is set.
+        """
+        paths = []
+        for ip, event_data in routes:
+            try:
+                path = self._build_path(ip, event_data)
+            except ASNError as e:
+                logger.warning("ASN assertion failed with error: %s", e)
+                continue
+            path.is_withdraw = is_withdraw
+            paths.append(path)
+        return paths
+
+    async def _stream_paths(self, paths):
+        """Send paths through a single AddPathStream call, settings.gobgp_batch_size to a request."""
+        requests = (
+            gobgp_pb2.AddPathStreamRequest(
+                table_type=gobgp_pb2.TABLE_TYPE_GLOBAL,
+                paths=paths[start : start + settings.gobgp_batch_size],
+            )
+            for start in range(0, len(paths), settings.gobgp_batch_size)
+        )
+        if paths:
+            with GOBGP_RPC_SECONDS.labels("AddPathStream").time():
+                await self.stub.AddPathStream(requests, timeout=settings.gobgp_list_timeout_seconds)
+        for path in paths:
+            if path.is_withdraw:
+                self.rib.discard(self._path_network(path))
+            else:
+                self.rib.add(self._path_network(path))
+
+    async def add_paths(self, routes):
+        """Announce many routes, with one round-trip rather than one per route.
+
+        Args:
+            routes (list): (ip, event_data) pairs, as passed to add_path.
+        """
+        logger.info("Blocking %d routes", len(routes))
+        await self._stream_paths(self._build_paths(routes))
+
+    async def del_paths(self, routes):
+        """Withdraw many routes, with one round-trip rather than one per route.
+
+        DeletePath only takes a single path, so we send them through AddPathStream marked as withdrawn instead.
+
+        Args:
+            routes (list): (ip, event_data) pairs, as passed to del_path.
+        """
+        logger.info("Unblocking %d routes", len(routes))
+        await self._stream_paths(self._build_paths(routes, is_withdraw=True))
+
+    async def del_all_paths(self):
         """Remove all routes from being announced."""
         logger.warning("Withdrawing ALL routes")
 
         # GoBGP v4 needs an address family set to be able to delete all prefixes for that family.
         for ip_version in (IPV4, IPV6):
-            self.stub.DeletePath(
-                gobgp_pb2.DeletePathRequest(table_type=gobgp_pb2.TABLE_TYPE_GLOBAL, family=self._family(ip_version)),
-                _TIMEOUT_SECONDS,
-            )
+            with GOBGP_RPC_SECONDS.labels("DeletePath").time():
+                await self.stub.DeletePath(
+                    gobgp_pb2.DeletePathRequest(
+                        table_type=gobgp_pb2.TABLE_TYPE_GLOBAL, family=self._family(ip_version)
+                    ),
+                    timeout=settings.gobgp_timeout_seconds,
+                )
+        self.rib.clear()
 
-    def del_path(self, ip, event_data):
+    async def del_path(self, ip, event_data):
         """Remove a single route from being announced."""
         logger.info("Unblocking %s", ip)
         try:
             path = self._build_path(ip, event_data)
-            self.stub.DeletePath(
-                gobgp_pb2.DeletePathRequest(table_type=gobgp_pb2.TABLE_TYPE_GLOBAL, path=path),
-                _TIMEOUT_SECONDS,
-            )
+            with GOBGP_RPC_SECONDS.labels("DeletePath").time():
+                await self.stub.DeletePath(
+                    gobgp_pb2.DeletePathRequest(table_type=gobgp_pb2.TABLE_TYPE_GLOBAL, path=path),
+                    timeout=settings.gobgp_timeout_seconds,
+                )
+            self.rib.discard(ip.network)
         except ASNError as e:
             logger.warning("ASN assertion failed with error: %s", e)
 
-    def get_prefixes(self, ip):
+    async def get_prefixes(self, ip):
         """Retrieve the routes that match a prefix and are announced.
 
         Returns:
@@ -160,28 +290,108 @@ class GoBGP:
                 prefixes=prefixes,
                 family=self._family(ip.ip.version),
             ),
-            _TIMEOUT_SECONDS,
+            timeout=settings.gobgp_timeout_seconds,
         )
-        return list(result)
+        with GOBGP_RPC_SECONDS.labels("ListPath").time():
+            return [destination async for destination in result]
 
-    def get_route_count(self, ip_version):
-        """Return the number of routes in the global RIB for a given IP version."""
+    async def list_paths(self, ip_version):
+        """Yield every network in the global RIB for a given IP version."""
+        result = self.stub.ListPath(
+            gobgp_pb2.ListPathRequest(
+                table_type=gobgp_pb2.TABLE_TYPE_GLOBAL,
+                family=self._family(ip_version),
+            ),
+            timeout=settings.gobgp_list_timeout_seconds,
+        )
+        # This includes however long the caller takes over each route, but they only ever count or collect them
+        with GOBGP_RPC_SECONDS.labels("ListPath").time():
+            async for response in result:
+                yield ipaddress.ip_network(response.destination.prefix, strict=False)
+
+    async def announced(self):
+        """Return the set of networks in the global RIB, from our mirror if it's ready or from GoBGP if not."""
+        if self.rib.ready:
+            return set(self.rib)
+        return {network for ip_version in (IPV4, IPV6) async for network in self.list_paths(ip_version)}
+
+    async def follow(self):
+        """Seed `rib` from GoBGP's global table, then keep it current from GoBGP's events, until the stream ends.
+
+        We start watching before listing the table, and only apply the events once the table is in, so any change
+        made while we were listing is applied on top of it rather than lost. Until then, and once the stream ends,
+        `rib` isn't ready and checks and counts go to GoBGP.
+        """
+        table_filter = gobgp_pb2.WatchEventRequest.Table.Filter(
+            type=gobgp_pb2.WatchEventRequest.Table.Filter.TYPE_BEST
+        )
+        call = self.stub.WatchEvent(
+            gobgp_pb2.WatchEventRequest(table=gobgp_pb2.WatchEventRequest.Table(filters=[table_filter]))
+        )
+        # GoBGP doesn't send anything on a quiet stream, not even headers, so we can't always tell when the watch has
+        # started; if it hasn't said so by now, it has had long enough to
+        connected = asyncio.ensure_future(call.wait_for_connection())
         try:
-            result = list(
-                self.stub.ListPath(
-                    gobgp_pb2.ListPathRequest(
-                        table_type=gobgp_pb2.TABLE_TYPE_GLOBAL,
-                        family=self._family(ip_version),
-                    ),
-                    _TIMEOUT_SECONDS,
-                )
+            await asyncio.wait([connected], timeout=WATCH_SETUP_SECONDS)
+            if connected.done():
+                connected.result()
+            self.rib.replace([network for ip_version in (IPV4, IPV6) async for network in self.list_paths(ip_version)])
+            logger.info("Mirrored %d routes from GoBGP", len(self.rib))
+            async for response in call:
+                for path in response.table.paths:
+                    if path.is_withdraw:
+                        self.rib.discard(self._path_network(path))
+                    else:
+                        self.rib.add(self._path_network(path))
+        finally:
+            self.rib.ready = False
+            connected.cancel()
+            call.cancel()
+
+    async def get_table(self, ip_version):
+        """Ask GoBGP how big the global RIB is for a given IP version, without listing it.
+
+        Returns:
+            dict: The number of destinations (prefixes) and paths in the table.
+        """
+        with GOBGP_RPC_SECONDS.labels("GetTable").time():
+            response = await self.stub.GetTable(
+                gobgp_pb2.GetTableRequest(table_type=gobgp_pb2.TABLE_TYPE_GLOBAL, family=self._family(ip_version)),
+                timeout=settings.gobgp_timeout_seconds,
             )
-            logger.info("GoBGP returned %d routes for IPv%s", len(result), ip_version)
-            return len(result)
+        return {"destinations": response.num_destination, "paths": response.num_path}
+
+    async def get_route_count(self, ip_version):
+        """Return the number of routes in the global RIB for a given IP version."""
+        if self.rib.ready:
+            return self.rib.count(ip_version)
+        try:
+            count = (await self.get_table(ip_version))["destinations"]
         except Exception:
             logger.exception("Failed to get route count for IPv%s", ip_version)
             return 0
+        logger.info("GoBGP returned %d routes for IPv%s", count, ip_version)
+        return count
+
+    async def rib_stats(self):
+        """Summarize the global RIB for the heartbeat, at the same cost however many routes it holds.
+
+        Returns:
+            dict: GoBGP's destination and path counts for each IP version, whether our mirror of the RIB is ready, and
+            how many seconds it's been since we last saw it change (None if we haven't).
+        """
+        stats = {
+            "mirrored": self.rib.ready,
+            "seconds_since_change": None if self.rib.last_change is None else time.monotonic() - self.rib.last_change,
+        }
+        for ip_version in (IPV4, IPV6):
+            table = await self.get_table(ip_version)
+            stats[f"v{ip_version}_destinations"] = table["destinations"]
+            stats[f"v{ip_version}_paths"] = table["paths"]
+        return stats
 
-    def is_blocked(self, ip):
+    async def is_blocked(self, ip):
         """Return True if at least one route matching the prefix is being announced."""
-        return len(self.get_prefixes(ip)) > 0
+        if self.rib.ready:
+            return self.rib.covers(ip.ip)
+        return len(await self.get_prefixes(ip)) > 0
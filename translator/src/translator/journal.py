@@ -0,0 +1,205 @@
+"""Keep what Django has told us to announce on local disk, so that after a restart we know it without asking Django."""
+
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+from pathlib import Path
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT = "snapshot.jsonl"
+JOURNAL = "journal.jsonl"
+# The journal a compaction is folding into the snapshot; if we find one, we didn't get to finish
+COMPACTING = "journal.jsonl.compacting"
+
+
+def _network(route):
+    return str(ipaddress.ip_interface(route).network)
+
+
+class Journal:
+    """The routes we should be announcing, kept in a directory as a snapshot and an append-only journal of changes.
+
+    Each line of either file is a JSON object with an "op": "add" with the event "data" Django sent the route with,
+    "remove" with the "route", "remove_all", "seq" with the last of Django's events we acknowledged, or "shards" with
+    the "shard" we were out of how many "shards". Replaying the snapshot and then the journal gives `routes`, a dict of
+    each network to its event data, and `last_seq`. Those are only ours if we're still the same shard, since Django
+    gives each shard different routes; if we've been sharded differently since, we start over with neither.
+
+    Between a reconcile start and end, like Reconciler, we collect routes rather than journal them, and at the end we
+    journal only the difference from what we had, so a full replay costs lines in proportion to what changed.
+
+    Lines are buffered and flushed by `checkpoint`, so the journal always has everything up to the event it records as
+    acknowledged; anything after that, Django sends again when we resume. Once the journal has more lines than we have
+    routes, and at least settings.journal_compact_lines, we start a new one and fold the old one into the snapshot in
+    a thread, so compacting doesn't hold up the event loop.
+    """
+
+    def __init__(self, directory):
+        """Keep the journal in directory, which is created if it doesn't exist; call `load` before anything else."""
+        self.directory = Path(directory)
+        self.routes = {}
+        self.last_seq = None
+        self.sharding = None
+        self._desired = None
+        self._file = None
+        self._lines = 0
+        self._compaction = None
+
+    def load(self):
+        """Replay the snapshot and journal, fold them into a new snapshot, and start a new journal.
+
+        Returns:
+            dict: `routes`.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        unfinished = (self.directory / COMPACTING).exists()
+        replayed = sum(self._replay(self.directory / name) for name in (SNAPSHOT, COMPACTING, JOURNAL))
+        resharded = self._reshard((settings.shard, settings.shards))
+        # Unless all we have is a snapshot, which is as compact as it gets
+        if unfinished or resharded or replayed > len(self.routes) + 2:
+            self._write_snapshot(self.routes, self.last_seq)
+            (self.directory / JOURNAL).unlink(missing_ok=True)
+            (self.directory / COMPACTING).unlink(missing_ok=True)
+        self._file = (self.directory / JOURNAL).open("a", encoding="utf-8")
+        logger.info("Loaded %d routes from the journal, as of event %s", len(self.routes), self.last_seq)
+        return self.routes
+
+    def _reshard(self, sharding):
+        """Forget what we replayed if it was for a different shard, or we can't tell which.
+
+        Returns:
+            bool: Whether it was.
+        """
+        if self.sharding == sharding:
+            return False
+        if self.routes or self.last_seq is not None:
+            logger.warning(
+                "The journal was kept as (shard, shards) %s, but we're %s, so starting over", self.sharding, sharding
+            )
+        self.routes, self.last_seq, self.sharding = {}, None, sharding
+        return True
+
+    def cancel(self):
+        """Stop collecting routes without journaling them, e.g. because we lost the websocket part way through."""
+        self._desired = None
+
+    def record(self, json_message):
+        """Journal a message from Django, if it changes what we should be announcing."""
+        event_type = json_message.get("type")
+        if event_type == "translator_reconcile_start":
+            self._desired = {}
+        elif event_type == "translator_reconcile_end":
+            self._end()
+        elif event_type == "translator_remove_all":
+            self._change({"op": "remove_all"})
+        elif event_type in {"translator_add", "translator_remove"}:
+            data = json_message.get("message") or {}
+            try:
+                route = _network(data["route"])
+            except (ValueError, KeyError, TypeError):
+                # handle() will log it
+                return
+            self._change(
+                {"op": "add", "data": data} if event_type == "translator_add" else {"op": "remove", "route": route}
+            )
+
+    def checkpoint(self, seq):
+        """Make sure everything journaled so far is on disk, and record that we've acknowledged Django's event seq."""
+        self._write({"op": "seq", "seq": seq})
+        self.last_seq = seq
+        self._file.flush()
+        if self._compaction is None and self._lines >= max(settings.journal_compact_lines, len(self.routes)):
+            self._compaction = asyncio.create_task(self._compact())
+
+    def _change(self, record):
+        if self._desired is not None:
+            self._apply(self._desired, record)
+            return
+        self._apply(self.routes, record)
+        self._write(record)
+
+    def _end(self):
+        """Journal the difference between the routes we collected and the ones we had."""
+        if self._desired is None:
+            return
+        desired, self._desired = self._desired, None
+        for route in self.routes.keys() - desired.keys():
+            self._write({"op": "remove", "route": route})
+        for route, data in desired.items():
+            if self.routes.get(route) != data:
+                self._write({"op": "add", "data": data})
+        self.routes = desired
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._lines += 1
+
+    def _apply(self, routes, record):
+        """Apply a line of the snapshot or journal to routes."""
+        match record["op"]:
+            case "add":
+                routes[_network(record["data"]["route"])] = record["data"]
+            case "remove":
+                routes.pop(record["route"], None)
+            case "remove_all":
+                routes.clear()
+            case "seq":
+                self.last_seq = record["seq"]
+            case "shards":
+                self.sharding = (record["shard"], record["shards"])
+
+    def _replay(self, path):
+        """Apply each line of a file to `routes`, stopping at any we can't read, which is one we didn't finish writing.
+
+        Returns:
+            int: The number of lines applied.
+        """
+        if not path.exists():
+            return 0
+        lines = 0
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self._apply(self.routes, json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("Stopped reading %s at line %d, which is incomplete", path, lines + 1)
+                    break
+                lines += 1
+        return lines
+
+    def _write_snapshot(self, routes, seq):
+        """Write a snapshot of routes as of event seq, replacing the old one only once it's safely on disk."""
+        path = self.directory / SNAPSHOT
+        partial = path.with_suffix(".tmp")
+        with partial.open("w", encoding="utf-8") as f:
+            shard, shards = self.sharding
+            f.write(json.dumps({"op": "shards", "shard": shard, "shards": shards}) + "\n")
+            f.write(json.dumps({"op": "seq", "seq": seq}) + "\n")
+            for data in routes.values():
+                f.write(json.dumps({"op": "add", "data": data}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        partial.replace(path)
+
+    async def _compact(self):
+        """Start a new journal, and fold the old one into the snapshot."""
+        routes, seq = dict(self.routes), self.last_seq
+        self._file.close()
+        (self.directory / JOURNAL).replace(self.directory / COMPACTING)
+        self._file = (self.directory / JOURNAL).open("a", encoding="utf-8")
+        self._lines = 0
+        try:
+            await asyncio.to_thread(self._write_snapshot, routes, seq)
+            (self.directory / COMPACTING).unlink()
+        except OSError:
+            # We'll replay the old journal along with the new one, and try again when we next load; until then we
+            # leave _compaction set, so we don't start another one over the top of it
+            logger.exception("Failed to compact the journal")
+            return
+        logger.info("Compacted the journal into a snapshot of %d routes", len(routes))
+        self._compaction = None
@@ -0,0 +1,53 @@
+"""Prometheus metrics for the translator, served over HTTP on settings.metrics_port."""
+
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# GoBGP calls range from well under a millisecond to a full-table walk
+RPC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+MESSAGES_RECEIVED = Counter(
+    "translator_messages_received_total", "Websocket messages received from Django, by type", ["type"]
+)
+GOBGP_RPC_SECONDS = Histogram(
+    "translator_gobgp_rpc_seconds", "How long GoBGP calls take, by method", ["method"], buckets=RPC_BUCKETS
+)
+WEBSOCKET_CONNECTS = Counter("translator_websocket_connects_total", "How many times we've connected to Django")
+RECONCILE_SECONDS = Histogram(
+    "translator_reconcile_seconds",
+    "How long it takes to apply a connect-time replay as a difference from GoBGP's table",
+    buckets=RPC_BUCKETS,
+)
+RECONCILE_ROUTES = Counter(
+    "translator_reconcile_routes_total", "Routes announced or withdrawn while reconciling, by action", ["action"]
+)
+QUEUE_DEPTH = Gauge("translator_queue_depth", "Messages waiting to be applied")
+APPLY_LATENCY_SECONDS = Histogram(
+    "translator_apply_latency_seconds",
+    "How long messages wait between being received and being applied",
+    buckets=RPC_BUCKETS,
+)
+RIB_ROUTES = Gauge(
+    "translator_rib_routes",
+    "Routes in our mirror of GoBGP's global table, by GoBGP and IP version",
+    ["target", "ip_version"],
+)
+TARGET_UP = Gauge("translator_target_up", "Whether we're applying messages to a GoBGP, by GoBGP", ["target"])
+TARGET_LAG = Gauge(
+    "translator_target_lag_messages",
+    "Messages received on this connection that a GoBGP hasn't applied yet, by GoBGP",
+    ["target"],
+)
+
+
+def serve():
+    """Start serving /metrics in a background thread, unless it's been turned off."""
+    if settings.metrics_port is None:
+        return
+    logger.info("Serving metrics on port %d", settings.metrics_port)
+    start_http_server(settings.metrics_port)
@@ -0,0 +1,45 @@
+"""Keep track of which of Django's numbered events we've applied, so a reconnect only needs what we missed."""
+
+from collections import deque
+
+
+class Progress:
+    """The sequence number of the last event we applied, and the events we've read but may not have applied yet.
+
+    Django numbers every event that changes what we announce. We note each one's number against the WorkQueue item
+    it became as we read it, and once the queue has applied everything up to that item, it's ours to acknowledge.
+    The last number we acknowledged is what we ask Django to resume from when we reconnect.
+    """
+
+    def __init__(self):
+        """Start with nothing applied, so the first connection gets every active entry."""
+        self.last_seq = None
+        self._read = deque()
+
+    def begin(self):
+        """Forget what we read on the last connection; its queue is gone, and Django will resend what we missed."""
+        self._read.clear()
+
+    def reset(self):
+        """Forget everything, so the next connection gets every active entry again."""
+        self.last_seq = None
+        self._read.clear()
+
+    def read(self, number, seq):
+        """Note that the event numbered seq became the WorkQueue items up to and including number."""
+        if seq is not None:
+            self._read.append((number, seq))
+
+    def applied(self, number):
+        """Return the number of the last event the WorkQueue has applied, up to its item number, if it's new.
+
+        Returns:
+            int | None: The sequence number, or None if nothing new has been applied.
+        """
+        seq = None
+        while self._read and self._read[0][0] <= number:
+            _, read_seq = self._read.popleft()
+            seq = read_seq if seq is None else max(seq, read_seq)
+        if seq is None or (self.last_seq is not None and seq <= self.last_seq):
+            return None
+        return seq
@@ -0,0 +1,138 @@
+"""Apply a full replay from Django as the difference from what GoBGP already has, rather than route by route."""
+
+import ipaddress
+import logging
+import time
+
+from .metrics import RECONCILE_ROUTES, RECONCILE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# The event data of a route we didn't announce, which never matches what we're replayed
+_UNKNOWN = object()
+
+
+class Reconciler:
+    """Wrap a PathBatcher, so that routes sent between `begin` and `end` are collected rather than announced.
+
+    At `end`, the collected routes are what we should be announcing: we announce the ones GoBGP doesn't have yet and
+    withdraw the ones it has that we shouldn't, so a reconnect costs work in proportion to what changed while we were
+    away rather than to the size of the table. Outside of a reconciliation, calls go straight through.
+
+    GoBGP's RIB only tells us which networks are announced, so we remember the event data (ASN, community and so on)
+    we last announced each one with, and announce again any whose data has changed since, or that we didn't announce
+    ourselves and so can't tell.
+    """
+
+    def __init__(self, g):
+        """Wrap a PathBatcher."""
+        self.g = g
+        self._desired = None
+        self._started = None
+        self._announced = {}
+
+    @property
+    def reconciling(self):
+        """Whether we're between `begin` and `end`."""
+        return self._desired is not None
+
+    def begin(self):
+        """Start collecting routes, throwing away any from a reconciliation that never finished."""
+        self._desired = {}
+        self._started = time.monotonic()
+
+    def cancel(self):
+        """Stop collecting routes without applying them, e.g. because we lost the websocket part way through."""
+        self._desired = None
+
+    async def end(self):
+        """Announce and withdraw whatever it takes to make GoBGP match the routes we collected.
+
+        Returns:
+            dict: How many routes we collected, added, announced again with new event data and removed, and how long
+                it all took in seconds.
+        """
+        if self._desired is None:
+            logger.warning("Asked to finish a reconciliation we didn't start")
+            return {"desired": 0, "added": 0, "changed": 0, "removed": 0, "seconds": 0.0}
+        desired, self._desired = self._desired, None
+
+        announced = await self.g.announced()
+        added = desired.keys() - announced
+        changed = {
+            network
+            for network in desired.keys() & announced
+            if self._announced.get(network, _UNKNOWN) != desired[network][1]
+        }
+        removed = announced - desired.keys()
+        for network in added | changed:
+            await self.g.add_path(*desired[network])
+        for network in removed:
+            await self.g.del_path(ipaddress.ip_interface(network), None)
+        await self.g.flush()
+        self._announced = {network: event_data for network, (_, event_data) in desired.items()}
+
+        result = {
+            "desired": len(desired),
+            "added": len(added),
+            "changed": len(changed),
+            "removed": len(removed),
+            "seconds": time.monotonic() - self._started,
+        }
+        RECONCILE_SECONDS.observe(result["seconds"])
+        RECONCILE_ROUTES.labels(action="added").inc(result["added"])
+        RECONCILE_ROUTES.labels(action="changed").inc(result["changed"])
+        RECONCILE_ROUTES.labels(action="removed").inc(result["removed"])
+        logger.info("Reconciled: %s", result)
+        return result
+
+    async def add_path(self, ip, event_data):
+        """Announce a route, or collect it if we're reconciling."""
+        if self.reconciling:
+            self._desired[ip.network] = (ip, event_data)
+        else:
+            await self.g.add_path(ip, event_data)
+            self._announced[ip.network] = event_data
+
+    async def del_path(self, ip, event_data):
+        """Withdraw a route, or forget it if we're reconciling."""
+        if self.reconciling:
+            self._desired.pop(ip.network, None)
+        else:
+            await self.g.del_path(ip, event_data)
+            self._announced.pop(ip.network, None)
+
+    async def del_all_paths(self):
+        """Withdraw everything, including anything we've collected so far."""
+        if self.reconciling:
+            self._desired.clear()
+        await self.g.del_all_paths()
+        self._announced.clear()
+
+    async def is_blocked(self, ip):
+        """Check whether the route is announced.
+
+        Returns:
+            bool: Whether at least one route matching the prefix is being announced.
+        """
+        return await self.g.is_blocked(ip)
+
+    async def get_route_count(self, ip_version):
+        """Return the number of routes in the global RIB for a given IP version."""
+        return await self.g.get_route_count(ip_version)
+
+    async def rib_stats(self):
+        """Summarize the global RIB.
+
+        Returns:
+            dict: What GoBGP.rib_stats returns.
+        """
+        return await self.g.rib_stats()
+
+    async def flush(self):
+        """Send whatever the wrapped PathBatcher has pending."""
+        await self.g.flush()
+
+    async def close(self):
+        """Close the wrapped PathBatcher."""
+        await self.g.close()
@@ -0,0 +1,94 @@
+"""An in-memory copy of the routes GoBGP is announcing, so we can answer checks and counts without asking it."""
+
+import ipaddress
+import time
+
+
+class RibMirror:
+    """The set of announced networks, indexed so that longest-prefix matches cost O(prefix length).
+
+    Networks are kept per IP version and prefix length, as the integer value of their prefix bits, so checking
+    whether an address is covered is one set lookup per prefix length in use.
+    """
+
+    def __init__(self):
+        """Start empty, and not ready until someone calls `replace` with GoBGP's table."""
+        self._tables = {4: {}, 6: {}}
+        self._count = {4: 0, 6: 0}
+        self.ready = False
+        self.last_change = None
+        # How many times we've been seeded with GoBGP's table
+        self.generation = 0
+
+    @staticmethod
+    def _key(network):
+        network = ipaddress.ip_network(network, strict=False)
+        bits = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+        return network.version, network.prefixlen, bits
+
+    def __contains__(self, network):
+        """Return whether exactly this network is announced."""
+        version, prefixlen, bits = self._key(network)
+        return bits in self._tables[version].get(prefixlen, ())
+
+    def __len__(self):
+        """Return the number of announced networks."""
+        return self._count[4] + self._count[6]
+
+    def __iter__(self):
+        """Yield every announced network."""
+        for network_class, table in (
+            (ipaddress.IPv4Network, self._tables[4]),
+            (ipaddress.IPv6Network, self._tables[6]),
+        ):
+            max_prefixlen = network_class(0).max_prefixlen
+            for prefixlen, networks in table.items():
+                for bits in networks:
+                    yield network_class((bits << (max_prefixlen - prefixlen), prefixlen))
+
+    def add(self, network):
+        """Record a network as announced."""
+        version, prefixlen, bits = self._key(network)
+        networks = self._tables[version].setdefault(prefixlen, set())
+        if bits not in networks:
+            networks.add(bits)
+            self._count[version] += 1
+        self.last_change = time.monotonic()
+
+    def discard(self, network):
+        """Record a network as withdrawn."""
+        version, prefixlen, bits = self._key(network)
+        networks = self._tables[version].get(prefixlen)
+        if networks is not None and bits in networks:
+            networks.remove(bits)
+            self._count[version] -= 1
+            if not networks:
+                del self._tables[version][prefixlen]
+        self.last_change = time.monotonic()
+
+    def clear(self):
+        """Record everything as withdrawn."""
+        self._tables = {4: {}, 6: {}}
+        self._count = {4: 0, 6: 0}
+        self.last_change = time.monotonic()
+
+    def replace(self, networks):
+        """Replace everything with GoBGP's table, and mark the mirror as ready to answer questions."""
+        self.clear()
+        for network in networks:
+            self.add(network)
+        self.ready = True
+        self.generation += 1
+
+    def covers(self, address):
+        """Return whether any announced network contains the address."""
+        address = ipaddress.ip_address(address)
+        value = int(address)
+        for prefixlen, networks in self._tables[address.version].items():
+            if value >> (address.max_prefixlen - prefixlen) in networks:
+                return True
+        return False
+
+    def count(self, ip_version):
+        """Return the number of announced networks for an IP version."""
+        return self._count[ip_version]
@@ -3,7 +3,7 @@
 from enum import StrEnum
 from typing import Annotated
 
-from pydantic import AnyWebsocketUrl, computed_field, field_validator
+from pydantic import AnyWebsocketUrl, computed_field, field_validator, model_validator
 from pydantic.fields import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -17,6 +17,15 @@ class DebuggerTypes(StrEnum):
     DEBUGPY = "debugpy"
 
 
+class BackendTypes(StrEnum):
+    """What we can announce routes to."""
+
+    GOBGP = "gobgp"
+    # A table in memory, and nothing at all, for load testing without GoBGP
+    MEMORY = "memory"
+    NULL = "null"
+
+
 class Settings(BaseSettings):
     """SCRAM Translator settings."""
 
@@ -26,9 +35,43 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     debug: DebuggerTypes | None = None
 
+    # What to announce routes to, and for the in-memory backend, how long to take over each call and each route in it
+    backend: BackendTypes = BackendTypes.GOBGP
+    memory_backend_call_seconds: Annotated[float, Field(ge=0)] = 0.0
+    memory_backend_route_seconds: Annotated[float, Field(ge=0)] = 0.0
+
     # GoBGP Connection Specifics
     gobgp_host: str = "gobgp"
     gobgp_port: TCPUDPPort = 50051
+    # host:port of every GoBGP to announce to, if there's more than the one at gobgp_host and gobgp_port
+    gobgp_urls: list[str] = []
+    # Deadlines for a single call, and for walking a whole table
+    gobgp_timeout_seconds: float = 10.0
+    gobgp_list_timeout_seconds: float = 120.0
+    # How often to ping GoBGP on an idle channel, and how long to wait for the answer before giving up on it
+    gobgp_keepalive_time_ms: int = 30_000
+    gobgp_keepalive_timeout_ms: int = 10_000
+    # Announcements and withdrawals are sent to GoBGP in batches of up to this many routes, waiting at most this long
+    # for a batch to fill
+    gobgp_batch_size: Annotated[int, Field(ge=1)] = 1000
+    gobgp_batch_interval_seconds: float = 0.05
+
+    # How many workers apply messages from Django concurrently, and how many messages may be waiting for them before
+    # we stop reading the websocket
+    worker_count: Annotated[int, Field(ge=1)] = 8
+    queue_size: Annotated[int, Field(ge=1)] = 10_000
+    # With several GoBGPs, how long one may have no room for messages while another does, before we give up on it
+    target_stall_seconds: Annotated[float, Field(gt=0)] = 30.0
+    # How often to tell Django the last event we've applied, so it can send just what we missed when we reconnect
+    ack_interval_seconds: float = 1.0
+    # Where to journal the routes Django has told us to announce, so that after a restart we can restore them without
+    # waiting for Django, or None not to. The journal is compacted into a snapshot once it has at least this many
+    # lines, and more lines than there are routes.
+    journal_dir: str | None = None
+    journal_compact_lines: Annotated[int, Field(ge=1)] = 100_000
+
+    # Where to serve Prometheus metrics, or None not to
+    metrics_port: TCPUDPPort | None = 9110
 
     @computed_field
     @property
@@ -36,9 +79,19 @@ class Settings(BaseSettings):
         """Return the composed GoBGP gRPC URL."""
         return f"{self.gobgp_host}:{self.gobgp_port}"
 
+    @computed_field
+    @property
+    def gobgp_targets(self) -> list[str]:
+        """Return the gRPC URL of every GoBGP to announce to."""
+        return self.gobgp_urls or [self.gobgp_url]
+
     # SCRAM Connection Specifics
     scram_hostname: str = "scram_hostname_not_set"
     scram_events_url: str = "ws://django:8000/ws/route_manager/translator_block/"
+    # To split an actiontype's routes between several translators, give each its own shard, from 0 to shards - 1, and
+    # Django only sends each one the routes its shard owns
+    shard: Annotated[int, Field(ge=0)] = 0
+    shards: Annotated[int, Field(ge=1)] = 1
 
     # GoBGP ASpath defaults (fallback values when event_data doesn't provide them)
     default_asn: int = 65400
@@ -66,5 +119,20 @@ class Settings(BaseSettings):
             raise ValueError(msg)
         return v
 
+    @model_validator(mode="after")
+    def _validate_shard(self):
+        """Validate that our shard is one of the shards.
+
+        Returns:
+            Settings: The validated settings.
+
+        Raises:
+            ValueError: If shard isn't less than shards.
+        """
+        if self.shard >= self.shards:
+            msg = f"shard: {self.shard} must be less than shards: {self.shards}"
+            raise ValueError(msg)
+        return self
+
 
 settings = Settings()  # type: ignore[call-arg]
@@ -3,6 +3,8 @@
 from .exceptions import ASNError
 
 MAX_ASN_VAL = 2**32 - 1
+IPV4 = 4
+IPV6 = 6
 
 
 def asn_is_valid(asn: int) -> bool:
@@ -6,12 +6,18 @@ import asyncio
 import ipaddress
 import json
 import logging
+from urllib.parse import urlencode
 
 import websockets
 from grpc import RpcError
 
-from .gobgp import IPV4, IPV6, GoBGP
+from . import metrics
+from .exceptions import TargetsDownError
+from .fanout import Fanout
+from .journal import Journal
+from .progress import Progress
 from .settings import DebuggerTypes, settings
+from .shared import IPV4, IPV6
 
 logging.basicConfig(level=settings.log_level)
 logger = logging.getLogger(__name__)
@@ -21,7 +27,21 @@ KNOWN_MESSAGES = {
     "translator_remove",
     "translator_remove_all",
     "translator_check",
+    "translator_reconcile_start",
+    "translator_reconcile_end",
 }
+# Messages that carry many routes at once, and the message type for each of their routes
+BATCH_MESSAGES = {
+    "translator_add_batch": "translator_add",
+    "translator_remove_batch": "translator_remove",
+}
+# Messages about a single route, which only have to stay in order with other messages about the same route
+ROUTE_MESSAGES = {"translator_add", "translator_remove", "translator_check"}
+
+# Optional protocol features we ask Django for when we connect; Django ignores any it doesn't know about
+CAPABILITIES = ["reconcile", "batch", "resume"]
+# The longest we wait between attempts to connect to Django
+MAX_RECONNECT_DELAY_SECONDS = 60
 
 # Here we setup a debugger if this is desired. This obviously should not be run in production.
 if settings.debug:
@@ -47,79 +67,281 @@ if settings.debug:
             logger.info("Debugger listening on port 56781.")
 
 
+def decode(message):
+    """Decode a websocket message, counting it by type.
+
+    Returns:
+        dict: The message.
+    """
+    json_message = json.loads(message)
+    metrics.MESSAGES_RECEIVED.labels(type=str(json_message.get("type"))).inc()
+    return json_message
+
+
 async def process(message, websocket, g):
     """Take a single message form the websocket and hand it off to the appropriate function."""
-    json_message = json.loads(message)
+    for json_message in expand(decode(message)):
+        await handle(json_message, websocket, g)
+
+
+def expand(json_message):
+    """Split a batch message into a message per route, which PathBatcher will batch up again for GoBGP.
+
+    We split them so that each route can be queued behind anything else about the same route.
+
+    Yields:
+        dict: Each route's message, or the message itself if it isn't a batch.
+    """
+    event_type = json_message.get("type")
+    if event_type not in BATCH_MESSAGES:
+        yield json_message
+        return
+    payload = dict(json_message.get("message") or {})
+    routes = payload.pop("routes", [])
+    for route in routes:
+        yield {"type": BATCH_MESSAGES[event_type], "message": {**payload, "route": route}}
+
+
+def route_key(json_message):
+    """Return what a message is about, for the work queue to keep messages about the same thing in order.
+
+    Returns:
+        The network the message is about, or None if it's about everything.
+    """
+    if json_message.get("type") not in ROUTE_MESSAGES:
+        return None
+    try:
+        return ipaddress.ip_interface(json_message["message"]["route"]).network
+    except (ValueError, KeyError, TypeError):
+        # handle() will log it, and any worker can do that
+        return json_message.get("type")
+
+
+async def handle(json_message, websocket, g):
+    """Apply a single decoded message."""
     event_type = json_message.get("type")
     event_data = json_message.get("message")
     if event_type not in KNOWN_MESSAGES:
         logger.error("Unknown event type received: %s", event_type)
-    # TODO: Maybe only allow this in testing?
-    elif event_type == "translator_remove_all":
-        g.del_all_paths()
+    elif event_type in {"translator_remove_all", "translator_reconcile_start", "translator_reconcile_end"}:
+        await control(event_type, websocket, g)
     else:
         try:
             ip = ipaddress.ip_interface(event_data["route"])
         except (ValueError, KeyError):
-            logger.exception("Error parsing message: %s", message)
+            logger.exception("Error parsing message: %s", json_message)
             return
 
         if event_type == "translator_add":
-            g.add_path(ip, event_data)
+            await g.add_path(ip, event_data)
         elif event_type == "translator_remove":
-            g.del_path(ip, event_data)
+            await g.del_path(ip, event_data)
         elif event_type == "translator_check":
-            json_message["type"] = "translator_check_resp"
-            json_message["message"]["is_blocked"] = g.is_blocked(ip)
-            await websocket.send(json.dumps(json_message))
+            # Every GoBGP we announce to gets the same message, so answer with a copy
+            response = {
+                **json_message,
+                "type": "translator_check_resp",
+                "message": {**event_data, "is_blocked": await g.is_blocked(ip)},
+            }
+            await websocket.send(json.dumps(response))
+
+
+async def control(event_type, websocket, g):
+    """Handle a message that isn't about any one route."""
+    # TODO: Maybe only allow this in testing?
+    if event_type == "translator_remove_all":
+        await g.del_all_paths()
+    elif event_type == "translator_reconcile_start":
+        g.begin()
+    elif event_type == "translator_reconcile_end":
+        result = await g.end()
+        await websocket.send(json.dumps({"type": "translator_reconcile_result", "message": result}))
+
+
+async def heartbeat_message(target, fanout):
+    """Build a heartbeat from what one GoBGP has, along with how every GoBGP is keeping up.
+
+    Returns:
+        dict: The message to send.
+    """
+    message = {
+        "v4_count": await target.g.get_route_count(IPV4),
+        "v6_count": await target.g.get_route_count(IPV6),
+        "queue": target.queue.stats(),
+        "targets": fanout.stats(),
+    }
+    try:
+        message["rib"] = await target.g.rib_stats()
+    except RpcError as e:
+        logger.warning("Couldn't get GoBGP's table stats for the heartbeat: %s", e)
+    return {"type": "translator_heartbeat", "message": message}
 
 
-async def heartbeat(websocket, g):
-    """Periodically send health status/route counts to Django."""
+async def heartbeat(websocket, fanout):
+    """Periodically send health status/route counts to Django, as seen by the first GoBGP that's up."""
     while True:
-        try:
-            v4_count = g.get_route_count(IPV4)
-            v6_count = g.get_route_count(IPV6)
-            payload = {
-                "type": "translator_heartbeat",
-                "message": {
-                    "v4_count": v4_count,
-                    "v6_count": v6_count,
-                },
-            }
-            logger.info("Sending heartbeat: %s", json.dumps(payload))
-            await websocket.send(json.dumps(payload))
-        except Exception:
-            logger.exception("Heartbeat failed")
+        target = fanout.primary
+        if target is None:
+            logger.warning("Every GoBGP is down, so there's no heartbeat to send")
+        else:
+            try:
+                payload = await heartbeat_message(target, fanout)
+                logger.info("Sending heartbeat: %s", json.dumps(payload))
+                await websocket.send(json.dumps(payload))
+            except Exception:
+                logger.exception("Heartbeat failed")
         await asyncio.sleep(30)
 
 
+async def acknowledge(websocket, fanout, progress, journal=None):
+    """Periodically tell Django the last of its events we've applied, once every GoBGP has it and it's journaled."""
+    while True:
+        await asyncio.sleep(settings.ack_interval_seconds)
+        # Routes sent during a reconciliation aren't applied until it ends
+        if fanout.reconciling or fanout.applied is None:
+            continue
+        seq = progress.applied(fanout.applied)
+        if seq is None:
+            continue
+        await fanout.flush()
+        # If a GoBGP failed while we were flushing, it's lost a batch we'd have been acknowledging
+        if fanout.applied is None:
+            continue
+        progress.last_seq = seq
+        if journal is not None:
+            journal.checkpoint(seq)
+        await websocket.send(json.dumps({"type": "translator_ack", "message": {"seq": seq}}))
+
+
+async def resync(websocket, fanout):
+    """Close the websocket once a GoBGP we gave up on is back, so that we reconnect and get a full replay."""
+    await fanout.resync.wait()
+    logger.warning("Reconnecting to Django to bring every GoBGP back in line")
+    await websocket.close()
+
+
+async def read(websocket, fanout, progress, journal=None):
+    """Hand messages from the websocket to every GoBGP until it closes, waiting whenever the only one is busy."""
+    try:
+        async for message in websocket:
+            json_message = decode(message)
+            for route_message in expand(json_message):
+                if journal is not None:
+                    journal.record(route_message)
+                await fanout.submit(route_key(route_message), route_message)
+            progress.read(fanout.submitted, json_message.get("seq"))
+    except websockets.ConnectionClosed:
+        logger.warning("Lost the SCRAM websocket, reconnecting")
+
+
+async def apply(target, json_message, websocket, fanout):
+    """Apply a message to one GoBGP, leaving checks to the first one that's up, since Django only needs one answer."""
+    if json_message.get("type") == "translator_check" and target is not fanout.primary:
+        return
+    await handle(json_message, websocket, target.g)
+
+
+async def serve(websocket, fanout, progress, journal=None):
+    """Process messages from one websocket connection until it closes."""
+    progress.begin()
+    if journal is not None:
+        # Like the GoBGPs, forget any reconciliation we were part way through
+        journal.cancel()
+    metrics.WEBSOCKET_CONNECTS.inc()
+    fanout.start(lambda target, json_message: apply(target, json_message, websocket, fanout))
+    metrics.QUEUE_DEPTH.set_function(lambda: fanout.depth)
+    tasks = [
+        asyncio.create_task(heartbeat(websocket, fanout)),
+        asyncio.create_task(acknowledge(websocket, fanout, progress, journal)),
+        asyncio.create_task(resync(websocket, fanout)),
+    ]
+    try:
+        await read(websocket, fanout, progress, journal)
+        # Finish what we were sent before we go and reconnect
+        await fanout.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await fanout.stop()
+
+
+def events_url(progress):
+    """Return the URL of Django's websocket, asking for the protocol features we support.
+
+    Returns:
+        str: settings.scram_events_url, with our capabilities, the last event we applied and our shard in the query.
+    """
+    params = {"capabilities": ",".join(CAPABILITIES)}
+    if progress.last_seq is not None:
+        params["last_seq"] = progress.last_seq
+    if settings.shards > 1:
+        params["shard"] = settings.shard
+        params["shards"] = settings.shards
+    return f"{settings.scram_events_url}?{urlencode(params)}"
+
+
+async def connect(progress):
+    """Connect to Django's websocket, and connect again whenever we lose it, backing off while it's unreachable.
+
+    Each connection asks to resume from the last event we applied, which is why we don't let websockets reconnect
+    for us: it would ask for the same URL every time.
+
+    Yields:
+        WebSocketClientProtocol: Each connection, which is closed when the caller is done with it.
+    """
+    delay = 1
+    while True:
+        try:
+            websocket = await websockets.connect(events_url(progress))
+        except (OSError, TimeoutError, websockets.InvalidHandshake) as e:
+            logger.warning("Could not connect to SCRAM websocket, retrying in %ds, error is: %s", delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+            continue
+        delay = 1
+        try:
+            yield websocket
+        finally:
+            await websocket.close()
+
+
+async def restore(fanout, progress, journal):
+    """Announce what the journal says we should be, without waiting for Django, and resume from where it left off."""
+    # With nothing to resume from, it's Django that tells us what to announce
+    if journal is None or journal.last_seq is None:
+        return
+    if await fanout.restore(journal.routes):
+        progress.last_seq = journal.last_seq
+
+
 async def main():
     """Connect to the websocket and start listening for messages."""
+    journal = None
+    if settings.journal_dir is not None:
+        journal = Journal(settings.journal_dir)
+        await asyncio.to_thread(journal.load)
     while True:
+        logger.info("connecting to gobgp at %s", ", ".join(settings.gobgp_targets))
+        progress = Progress()
+        fanout = Fanout(settings.gobgp_targets, progress)
+        fanout.open()
         try:
-            logger.info("connecting to gobgp at %s", settings.gobgp_url)
-            g = GoBGP(settings.gobgp_url)
-            async for websocket in websockets.connect(settings.scram_events_url):
-                heartbeat_task = asyncio.create_task(heartbeat(websocket, g))
-                try:
-                    async for message in websocket:
-                        await process(message, websocket, g)
-                except websockets.ConnectionClosed:
-                    heartbeat_task.cancel()
-                    continue
-                finally:
-                    heartbeat_task.cancel()
-        except RpcError as e:
+            await restore(fanout, progress, journal)
+            async for websocket in connect(progress):
+                await serve(websocket, fanout, progress, journal)
+        except (RpcError, TargetsDownError) as e:
             logger.warning("Encountered an error connecting to gobgp, retrying in 10s, error is: %s", e)
             await asyncio.sleep(10)
         except (OSError, websockets.InvalidURI) as e:
             logger.warning("Could not connect to SCRAM websocket, retrying in 10s, error is: %s", e)
             await asyncio.sleep(10)
+        finally:
+            await fanout.close()
 
 
 if __name__ == "__main__":
     logger.info("translator started")
+    metrics.serve()
     loop = asyncio.get_event_loop()
     loop.run_until_complete(main())
     loop.close()
@@ -0,0 +1,151 @@
+"""Apply websocket messages with a pool of workers, so one slow GoBGP call doesn't stop us reading the socket."""
+
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+
+from grpc import RpcError
+
+from .metrics import APPLY_LATENCY_SECONDS
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# How many recent apply latencies we keep to report percentiles from
+LATENCY_SAMPLES = 1000
+
+
+class WorkQueue:
+    """Bounded queues feeding a pool of workers.
+
+    Messages about a route always go to the same worker, chosen by hashing the route, so an add and a remove for the
+    same route are applied in the order they arrived. Messages that aren't about any one route (e.g. remove_all) wait
+    for every queue to drain and are then applied on their own.
+
+    When a worker's queue is full, `submit` waits for it, so we stop reading the websocket and the backlog stays with
+    Django rather than growing here. As with PathBatcher, a GoBGP error in a worker is raised by the next `submit`.
+
+    Items are numbered as they're submitted, and `applied` counts how many have been applied in that order, so we can
+    tell Django how far we've got even though the workers finish items out of order.
+    """
+
+    def __init__(self, apply, workers=None, size=None):
+        """Create the queues; workers don't start until `start`.
+
+        Args:
+            apply (callable): Coroutine function that applies one item.
+            workers (int): How many workers to run, settings.worker_count by default.
+            size (int): How many items may be waiting in total, settings.queue_size by default.
+        """
+        self._apply = apply
+        workers = workers or settings.worker_count
+        size = size or settings.queue_size
+        self._queues = [asyncio.Queue(maxsize=max(1, size // workers)) for _ in range(workers)]
+        self._tasks = []
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._error = None
+        self._submitted = 0
+        self._applied = 0
+        self._finished = set()
+
+    @property
+    def depth(self):
+        """How many items are waiting to be applied."""
+        return sum(queue.qsize() for queue in self._queues)
+
+    @property
+    def submitted(self):
+        """How many items have been submitted, which is also the number of the last one."""
+        return self._submitted
+
+    @property
+    def applied(self):
+        """The number of the last item that has been applied along with every item before it.
+
+        An item that failed with a GoBGP error is never counted, as it hasn't been applied, and neither is anything
+        after it.
+        """
+        return self._applied
+
+    def latency(self):
+        """Summarize how long recent items waited between being submitted and being applied.
+
+        Returns:
+            dict: The median and 99th percentile, in seconds, or None for each if nothing has been applied yet.
+        """
+        if len(self._latencies) < 2:  # noqa: PLR2004
+            latency = self._latencies[0] if self._latencies else None
+            return {"p50": latency, "p99": latency}
+        percentiles = statistics.quantiles(self._latencies, n=100)
+        return {"p50": percentiles[49], "p99": percentiles[98]}
+
+    def stats(self):
+        """Return the queue depth and apply latency, for the heartbeat."""
+        latency = self.latency()
+        return {"depth": self.depth, "apply_latency_p50": latency["p50"], "apply_latency_p99": latency["p99"]}
+
+    def start(self):
+        """Start the workers."""
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+
+    async def stop(self):
+        """Stop the workers, abandoning anything still queued."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, key, item):
+        """Queue an item for the worker that owns the key, or apply it on its own once everything queued is done.
+
+        Args:
+            key: What the item is about (e.g. its route), or None if it's about everything.
+            item: What to pass to apply.
+        """
+        self._raise_error()
+        self._submitted += 1
+        number = self._submitted
+        if key is None:
+            await self.drain()
+            await self._apply(item)
+            self._finish(number)
+        else:
+            await self._queues[hash(key) % len(self._queues)].put((time.monotonic(), number, item))
+
+    async def drain(self):
+        """Wait until everything queued has been applied."""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+        self._raise_error()
+
+    async def _work(self, queue):
+        while True:
+            queued_at, number, item = await queue.get()
+            try:
+                await self._apply(item)
+            except RpcError as e:
+                logger.warning("GoBGP failed while applying a message: %s", e)
+                self._error = e
+            except Exception:
+                # Trying again won't help, so don't hold up everything after it
+                logger.exception("Failed to apply a message")
+                self._finish(number)
+            else:
+                self._finish(number)
+            finally:
+                latency = time.monotonic() - queued_at
+                self._latencies.append(latency)
+                APPLY_LATENCY_SECONDS.observe(latency)
+                queue.task_done()
+
+    def _finish(self, number):
+        self._finished.add(number)
+        while self._applied + 1 in self._finished:
+            self._applied += 1
+            self._finished.remove(self._applied)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
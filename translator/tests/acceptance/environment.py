@@ -1,9 +1,23 @@
 """Configure the test environment before executing acceptance tests."""
 
+import asyncio
+
 from translator.gobgp import GoBGP
 
 
+async def _connect():  # noqa: RUF029
+    # The channel binds to the running event loop, so it has to be created from within it
+    return GoBGP("gobgp:50051")
+
+
 def before_all(context):
-    """Create a GoBGP object."""
-    context.gobgp = GoBGP("gobgp:50051")
+    """Create a GoBGP object, and an event loop to drive it."""
+    context.loop = asyncio.new_event_loop()
+    context.gobgp = context.loop.run_until_complete(_connect())
     context.config.setup_logging()
+
+
+def after_all(context):
+    """Close the GoBGP channel and the event loop."""
+    context.loop.run_until_complete(context.gobgp.close())
+    context.loop.close()
@@ -15,7 +15,7 @@ def add_block(context, route, asn, community):
     """Block a single IP."""
     ip = ipaddress.ip_interface(route)
     event_data = {"asn": int(asn), "community": int(community)}
-    context.gobgp.add_path(ip, event_data)
+    context.loop.run_until_complete(context.gobgp.add_path(ip, event_data))
 
 
 @then("we delete {route} with {asn} and {community} from the block list")
@@ -23,7 +23,7 @@ def del_block(context, route, asn, community):
     """Remove a single IP."""
     ip = ipaddress.ip_interface(route)
     event_data = {"asn": int(asn), "community": int(community)}
-    context.gobgp.del_path(ip, event_data)
+    context.loop.run_until_complete(context.gobgp.del_path(ip, event_data))
 
 
 def get_block_status(context, ip):
@@ -37,7 +37,8 @@ def get_block_status(context, ip):
 
     ip_obj = ipaddress.ip_interface(ip)
 
-    return any(ip_obj in ipaddress.ip_network(path.destination.prefix) for path in context.gobgp.get_prefixes(ip_obj))
+    prefixes = context.loop.run_until_complete(context.gobgp.get_prefixes(ip_obj))
+    return any(ip_obj in ipaddress.ip_network(path.destination.prefix) for path in prefixes)
 
 
 @capture
@@ -0,0 +1,55 @@
+"""Benchmark building GoBGP paths, with and without the cache of prebuilt path attributes.
+
+These need the generated GoBGP protobufs, so run them in the translator container with `make benchmark-translator`,
+or:
+
+    python /app/tests/benchmarks/bench_build_path.py
+"""
+
+import asyncio
+import ipaddress
+import time
+
+from translator.gobgp import GoBGP
+
+PATHS = 50_000
+
+
+def rate(build, ips):
+    """Return how many paths per second we managed."""
+    start = time.perf_counter()
+    for ip in ips:
+        build(ip)
+    return len(ips) / (time.perf_counter() - start)
+
+
+async def main():
+    """Compare paths built per second for IPv4 and IPv6, rebuilding the attributes every time and reusing them."""
+    # We never make a call, so the channel never tries to connect
+    g = GoBGP("localhost:50051")
+    event_data = {"asn": 65400, "community": 666}
+
+    def uncached(ip):
+        g._attribute_cache.clear()  # noqa: SLF001
+        return g._build_path(ip, event_data)  # noqa: SLF001
+
+    def cached(ip):
+        return g._build_path(ip, event_data)  # noqa: SLF001
+
+    for version, ips in [
+        (4, [ipaddress.ip_interface(f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}/32") for i in range(PATHS)]),
+        (6, [ipaddress.ip_interface(f"2001:db8::{i:x}/128") for i in range(PATHS)]),
+    ]:
+        assert uncached(ips[0]) == cached(ips[0])
+        before = rate(uncached, ips)
+        after = rate(cached, ips)
+        print(  # noqa: T201
+            f"IPv{version} paths built/s: rebuilding attributes {before:,.0f}, "
+            f"reusing them {after:,.0f} ({after / before:,.1f}x)"
+        )
+
+    await g.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,230 @@
+"""Benchmark the translator end to end, against a fake GoBGP rather than a real one.
+
+Synthetic websocket messages go through the same decode, work queue and handle path as messages from Django do, and
+we report prefixes per second and the p50/p99 apply latency (from being read off the socket to being handed to GoBGP,
+or answered for checks) for adds, removes, checks and full replays. We then compare announcing with one AddPath call
+per route against AddPathStream, at increasing table sizes.
+
+These need the generated GoBGP protobufs, so run them in the translator container with `make benchmark-translator`,
+or:
+
+    python /app/tests/benchmarks/bench_throughput.py --routes 10000 --per-call-ms 0.2
+
+With `--backend memory` or `--backend null` they run against the translator's in-memory backends instead, which
+don't need GoBGP or its protobufs, so the translator's own overhead can be measured anywhere (from translator/src):
+
+    PYTHONPATH=.:../tests/benchmarks python ../tests/benchmarks/bench_throughput.py --backend null
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import statistics
+import time
+
+from translator.backends import CountingBackend, MemoryBackend
+from translator.batcher import PathBatcher
+from translator.reconcile import Reconciler
+from translator.settings import BackendTypes
+from translator.shared import IPV4
+from translator.translator import decode, expand, handle, route_key
+from translator.workqueue import WorkQueue
+
+EVENT_DATA = {"asn": 65400, "community": 666}
+# How many routes Django puts in each batch message
+BATCH_SIZE = 1000
+
+
+class FakeWebsocket:
+    """Collect whatever the translator sends back to Django."""
+
+    def __init__(self):
+        """Start with nothing sent."""
+        self.sent = []
+
+    async def send(self, message):
+        """Keep the message."""
+        self.sent.append(message)
+
+
+def routes(count, offset=0):
+    """Return count distinct /32s."""
+    first = int(ipaddress.IPv4Address("10.0.0.0")) + offset
+    return [f"{ipaddress.IPv4Address(first + i)}/32" for i in range(count)]
+
+
+def messages(msg_type, route_list):
+    """Return a websocket message per route, as Django sends them."""
+    return [json.dumps({"type": msg_type, "message": {**EVENT_DATA, "route": route}}) for route in route_list]
+
+
+def batch_messages(msg_type, route_list):
+    """Return websocket messages carrying BATCH_SIZE routes each, as Django sends them to translators that ask."""
+    return [
+        json.dumps({"type": msg_type, "message": {**EVENT_DATA, "routes": route_list[start : start + BATCH_SIZE]}})
+        for start in range(0, len(route_list), BATCH_SIZE)
+    ]
+
+
+async def drive(g, batcher, frames):
+    """Feed frames through the work queue as `translator.serve` does, and time it until GoBGP has everything.
+
+    Returns:
+        tuple: The seconds it took, and every message's apply latency in seconds.
+    """
+    websocket = FakeWebsocket()
+    latencies = []
+
+    async def apply(item):
+        queued_at, json_message = item
+        await handle(json_message, websocket, g)
+        latencies.append(time.perf_counter() - queued_at)
+
+    queue = WorkQueue(apply)
+    queue.start()
+    start = time.perf_counter()
+    try:
+        for frame in frames:
+            for json_message in expand(decode(frame)):
+                await queue.submit(route_key(json_message), (time.perf_counter(), json_message))
+        await queue.drain()
+        await batcher.flush()
+    finally:
+        await queue.stop()
+    return time.perf_counter() - start, latencies
+
+
+def report(name, prefixes, seconds, latencies):
+    """Print a line of results."""
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50, p99 = percentiles[49], percentiles[98]
+    else:
+        p50 = p99 = latencies[0] if latencies else 0.0
+    print(  # noqa: T201
+        f"{name:<24} {prefixes:>10,} {prefixes / seconds:>14,.0f} {p50 * 1000:>10.2f} {p99 * 1000:>10.2f}"
+    )
+
+
+async def wait_until_ready(backend):
+    """Wait for the RIB mirror to be seeded, so checks and counts don't go to GoBGP."""
+    while not backend.rib.ready:  # noqa: ASYNC110 (the mirror doesn't signal when it's ready)
+        await asyncio.sleep(0.01)
+
+
+async def bench_messages(backend, count, *, mirror):
+    """Time adds, checks, removes and a full replay, as Django would send them."""
+    batcher = PathBatcher(backend)
+    g = Reconciler(batcher)
+    follow = asyncio.create_task(backend.follow()) if mirror else None
+    if mirror:
+        await wait_until_ready(backend)
+
+    route_list = routes(count)
+    print(f"{'':<24} {'prefixes':>10} {'prefixes/s':>14} {'p50 ms':>10} {'p99 ms':>10}")  # noqa: T201
+    try:
+        seconds, latencies = await drive(g, batcher, messages("translator_add", route_list))
+        report("add", count, seconds, latencies)
+        seconds, latencies = await drive(g, batcher, messages("translator_check", route_list))
+        report("check" if mirror else "check (no mirror)", count, seconds, latencies)
+        seconds, latencies = await drive(g, batcher, messages("translator_remove", route_list))
+        report("remove", count, seconds, latencies)
+        seconds, latencies = await drive(g, batcher, batch_messages("translator_add_batch", route_list))
+        report("add (batch messages)", count, seconds, latencies)
+
+        # Reconnect with a tenth of the table having changed while we were away
+        await g.del_all_paths()
+        await backend.add_paths([(ipaddress.ip_interface(route), EVENT_DATA) for route in routes(count, count // 10)])
+        frames = [
+            json.dumps({"type": "translator_reconcile_start", "message": {}}),
+            *batch_messages("translator_add_batch", route_list),
+            json.dumps({"type": "translator_reconcile_end", "message": {}}),
+        ]
+        seconds, latencies = await drive(g, batcher, frames)
+        report("replay (10% changed)", count, seconds, latencies)
+        # The null backend doesn't keep anything to count
+        assert isinstance(backend, CountingBackend) or await g.get_route_count(IPV4) == count
+        await g.del_all_paths()
+    finally:
+        if follow is not None:
+            follow.cancel()
+        await g.close()
+
+
+async def bench_unary_vs_stream(gobgp, sizes, unary_limit):
+    """Compare announcing routes one AddPath at a time, as we used to, with AddPathStream."""
+    print(f"\n{'announcing':<24} {'prefixes':>10} {'unary/s':>14} {'stream/s':>14}")  # noqa: T201
+    try:
+        for size in sizes:
+            ips = [ipaddress.ip_interface(route) for route in routes(size)]
+            unary = "skipped"
+            if size <= unary_limit:
+                start = time.perf_counter()
+                for ip in ips:
+                    await gobgp.add_path(ip, EVENT_DATA)
+                unary = f"{size / (time.perf_counter() - start):,.0f}"
+                await gobgp.del_all_paths()
+
+            start = time.perf_counter()
+            await gobgp.add_paths([(ip, EVENT_DATA) for ip in ips])
+            stream = size / (time.perf_counter() - start)
+            await gobgp.del_all_paths()
+            print(f"{'':<24} {size:>10,} {unary:>14} {stream:>14,.0f}")  # noqa: T201
+    finally:
+        await gobgp.close()
+
+
+async def bench_gobgp(args):
+    """Start a fake GoBGP and run every benchmark against it."""
+    # These need the generated protobufs, which the other backends don't
+    from fake_gobgp import LatencyProfile, serve  # noqa: PLC0415
+    from translator.gobgp import GoBGP  # noqa: PLC0415
+
+    latency = LatencyProfile(per_call=args.per_call_ms / 1000, per_path=args.per_path_us / 1_000_000)
+    server, fake, address = await serve(latency)
+    try:
+        await bench_messages(GoBGP(address), args.routes, mirror=not args.no_mirror)
+        await bench_unary_vs_stream(GoBGP(address), args.sizes, args.unary_limit)
+        print(f"\nGoBGP calls: {dict(fake.calls)}")  # noqa: T201
+    finally:
+        await server.stop(None)
+
+
+async def main(args):
+    """Run the benchmarks against the backend we were asked for."""
+    # Logging every route would cost more than anything we're measuring
+    logging.getLogger("translator").setLevel(logging.WARNING)
+    if args.backend == BackendTypes.GOBGP:
+        await bench_gobgp(args)
+        return
+    if args.backend == BackendTypes.MEMORY:
+        backend = MemoryBackend(args.per_call_ms / 1000, args.per_path_us / 1_000_000)
+    else:
+        backend = CountingBackend()
+    await bench_messages(backend, args.routes, mirror=True)
+    print(f"\nBackend calls: {dict(backend.calls)}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--backend",
+        type=BackendTypes,
+        choices=list(BackendTypes),
+        default=BackendTypes.GOBGP,
+        help="what to announce to: a fake GoBGP, or one of the translator's in-memory backends",
+    )
+    parser.add_argument("--routes", type=int, default=10_000, help="how many routes to send as messages")
+    parser.add_argument(
+        "--sizes",
+        type=lambda sizes: [int(size) for size in sizes.split(",")],
+        default=[10_000, 100_000, 1_000_000],
+        help="comma-separated table sizes to compare AddPath and AddPathStream at",
+    )
+    parser.add_argument("--unary-limit", type=int, default=100_000, help="largest size to try one AddPath per route")
+    parser.add_argument("--per-call-ms", type=float, default=0.0, help="how long GoBGP, or memory, takes per call")
+    parser.add_argument("--per-path-us", type=float, default=0.0, help="and how much longer per path")
+    parser.add_argument("--no-mirror", action="store_true", help="don't mirror the RIB, so checks go to GoBGP")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,197 @@
+"""An in-process fake of GoBGP's gRPC API, with just enough of it for the translator, over an in-memory table.
+
+It implements AddPath, AddPathStream, DeletePath, GetTable, ListPath and WatchEvent for the global table, and can be
+made to take as long as a real GoBGP would with a LatencyProfile. Like the benchmarks that use it, it needs the
+generated GoBGP protobufs, so it runs in the translator container.
+"""
+
+import asyncio
+import dataclasses
+import ipaddress
+import random
+from collections import Counter
+
+import grpc
+from api import common_pb2, gobgp_pb2, gobgp_pb2_grpc
+from google.protobuf import message_factory
+
+_SERVICE = gobgp_pb2.DESCRIPTOR.services_by_name["GoBgpService"]
+_VERSIONS = {common_pb2.Family.AFI_IP: 4, common_pb2.Family.AFI_IP6: 6}
+
+
+def _response(method):
+    """Return an empty response for a method, whichever message type this version of GoBGP uses for it.
+
+    Returns:
+        Message: An instance of the method's output type.
+    """
+    return message_factory.GetMessageClass(_SERVICE.methods_by_name[method].output_type)()
+
+
+def _network(path):
+    prefix = path.nlri.prefix
+    return str(ipaddress.ip_network(f"{prefix.prefix}/{prefix.prefix_len}", strict=False))
+
+
+@dataclasses.dataclass(frozen=True)
+class LatencyProfile:
+    """How long the fake takes over each call.
+
+    Attributes:
+        per_call (float): Seconds added to every call, or to every request of a stream.
+        per_path (float): Seconds added for every path a call adds or withdraws.
+        jitter (float): Up to this many seconds more, chosen at random for each call.
+    """
+
+    per_call: float = 0.0
+    per_path: float = 0.0
+    jitter: float = 0.0
+
+    async def wait(self, paths=1):
+        """Sleep for as long as a call with this many paths takes."""
+        delay = self.per_call + self.per_path * paths
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)  # noqa: S311
+        await asyncio.sleep(delay)
+
+
+class FakeGoBgp(gobgp_pb2_grpc.GoBgpServiceServicer):
+    """A GoBgpService that keeps the global table in a dict, keyed by network, and counts the calls made to it."""
+
+    def __init__(self, latency=None):
+        """Start with an empty table, taking the time described by latency over each call."""
+        self.latency = latency or LatencyProfile()
+        self.table = {}
+        self.calls = Counter()
+        self._watchers = set()
+
+    def count(self, ip_version):
+        """Return how many networks of an IP version are in the table."""
+        return sum(1 for network in self.table if (":" in network) == (ip_version == 6))
+
+    def apply(self, paths):
+        """Add or withdraw paths, telling anyone watching."""
+        for path in paths:
+            if path.is_withdraw:
+                self.table.pop(_network(path), None)
+            else:
+                self.table[_network(path)] = path
+        if paths and self._watchers:
+            event = gobgp_pb2.WatchEventResponse(table=gobgp_pb2.WatchEventResponse.TableEvent(paths=paths))
+            for watcher in self._watchers:
+                watcher.put_nowait(event)
+
+    async def AddPath(self, request, context):  # noqa: N802
+        """Add one path.
+
+        Returns:
+            AddPathResponse: An empty response.
+        """
+        self.calls["AddPath"] += 1
+        await self.latency.wait()
+        self.apply([request.path])
+        return _response("AddPath")
+
+    async def AddPathStream(self, request_iterator, context):  # noqa: N802
+        """Add, or withdraw, the paths in each request of the stream.
+
+        Returns:
+            AddPathStreamResponse: An empty response, once the stream ends.
+        """
+        self.calls["AddPathStream"] += 1
+        async for request in request_iterator:
+            await self.latency.wait(len(request.paths))
+            self.apply(list(request.paths))
+        return _response("AddPathStream")
+
+    async def DeletePath(self, request, context):  # noqa: N802
+        """Withdraw one path, or every path of the request's family if it doesn't have one.
+
+        Returns:
+            DeletePathResponse: An empty response.
+        """
+        self.calls["DeletePath"] += 1
+        await self.latency.wait()
+        if request.HasField("path"):
+            path = gobgp_pb2.Path()
+            path.CopyFrom(request.path)
+            path.is_withdraw = True
+            self.apply([path])
+        else:
+            ip_version = _VERSIONS[request.family.afi]
+            withdrawn = []
+            for network, path in list(self.table.items()):
+                if ipaddress.ip_network(network).version == ip_version:
+                    withdrawn.append(gobgp_pb2.Path(nlri=path.nlri, family=path.family, is_withdraw=True))
+            self.apply(withdrawn)
+        return _response("DeletePath")
+
+    async def ListPath(self, request, context):  # noqa: N802
+        """Yield the destinations of the request's family, or those that match its prefixes.
+
+        A prefix with a length matches only that network, and an address matches the longest network containing it.
+
+        Yields:
+            ListPathResponse: One per destination.
+        """
+        self.calls["ListPath"] += 1
+        await self.latency.wait()
+        if request.prefixes:
+            networks = [self._lookup(prefix.prefix) for prefix in request.prefixes]
+        else:
+            ip_version = _VERSIONS[request.family.afi]
+            networks = [network for network in self.table if ipaddress.ip_network(network).version == ip_version]
+        for network in networks:
+            if network in self.table:
+                destination = gobgp_pb2.Destination(prefix=network, paths=[self.table[network]])
+                yield gobgp_pb2.ListPathResponse(destination=destination)
+
+    async def GetTable(self, request, context):  # noqa: N802
+        """Count the destinations and paths of the request's family.
+
+        Returns:
+            GetTableResponse: The counts; we only ever hold one path per destination.
+        """
+        self.calls["GetTable"] += 1
+        await self.latency.wait()
+        count = self.count(_VERSIONS[request.family.afi])
+        return gobgp_pb2.GetTableResponse(num_destination=count, num_path=count)
+
+    async def WatchEvent(self, request, context):  # noqa: N802
+        """Yield every change to the table from now on, until the caller goes away.
+
+        Yields:
+            WatchEventResponse: The paths added or withdrawn by each call.
+        """
+        self.calls["WatchEvent"] += 1
+        watcher = asyncio.Queue()
+        self._watchers.add(watcher)
+        try:
+            while True:
+                yield await watcher.get()
+        finally:
+            self._watchers.discard(watcher)
+
+    def _lookup(self, prefix):
+        if "/" in prefix:
+            return str(ipaddress.ip_network(prefix, strict=False))
+        address = ipaddress.ip_address(prefix)
+        for prefixlen in range(address.max_prefixlen, -1, -1):
+            network = str(ipaddress.ip_network((address, prefixlen), strict=False))
+            if network in self.table:
+                return network
+        return None
+
+
+async def serve(latency=None):
+    """Start a fake GoBGP on a free local port.
+
+    Returns:
+        tuple: The grpc.aio server, the FakeGoBgp behind it, and the address to connect to.
+    """
+    fake = FakeGoBgp(latency)
+    server = grpc.aio.server()
+    gobgp_pb2_grpc.add_GoBgpServiceServicer_to_server(fake, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+    return server, fake, f"127.0.0.1:{port}"
@@ -0,0 +1,40 @@
+"""Configure the test environment before executing unit tests, which need neither GoBGP nor Django."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from translator.settings import settings
+
+# The fake GoBGP lives with the benchmarks
+sys.path.append(str(Path(__file__).parent.parent / "benchmarks"))
+
+
+async def _cancel_everything():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def before_all(context):
+    """Set up logging."""
+    context.config.setup_logging()
+
+
+def before_scenario(context, scenario):
+    """Give each scenario an event loop of its own, and remember the settings it may change."""
+    context.loop = asyncio.new_event_loop()
+    context.saved_settings = settings.model_copy()
+    # Coroutine functions that let go of what the scenario opened, awaited before the loop closes
+    context.closers = []
+
+
+def after_scenario(context, scenario):
+    """Close what the scenario opened, cancel anything it left running, close its loop, and put the settings back."""
+    for closer in reversed(context.closers):
+        context.loop.run_until_complete(closer())
+    context.loop.run_until_complete(_cancel_everything())
+    context.loop.close()
+    for name in type(settings).model_fields:
+        setattr(settings, name, getattr(context.saved_settings, name))
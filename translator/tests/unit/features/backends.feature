@@ -0,0 +1,50 @@
+Feature: Announcing routes without GoBGP
+  The memory backend keeps routes in a table, and the null backend only counts them
+
+  Scenario: The memory backend announces and withdraws routes
+    Given a memory backend
+    When we add 192.0.2.1/32
+    And in one call, we announce 192.0.2.2/32, 198.51.100.0/24 and 2001:db8::/48
+    And in one call, we withdraw 192.0.2.2/32 and 2001:db8::/48
+    Then only 192.0.2.1/32 and 198.51.100.0/24 are announced
+    And the backend says 198.51.100.7 is blocked
+    And the backend says 192.0.2.2 isn't blocked
+    And the backend counts 2 IPv4 and 0 IPv6 routes
+    And the backend has announced 4 routes and withdrawn 2
+    And the backend's add_path was called 1 times
+    And the backend's add_paths was called 1 times
+    And the backend's del_paths was called 1 times
+
+  Scenario: The memory backend withdraws everything
+    Given a memory backend
+    When we add 192.0.2.1/32 and 2001:db8::1/128
+    And we withdraw everything
+    Then nothing is announced
+    And the backend counts 0 IPv4 and 0 IPv6 routes
+    And the backend has announced 2 routes and withdrawn 2
+
+  Scenario: The memory backend takes as long as we tell it to
+    Given a memory backend that takes 0.05 seconds per call and 0.01 seconds per route
+    Then announcing 192.0.2.1/32 and 192.0.2.2/32 in one call takes at least 0.07 seconds
+
+  Scenario: The null backend only counts
+    Given a null backend
+    When we add 192.0.2.1/32
+    And in one call, we announce 192.0.2.2/32 and 192.0.2.3/32
+    And we withdraw 192.0.2.1/32
+    And we withdraw everything
+    Then nothing is announced
+    And the backend says 192.0.2.1 isn't blocked
+    And the backend counts 0 IPv4 and 0 IPv6 routes
+    And the backend has announced 3 routes and withdrawn 1
+    And the backend's del_all_paths was called 1 times
+
+  Scenario Outline: The backend setting picks the backend
+    Given the backend setting is <setting>
+    When we make a backend
+    Then the backend is a <backend>
+
+    Examples:
+      | setting | backend         |
+      | memory  | MemoryBackend   |
+      | null    | CountingBackend |
@@ -0,0 +1,47 @@
+Feature: Batching announcements and withdrawals
+  Routes are sent to GoBGP in batches, without ever being reordered
+
+  Scenario: A full batch is sent straight away
+    Given a batcher
+    And the gobgp_batch_size setting is 3
+    When we add 192.0.2.1/32, 192.0.2.2/32 and 192.0.2.3/32
+    Then the backend's add_paths was called 1 times
+    And only 192.0.2.1/32, 192.0.2.2/32 and 192.0.2.3/32 are announced
+
+  Scenario: A partial batch is sent once the interval has passed
+    Given a batcher
+    When we add 192.0.2.1/32
+    Then nothing is announced
+    When we wait 0.2 seconds
+    Then only 192.0.2.1/32 is announced
+
+  Scenario: A withdrawal sends the announcements waiting ahead of it
+    Given a batcher
+    When we add 192.0.2.1/32 and 192.0.2.2/32
+    And we withdraw 192.0.2.1/32
+    And we flush the batcher
+    Then the backend's add_paths was called 1 times
+    And the backend's del_paths was called 1 times
+    And only 192.0.2.2/32 is announced
+
+  Scenario: Withdrawing everything sends what's pending first
+    Given a batcher
+    When we add 192.0.2.1/32
+    And we withdraw everything
+    And we add 192.0.2.2/32
+    And we flush the batcher
+    Then only 192.0.2.2/32 is announced
+
+  Scenario: A check sees what's pending
+    Given a batcher
+    When we add 192.0.2.0/24
+    Then the batcher says 192.0.2.7/32 is blocked
+    And the backend's add_paths was called 1 times
+
+  Scenario: A batch that fails in the background fails the next call
+    Given a batcher whose backend fails
+    When we add 192.0.2.1/32
+    And we wait 0.2 seconds
+    Then adding 192.0.2.2/32 fails with a GoBGP error
+    And flushing the batcher succeeds
+    And nothing is announced
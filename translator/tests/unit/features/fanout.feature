@@ -0,0 +1,64 @@
+Feature: Announcing to several GoBGPs
+  Every GoBGP gets every message, and one that fails or stalls is dropped until a full replay brings it back
+
+  Scenario: Every GoBGP applies every message
+    Given a fan-out to 2 GoBGPs
+    When Django sends an add for 192.0.2.1/32, 192.0.2.2/32 and 2001:db8::1/128
+    And Django sends a remove for 192.0.2.2/32
+    And the fan-out catches up
+    Then GoBGP 1 announces only 192.0.2.1/32 and 2001:db8::1/128
+    And GoBGP 2 announces only 192.0.2.1/32 and 2001:db8::1/128
+    And every GoBGP has applied 4 messages
+
+  Scenario: A GoBGP that fails is dropped until it's back, and a full replay brings it back in line
+    Given a fan-out to 2 GoBGPs
+    When we acknowledge event 5
+    And GoBGP 2 starts failing
+    And Django sends an add for 192.0.2.1/32
+    And the fan-out catches up
+    Then GoBGP 1 announces only 192.0.2.1/32
+    And GoBGP 2 is down
+    And not every GoBGP has applied anything
+    And we resume from the start
+    When GoBGP 2 recovers
+    Then the fan-out asks for a full replay
+    When we reconnect to Django
+    And Django sends an add for 192.0.2.1/32
+    And the fan-out catches up
+    Then GoBGP 2 is up
+    And GoBGP 2 announces only 192.0.2.1/32
+    And every GoBGP has applied 1 messages
+
+  Scenario: We can't go on once every GoBGP has been dropped
+    Given a fan-out to 2 GoBGPs
+    When GoBGP 1 starts failing
+    And GoBGP 2 starts failing
+    And Django sends an add for 192.0.2.1/32
+    And the fan-out catches up
+    Then GoBGP 1 is down
+    And GoBGP 2 is down
+    And Django sending an add for 192.0.2.2/32 fails because every GoBGP is down
+
+  Scenario: A slow GoBGP holds up a burst, but is kept
+    Given the gobgp_batch_size setting is 1
+    And the worker_count setting is 1
+    And the queue_size setting is 2
+    And a fan-out to 2 GoBGPs
+    When GoBGP 2 takes 0.01 seconds over each call
+    And Django sends an add for each of 20 routes
+    And the fan-out catches up
+    Then GoBGP 2 is up
+    And GoBGP 1 announces 20 routes
+    And GoBGP 2 announces 20 routes
+
+  Scenario: A GoBGP that makes no room for a while is dropped, so the others carry on
+    Given the gobgp_batch_size setting is 1
+    And the worker_count setting is 1
+    And the queue_size setting is 2
+    And the target_stall_seconds setting is 0.2
+    And a fan-out to 2 GoBGPs
+    When GoBGP 2 gets stuck
+    And Django sends an add for each of 20 routes
+    And the fan-out catches up
+    Then GoBGP 2 is down
+    And GoBGP 1 announces 20 routes
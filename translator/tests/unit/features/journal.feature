@@ -0,0 +1,86 @@
+Feature: Remembering what to announce across restarts
+  The journal keeps what Django told us on disk, so after a restart we can announce it before we hear from Django
+
+  Scenario: What we journaled is there after a restart
+    Given a journal
+    When Django sends the journal an add for 192.0.2.1/32, 192.0.2.2/32 and 2001:db8::/48
+    And Django sends the journal a remove for 192.0.2.2/32
+    And the journal checkpoints event 3
+    And we restart
+    Then the journal has only 192.0.2.1/32 and 2001:db8::/48
+    And the journal resumes from event 3
+
+  Scenario: A reconciliation replaces what we had
+    Given a journal
+    When Django sends the journal an add for 192.0.2.1/32 and 192.0.2.2/32
+    And Django starts reconciling with the journal
+    And Django sends the journal an add for 192.0.2.2/32 and 192.0.2.3/32
+    And Django finishes reconciling with the journal
+    And the journal checkpoints event 4
+    And we restart
+    Then the journal has only 192.0.2.2/32 and 192.0.2.3/32
+
+  Scenario: The journal is compacted into a snapshot once it's long enough
+    Given the journal_compact_lines setting is 5
+    And a journal
+    When Django sends the journal an add for 192.0.2.1/32, 192.0.2.2/32, 192.0.2.3/32 and 192.0.2.4/32
+    And Django sends the journal a remove for 192.0.2.1/32, 192.0.2.2/32 and 192.0.2.3/32
+    And the journal checkpoints event 7
+    And the journal finishes compacting
+    Then the snapshot holds only 192.0.2.4/32, as of event 7
+    And the journal is empty
+    When we restart
+    Then the journal has only 192.0.2.4/32
+    And the journal resumes from event 7
+
+  Scenario: A line we didn't finish writing is ignored
+    Given a journal
+    When Django sends the journal an add for 192.0.2.1/32
+    And the journal checkpoints event 1
+    And the journal's last line is cut short
+    And we restart
+    Then the journal has only 192.0.2.1/32
+    And the journal resumes from event 1
+
+  Scenario: Replaying stops at a line we can't read
+    Given a journal
+    When Django sends the journal an add for 192.0.2.1/32
+    And the journal checkpoints event 1
+    And Django sends the journal an add for 192.0.2.2/32
+    And the journal checkpoints event 2
+    And the journal's line 3 is corrupted
+    And we restart
+    Then the journal has only 192.0.2.1/32
+    And the journal resumes from event 1
+
+  Scenario: A compaction we didn't finish is finished when we load
+    Given a journal
+    When Django sends the journal an add for 192.0.2.1/32
+    And the journal checkpoints event 1
+    And we're stopped part way through compacting
+    And we restart
+    Then the journal has only 192.0.2.1/32
+    And the journal resumes from event 1
+    And the snapshot holds only 192.0.2.1/32, as of event 1
+    And there's no compaction left over
+
+  Scenario: We announce what the journal says, and resume from where it left off
+    Given a journal
+    When Django sends the journal an add for 192.0.2.1/32 and 2001:db8::/48
+    And the journal checkpoints event 2
+    And we restart
+    And we restore a fan-out to 1 GoBGPs from the journal
+    Then GoBGP 1 announces only 192.0.2.1/32 and 2001:db8::/48
+    And we resume from event 2
+
+  Scenario: A journal kept for another shard is dropped
+    Given a journal
+    When Django sends the journal an add for 192.0.2.1/32
+    And the journal checkpoints event 1
+    And the shards setting is 2
+    And we restart
+    Then the journal has nothing
+    And the journal resumes from the start
+    When we restore a fan-out to 1 GoBGPs from the journal
+    Then GoBGP 1 announces nothing
+    And we resume from the start
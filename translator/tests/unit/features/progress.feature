@@ -0,0 +1,46 @@
+Feature: Acknowledging Django's events
+  Once the events we've read have been applied, we tell Django the last one, and resume from it
+
+  Scenario: An event is acknowledged once every item up to the one it became has been applied
+    Given we've applied nothing yet
+    When we read event 1 as item 1
+    And we read event 2 as items up to 3
+    Then applying up to item 0 acknowledges nothing
+    And applying up to item 2 acknowledges event 1
+    And applying up to item 3 acknowledges event 2
+
+  Scenario: Applying several events at once acknowledges the last of them
+    Given we've applied nothing yet
+    When we read event 1 as item 1
+    And we read event 2 as item 2
+    And we read event 3 as item 3
+    Then applying up to item 3 acknowledges event 3
+    And applying up to item 3 acknowledges nothing
+
+  Scenario: Messages without an event number aren't acknowledged
+    Given we've applied nothing yet
+    When we read a message without an event number as item 1
+    Then applying up to item 1 acknowledges nothing
+
+  Scenario: An event we've already acknowledged isn't acknowledged again
+    Given we've applied nothing yet
+    When we acknowledge event 5
+    And we read event 4 as item 1
+    Then applying up to item 1 acknowledges nothing
+    And we resume from event 5
+
+  Scenario: A new connection forgets what we read, but not what we acknowledged
+    Given we've applied nothing yet
+    When we acknowledge event 5
+    And we read event 6 as item 1
+    And we begin a new connection
+    Then applying up to item 1 acknowledges nothing
+    And we resume from event 5
+
+  Scenario: Resetting forgets everything
+    Given we've applied nothing yet
+    When we acknowledge event 5
+    And we read event 6 as item 1
+    And we reset our progress
+    Then applying up to item 1 acknowledges nothing
+    And we resume from the start
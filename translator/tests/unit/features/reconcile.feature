@@ -0,0 +1,73 @@
+Feature: Reconciling with GoBGP
+  A full replay only announces and withdraws the difference from what GoBGP already has
+
+  Scenario: Only the difference is sent
+    Given a reconciler with 192.0.2.1/32 and 192.0.2.2/32 announced
+    When we start reconciling
+    And we add 192.0.2.2/32 and 192.0.2.3/32
+    Then only 192.0.2.1/32 and 192.0.2.2/32 are announced
+    When we finish reconciling
+    Then the reconciliation wanted 2 routes, added 1 and removed 1
+    And only 192.0.2.2/32 and 192.0.2.3/32 are announced
+
+  Scenario: Nothing is sent when nothing changed
+    Given a reconciler that has announced 192.0.2.1/32 with community 100
+    When we start reconciling
+    And Django replays 192.0.2.1/32 with community 100
+    And we finish reconciling
+    Then the reconciliation wanted 1 routes, added 0 and removed 0
+    And the reconciliation changed 0 routes
+    And the backend's add_paths was called 0 times
+    And the backend's del_paths was called 0 times
+
+  Scenario: A route replayed with a new community is announced again
+    Given a reconciler that has announced 192.0.2.1/32 and 192.0.2.2/32 with community 100
+    When we start reconciling
+    And Django replays 192.0.2.1/32 with community 100
+    And Django replays 192.0.2.2/32 with community 200
+    And we finish reconciling
+    Then the reconciliation wanted 2 routes, added 0 and removed 0
+    And the reconciliation changed 1 routes
+    And 192.0.2.2/32 was last announced with community 200
+    And the backend has announced 1 routes and withdrawn 0
+
+  Scenario: A route we didn't announce ourselves is announced again, since we can't tell what it was announced with
+    Given a reconciler with 192.0.2.1/32 announced
+    When we start reconciling
+    And we add 192.0.2.1/32
+    And we finish reconciling
+    Then the reconciliation changed 1 routes
+    And the backend has announced 1 routes and withdrawn 0
+
+  Scenario: A withdrawal during a reconciliation is forgotten, rather than sent
+    Given a reconciler with 192.0.2.1/32 announced
+    When we start reconciling
+    And we add 192.0.2.1/32 and 192.0.2.2/32
+    And we withdraw 192.0.2.1/32
+    And we finish reconciling
+    Then only 192.0.2.2/32 is announced
+
+  Scenario: Withdrawing everything during a reconciliation forgets what was collected
+    Given a reconciler with 192.0.2.1/32 announced
+    When we start reconciling
+    And we add 192.0.2.2/32
+    And we withdraw everything
+    And we add 192.0.2.3/32
+    And we finish reconciling
+    Then only 192.0.2.3/32 is announced
+
+  Scenario: A cancelled reconciliation changes nothing
+    Given a reconciler with 192.0.2.1/32 announced
+    When we start reconciling
+    And we add 192.0.2.2/32
+    And we cancel reconciling
+    And we finish reconciling
+    Then the reconciliation wanted 0 routes, added 0 and removed 0
+    And only 192.0.2.1/32 is announced
+
+  Scenario: Outside a reconciliation, routes go straight through
+    Given a reconciler with 192.0.2.1/32 announced
+    When we add 192.0.2.2/32
+    And we withdraw 192.0.2.1/32
+    And we flush the reconciler
+    Then only 192.0.2.2/32 is announced
@@ -0,0 +1,34 @@
+Feature: Mirroring GoBGP's RIB
+  We keep a copy of what GoBGP is announcing, so checks and counts don't have to ask it
+
+  Scenario: The mirror starts from GoBGP's table
+    Given a fake GoBGP
+    And another client has announced 192.0.2.0/24 and 2001:db8::/48
+    When we follow GoBGP
+    Then the mirror holds only 192.0.2.0/24 and 2001:db8::/48
+    And the mirror counts 1 IPv4 and 1 IPv6 routes
+    And the mirror covers 192.0.2.7 but not 198.51.100.7
+    And the mirror has been seeded 1 times
+
+  Scenario: The mirror follows changes GoBGP tells us about
+    Given a fake GoBGP
+    And another client has announced 192.0.2.0/24
+    When we follow GoBGP
+    And another client announces 198.51.100.0/24 and 2001:db8::/48
+    And another client withdraws 192.0.2.0/24
+    Then the mirror holds only 198.51.100.0/24 and 2001:db8::/48
+    And the mirror counts 1 IPv4 and 1 IPv6 routes
+
+  Scenario: Our own announcements are mirrored straight away
+    Given a fake GoBGP
+    When we follow GoBGP
+    And we add 192.0.2.1/32
+    Then the mirror holds only 192.0.2.1/32
+    And GoBGP is announcing only 192.0.2.1/32
+
+  Scenario: The mirror isn't trusted once GoBGP goes away
+    Given a fake GoBGP
+    When we follow GoBGP
+    And GoBGP goes away
+    Then the mirror isn't ready
+    And following GoBGP ends with a GoBGP error
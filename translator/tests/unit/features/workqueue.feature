@@ -0,0 +1,37 @@
+Feature: Applying messages with a pool of workers
+  Messages are applied concurrently, but never out of order for the same route
+
+  Scenario: Messages about a route are applied in the order they were submitted
+    Given a work queue with 4 workers that takes a random time over each message
+    When we submit an add and then a remove for each of 20 routes
+    And the work queue drains
+    Then each route's messages were applied in the order they were submitted
+    And the work queue has applied 40 messages
+
+  Scenario: A message is only counted as applied once everything before it has been
+    Given a work queue with 2 workers that holds on to messages about 192.0.2.1/32
+    When we submit messages about 192.0.2.1/32 and 192.0.2.2/32
+    And we wait 0.05 seconds
+    Then the work queue has applied 0 messages
+    When the work queue lets go of 192.0.2.1/32
+    And the work queue drains
+    Then the work queue has applied 2 messages
+
+  Scenario: A message about every route waits for the rest to be applied
+    Given a work queue with 4 workers that takes a random time over each message
+    When we submit messages about 192.0.2.1/32 and 192.0.2.2/32
+    And we submit a message about every route
+    Then the message about every route was applied last
+    And the work queue has applied 3 messages
+
+  Scenario: A GoBGP error is raised by the next call, and the message is never counted as applied
+    Given a work queue with 2 workers that fails messages about 192.0.2.1/32
+    When we submit messages about 192.0.2.1/32
+    Then draining the work queue fails with a GoBGP error
+    And the work queue has applied 0 messages
+
+  Scenario: A message that fails for any other reason is skipped
+    Given a work queue with 2 workers that breaks on messages about 192.0.2.1/32
+    When we submit messages about 192.0.2.1/32 and 192.0.2.2/32
+    And the work queue drains
+    Then the work queue has applied 2 messages
@@ -0,0 +1,96 @@
+"""Define the steps for the memory and null backends."""
+
+import ipaddress
+import time
+
+from behave import given, then, when
+from helpers import parse_routes, run
+from translator.backends import CountingBackend, MemoryBackend, make_backend
+from translator.shared import IPV4, IPV6
+
+
+def interfaces(routes):
+    """Pair each route with the (empty) event data a backend expects.
+
+    Returns:
+        list: The (ip, event_data) pairs.
+    """
+    return [(ipaddress.ip_interface(route), {}) for route in parse_routes(routes)]
+
+
+@given("a memory backend")
+def memory_backend(context):
+    """Announce routes to a table in memory, straight away."""
+    context.g = context.backend = MemoryBackend()
+
+
+@given("a memory backend that takes {call_seconds:f} seconds per call and {route_seconds:f} seconds per route")
+def slow_memory_backend(context, call_seconds, route_seconds):
+    """Announce routes to a table in memory, taking a while over it."""
+    context.g = context.backend = MemoryBackend(call_seconds, route_seconds)
+
+
+@given("a null backend")
+def null_backend(context):
+    """Announce nothing, only counting."""
+    context.g = context.backend = CountingBackend()
+
+
+@when("we make a backend")
+def make(context):
+    """Make the backend the settings ask for."""
+    context.g = context.backend = make_backend("localhost:50051")
+
+
+@when("in one call, we announce {routes}")
+def add_paths(context, routes):
+    """Announce routes all at once."""
+    run(context, context.backend.add_paths(interfaces(routes)))
+
+
+@when("in one call, we withdraw {routes}")
+def del_paths(context, routes):
+    """Withdraw routes all at once."""
+    run(context, context.backend.del_paths(interfaces(routes)))
+
+
+@then("the backend says {address} is blocked")
+def blocked(context, address):
+    """Check an announced route covers the address."""
+    assert run(context, context.backend.is_blocked(ipaddress.ip_interface(address)))
+
+
+@then("the backend says {address} isn't blocked")
+def not_blocked(context, address):
+    """Check no announced route covers the address."""
+    assert not run(context, context.backend.is_blocked(ipaddress.ip_interface(address)))
+
+
+@then("the backend counts {v4:d} IPv4 and {v6:d} IPv6 routes")
+def counts(context, v4, v6):
+    """Check the route counts, and the table sizes that go in the heartbeat."""
+    for ip_version, count in ((IPV4, v4), (IPV6, v6)):
+        assert run(context, context.backend.get_route_count(ip_version)) == count
+        table = run(context, context.backend.get_table(ip_version))
+        assert table == {"destinations": count, "paths": count}, table
+
+
+@then("the backend has announced {announced:d} routes and withdrawn {withdrawn:d}")
+def counted(context, announced, withdrawn):
+    """Check how many routes the backend was asked to announce and withdraw."""
+    routes = context.backend.routes
+    assert (routes["announced"], routes["withdrawn"]) == (announced, withdrawn), routes
+
+
+@then("announcing {routes} in one call takes at least {seconds:f} seconds")
+def takes(context, routes, seconds):
+    """Check a call takes as long as we told the backend to take over it."""
+    start = time.monotonic()
+    run(context, context.backend.add_paths(interfaces(routes)))
+    assert time.monotonic() - start >= seconds
+
+
+@then("the backend is a {name}")
+def is_a(context, name):
+    """Check which backend we made."""
+    assert type(context.backend).__name__ == name, type(context.backend)
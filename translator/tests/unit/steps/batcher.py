@@ -0,0 +1,66 @@
+"""Define the steps for PathBatcher."""
+
+import ipaddress
+
+from behave import given, then, when
+from grpc import RpcError
+from helpers import run
+from translator.backends import MemoryBackend
+from translator.batcher import PathBatcher
+
+
+class FailingBackend(MemoryBackend):
+    """A memory backend whose calls fail, as if GoBGP had gone away, once `failing` is set."""
+
+    def __init__(self):
+        """Start out failing."""
+        super().__init__()
+        self.failing = True
+
+    async def _call(self, method, routes=1):
+        await super()._call(method, routes)
+        if self.failing:
+            raise RpcError(method)
+
+
+@given("a batcher")
+def batcher(context):
+    """Batch calls to a memory backend."""
+    context.backend = MemoryBackend()
+    context.g = PathBatcher(context.backend)
+
+
+@given("a batcher whose backend fails")
+def failing_batcher(context):
+    """Batch calls to a backend that fails them."""
+    context.backend = FailingBackend()
+    context.g = PathBatcher(context.backend)
+
+
+@when("we flush the batcher")
+def flush(context):
+    """Send what's pending."""
+    run(context, context.g.flush())
+
+
+@then("the batcher says {route} is blocked")
+def blocked(context, route):
+    """Check the route is announced."""
+    assert run(context, context.g.is_blocked(ipaddress.ip_interface(route)))
+
+
+@then("adding {route} fails with a GoBGP error")
+def add_fails(context, route):
+    """Check the error from the failed batch is raised."""
+    raised = False
+    try:
+        run(context, context.g.add_path(ipaddress.ip_interface(route), {}))
+    except RpcError:
+        raised = True
+    assert raised, "No error was raised"
+
+
+@then("flushing the batcher succeeds")
+def flush_succeeds(context):
+    """Check the error was only raised once, and the failed batch was dropped."""
+    run(context, context.g.flush())
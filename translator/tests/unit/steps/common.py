@@ -0,0 +1,60 @@
+"""Define the steps shared between features."""
+
+import asyncio
+import ipaddress
+
+from behave import given, then, when
+from helpers import networks, parse_routes, run
+from translator.settings import settings
+
+
+@given("the {name} setting is {value}")
+@when("the {name} setting is {value}")
+def change_setting(context, name, value):
+    """Change a setting for the rest of the scenario."""
+    setattr(settings, name, type(getattr(settings, name))(value))
+
+
+@when("we add {routes}")
+def add(context, routes):
+    """Announce each route through context.g."""
+    for route in parse_routes(routes):
+        run(context, context.g.add_path(ipaddress.ip_interface(route), {}))
+
+
+@when("we withdraw everything")
+def withdraw_all(context):
+    """Withdraw every route through context.g."""
+    run(context, context.g.del_all_paths())
+
+
+@when("we withdraw {routes}")
+def withdraw(context, routes):
+    """Withdraw each route through context.g."""
+    for route in parse_routes(routes):
+        run(context, context.g.del_path(ipaddress.ip_interface(route), None))
+
+
+@when("we wait {seconds:f} seconds")
+def wait(context, seconds):
+    """Let everything else run for a while."""
+    run(context, asyncio.sleep(seconds))
+
+
+@then("nothing is announced")
+def nothing_announced(context):
+    """Check the backend isn't announcing anything."""
+    assert set(context.backend.rib) == set(), set(context.backend.rib)
+
+
+@then("only {routes} are announced")
+@then("only {routes} is announced")
+def only_announced(context, routes):
+    """Check the backend is announcing exactly these routes."""
+    assert set(context.backend.rib) == networks(routes), set(context.backend.rib)
+
+
+@then("the backend's {method} was called {count:d} times")
+def called(context, method, count):
+    """Check how many times a backend method was called."""
+    assert context.backend.calls[method] == count, context.backend.calls
@@ -0,0 +1,188 @@
+"""Define the steps for Fanout, applying messages to several memory backends that may fail or stall."""
+
+import asyncio
+import ipaddress
+
+from behave import given, then, when
+from grpc import RpcError
+from helpers import eventually, networks, parse_routes, run
+from translator.backends import MemoryBackend
+from translator.batcher import PathBatcher
+from translator.exceptions import TargetsDownError
+from translator.fanout import Fanout
+from translator.progress import Progress
+from translator.reconcile import Reconciler
+from translator.settings import BackendTypes, settings
+
+from translator import fanout, translator
+
+
+class FlakyBackend(MemoryBackend):
+    """A memory backend that fails every call while `failing`, and never finishes one while `stuck`."""
+
+    def __init__(self):
+        """Start working."""
+        super().__init__()
+        self.failing = False
+        self.stuck = False
+
+    async def _call(self, method, routes=1):
+        if self.failing:
+            raise RpcError(method)
+        if self.stuck:
+            await asyncio.Event().wait()
+        await super()._call(method, routes)
+
+
+def target(context, number):
+    """Return one of the fan-out's targets, numbered from 1.
+
+    Returns:
+        Target: The target.
+    """
+    return context.fanout.targets[number - 1]
+
+
+async def _apply(target, json_message):
+    await translator.apply(target, json_message, None, target.fanout)
+
+
+async def _start(context):  # noqa: RUF029 (the work queues need a running event loop)
+    context.fanout.start(_apply)
+
+
+def send(context, event_type, routes):
+    """Submit a message about each route to the fan-out, as translator.read does."""
+    for route in routes:
+        json_message = {"type": event_type, "message": {"route": route}}
+        run(context, context.fanout.submit(translator.route_key(json_message), json_message))
+
+
+@given("a fan-out to {count:d} GoBGPs")
+def fan_out(context, count):
+    """Apply messages to count memory backends, which we can make fail or stall."""
+    settings.backend = BackendTypes.MEMORY
+    context.add_cleanup(setattr, fanout, "RETRY_INTERVAL_SECONDS", fanout.RETRY_INTERVAL_SECONDS)
+    fanout.RETRY_INTERVAL_SECONDS = 0.01
+    context.progress = Progress()
+    context.fanout = Fanout([f"gobgp-{number}:50051" for number in range(1, count + 1)], context.progress)
+    for each in context.fanout.targets:
+        each.backend = FlakyBackend()
+        each.g = Reconciler(PathBatcher(each.backend))
+        # So _apply can tell translator.apply which target is the primary
+        each.fanout = context.fanout
+    run(context, _start(context))
+    context.closers.append(context.fanout.close)
+
+
+@when("GoBGP {number:d} starts failing")
+def starts_failing(context, number):
+    """Make every call to a GoBGP fail."""
+    target(context, number).backend.failing = True
+
+
+@when("GoBGP {number:d} recovers")
+def recovers(context, number):
+    """Let a GoBGP answer again."""
+    target(context, number).backend.failing = False
+
+
+@when("GoBGP {number:d} takes {seconds:f} seconds over each call")
+def slow(context, number, seconds):
+    """Make a GoBGP slow."""
+    target(context, number).backend.call_seconds = seconds
+
+
+@when("GoBGP {number:d} gets stuck")
+def stuck(context, number):
+    """Make a GoBGP never finish a call."""
+    target(context, number).backend.stuck = True
+
+
+@when("Django sends an add for each of {count:d} routes")
+def send_many(context, count):
+    """Send a burst of adds."""
+    send(context, "translator_add", [f"192.0.2.{host}/32" for host in range(count)])
+
+
+@when("Django sends an add for {routes}")
+def send_add(context, routes):
+    """Send an add for each route."""
+    send(context, "translator_add", parse_routes(routes))
+
+
+@when("Django sends a remove for {routes}")
+def send_remove(context, routes):
+    """Send a remove for each route."""
+    send(context, "translator_remove", parse_routes(routes))
+
+
+@when("the fan-out catches up")
+def catch_up(context):
+    """Wait until every GoBGP that's up has applied everything, and sent what it had batched up."""
+    run(context, context.fanout.drain())
+    run(context, context.fanout.flush())
+
+
+@when("we reconnect to Django")
+def reconnect(context):
+    """Start a new connection, as translator.main does when asked for a full replay."""
+    run(context, context.fanout.stop())
+    context.progress.begin()
+    run(context, _start(context))
+
+
+@then("GoBGP {number:d} announces only {routes}")
+def announces_only(context, number, routes):
+    """Check what a GoBGP is announcing."""
+    rib = set(target(context, number).backend.rib)
+    assert rib == networks(routes), rib
+
+
+@then("GoBGP {number:d} announces {count:d} routes")
+def announces(context, number, count):
+    """Check how many routes a GoBGP is announcing."""
+    rib = target(context, number).backend.rib
+    assert len(rib) == count, len(rib)
+
+
+@then("GoBGP {number:d} is down")
+def down(context, number):
+    """Check we've given up on a GoBGP."""
+    assert not target(context, number).up
+
+
+@then("GoBGP {number:d} is up")
+def up(context, number):
+    """Check we're sending messages to a GoBGP."""
+    assert target(context, number).up
+
+
+@then("every GoBGP has applied {count:d} messages")
+def applied(context, count):
+    """Check how far every GoBGP has got."""
+    assert context.fanout.applied == count, context.fanout.applied
+
+
+@then("not every GoBGP has applied anything")
+def not_applied(context):
+    """Check we won't acknowledge anything while a GoBGP is down."""
+    assert context.fanout.applied is None, context.fanout.applied
+
+
+@then("the fan-out asks for a full replay")
+def asks_for_replay(context):
+    """Check we'll reconnect to bring the GoBGP that's back in line."""
+    eventually(context, context.fanout.resync.is_set)
+
+
+@then("Django sending an add for {route} fails because every GoBGP is down")
+def targets_down(context, route):
+    """Check there's nobody left to send a message to."""
+    raised = False
+    try:
+        send(context, "translator_add", [route])
+    except TargetsDownError:
+        raised = True
+    assert raised, "No error was raised"
+    assert ipaddress.ip_network(route) not in target(context, 1).backend.rib
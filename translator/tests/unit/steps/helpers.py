@@ -0,0 +1,44 @@
+"""Helpers for the steps, which aren't steps themselves."""
+
+import asyncio
+import ipaddress
+import time
+
+
+def parse_routes(text):
+    """Split a list of routes, e.g. "192.0.2.1/32, 192.0.2.2/32 and 192.0.2.3/32".
+
+    Returns:
+        list[str]: The routes.
+    """
+    return [route.strip() for route in text.replace(" and ", ", ").split(",") if route.strip()]
+
+
+def networks(text):
+    """Parse a list of routes as networks.
+
+    Returns:
+        set: The networks.
+    """
+    return {ipaddress.ip_network(route) for route in parse_routes(text)}
+
+
+def run(context, coroutine):
+    """Run a coroutine on the scenario's event loop.
+
+    Returns:
+        The coroutine's result.
+    """
+    return context.loop.run_until_complete(coroutine)
+
+
+def eventually(context, condition, timeout=5.0):
+    """Let the event loop run until condition() is true, failing if it isn't within timeout seconds."""
+
+    async def wait():
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "Timed out waiting"
+            await asyncio.sleep(0.01)
+
+    run(context, wait())
@@ -0,0 +1,178 @@
+"""Define the steps for Journal, and restoring what it kept on startup."""
+
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from behave import given, then, when
+from helpers import eventually, networks, parse_routes, run
+from translator.journal import COMPACTING, JOURNAL, SNAPSHOT, Journal
+
+from translator import translator
+
+
+def record(context, event_type, message=None):
+    """Pass the journal a message from Django."""
+    context.journal.record({"type": event_type, "message": message})
+
+
+def records(path):
+    """Read the lines of one of the journal's files.
+
+    Returns:
+        list[dict]: Each line.
+    """
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def rewrite(context, change):
+    """Rewrite the journal file, passing its lines through change."""
+    context.journal._file.close()  # noqa: SLF001
+    path = Path(context.directory) / JOURNAL
+    path.write_text(change(path.read_text(encoding="utf-8")), encoding="utf-8")
+
+
+@given("a journal")
+def journal(context):
+    """Load a new journal from an empty directory."""
+    context.directory = tempfile.mkdtemp()
+    context.add_cleanup(shutil.rmtree, context.directory)
+    context.journal = Journal(context.directory)
+    context.journal.load()
+
+
+@when("Django sends the journal an add for {routes}")
+def add(context, routes):
+    """Journal an add for each route."""
+    for route in parse_routes(routes):
+        record(context, "translator_add", {"route": route})
+
+
+@when("Django sends the journal a remove for {routes}")
+def remove(context, routes):
+    """Journal a remove for each route."""
+    for route in parse_routes(routes):
+        record(context, "translator_remove", {"route": route})
+
+
+@when("Django starts reconciling with the journal")
+def reconcile_start(context):
+    """Start collecting routes."""
+    record(context, "translator_reconcile_start")
+
+
+@when("Django finishes reconciling with the journal")
+def reconcile_end(context):
+    """Journal the difference from what we had."""
+    record(context, "translator_reconcile_end")
+
+
+@when("the journal checkpoints event {seq:d}")
+def checkpoint(context, seq):
+    """Acknowledge an event, which may start a compaction."""
+
+    async def checkpoint():  # noqa: RUF029 (a compaction needs a running event loop)
+        context.journal.checkpoint(seq)
+
+    run(context, checkpoint())
+
+
+@when("the journal finishes compacting")
+def compacted(context):
+    """Wait for the compaction to finish."""
+    eventually(context, lambda: context.journal._compaction is None)  # noqa: SLF001
+
+
+@when("the journal's last line is cut short")
+def cut_short(context):
+    """Add half a line, as if we'd stopped while writing it."""
+    rewrite(context, lambda text: text + '{"op": "add", "data": {"route": "198.51')
+
+
+@when("the journal's line {number:d} is corrupted")
+def corrupt(context, number):
+    """Replace a line with one we can't read."""
+
+    def change(text):
+        lines = text.splitlines(keepends=True)
+        lines[number - 1] = "garbage\n"
+        return "".join(lines)
+
+    rewrite(context, change)
+
+
+@when("we're stopped part way through compacting")
+def interrupted(context):
+    """Leave the journal as a compaction would have if it was stopped before writing the snapshot."""
+    context.journal._file.close()  # noqa: SLF001
+    directory = Path(context.directory)
+    (directory / JOURNAL).replace(directory / COMPACTING)
+    (directory / JOURNAL).touch()
+
+
+@when("we restart")
+def restart(context):
+    """Load the journal again, as we would on startup."""
+    context.journal = Journal(context.directory)
+    context.journal.load()
+
+
+@when("we restore a fan-out to {count:d} GoBGPs from the journal")
+def restore(context, count):
+    """Announce what the journal says, as translator.main does before connecting to Django."""
+    context.execute_steps(f"Given a fan-out to {count} GoBGPs")
+    run(context, translator.restore(context.fanout, context.progress, context.journal))
+
+
+@then("the journal has only {routes}")
+def has_only(context, routes):
+    """Check which routes the journal says we should be announcing."""
+    assert set(context.journal.routes) == {str(network) for network in networks(routes)}, context.journal.routes
+
+
+@then("the journal has nothing")
+def has_nothing(context):
+    """Check the journal says we shouldn't be announcing anything."""
+    assert context.journal.routes == {}, context.journal.routes
+
+
+@then("the journal resumes from event {seq:d}")
+def resumes_from(context, seq):
+    """Check the last event the journal says we acknowledged."""
+    assert context.journal.last_seq == seq, context.journal.last_seq
+
+
+@then("the journal resumes from the start")
+def resumes_from_start(context):
+    """Check the journal doesn't know of any event we acknowledged."""
+    assert context.journal.last_seq is None, context.journal.last_seq
+
+
+@then("the snapshot holds only {routes}, as of event {seq:d}")
+def snapshot(context, routes, seq):
+    """Check the snapshot."""
+    lines = records(Path(context.directory) / SNAPSHOT)
+    assert {"op": "seq", "seq": seq} in lines, lines
+    added = {line["data"]["route"] for line in lines if line["op"] == "add"}
+    assert added == set(parse_routes(routes)), added
+
+
+@then("the journal is empty")
+def empty(context):
+    """Check everything is in the snapshot."""
+    assert (Path(context.directory) / JOURNAL).stat().st_size == 0
+
+
+@then("there's no compaction left over")
+def no_compaction(context):
+    """Check the old journal was folded into the snapshot."""
+    assert not (Path(context.directory) / COMPACTING).exists()
+
+
+@then("GoBGP {number:d} announces nothing")
+def announces_nothing(context, number):
+    """Check a GoBGP isn't announcing anything."""
+    rib = set(context.fanout.targets[number - 1].backend.rib)
+    assert rib == set(), rib
@@ -0,0 +1,68 @@
+"""Define the steps for Progress."""
+
+from behave import given, then, when
+from translator.progress import Progress
+
+
+@given("we've applied nothing yet")
+def progress(context):
+    """Start keeping track of what we've applied."""
+    context.progress = Progress()
+
+
+@when("we read a message without an event number as item {number:d}")
+def read_unnumbered(context, number):
+    """Note a message Django didn't number, as a WorkQueue item."""
+    context.progress.read(number, None)
+
+
+@when("we read event {seq:d} as item {number:d}")
+@when("we read event {seq:d} as items up to {number:d}")
+def read(context, seq, number):
+    """Note an event, as WorkQueue items up to number."""
+    context.progress.read(number, seq)
+
+
+@when("we acknowledge event {seq:d}")
+def acknowledge(context, seq):
+    """Record that we've told Django we've applied an event, as the translator does."""
+    context.progress.last_seq = seq
+
+
+@when("we begin a new connection")
+def begin(context):
+    """Start a new connection."""
+    context.progress.begin()
+
+
+@when("we reset our progress")
+def reset(context):
+    """Forget everything."""
+    context.progress.reset()
+
+
+@then("applying up to item {number:d} acknowledges nothing")
+def acknowledges_nothing(context, number):
+    """Check there's nothing new to acknowledge."""
+    seq = context.progress.applied(number)
+    assert seq is None, seq
+
+
+@then("applying up to item {number:d} acknowledges event {seq:d}")
+def acknowledges(context, number, seq):
+    """Check which event we'd acknowledge, and acknowledge it."""
+    applied = context.progress.applied(number)
+    assert applied == seq, applied
+    context.progress.last_seq = applied
+
+
+@then("we resume from event {seq:d}")
+def resume_from(context, seq):
+    """Check which event we'd ask Django to resume from."""
+    assert context.progress.last_seq == seq, context.progress.last_seq
+
+
+@then("we resume from the start")
+def resume_from_start(context):
+    """Check we'd ask Django for every active entry."""
+    assert context.progress.last_seq is None, context.progress.last_seq
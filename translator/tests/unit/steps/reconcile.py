@@ -0,0 +1,108 @@
+"""Define the steps for Reconciler."""
+
+import ipaddress
+
+from behave import given, then, when
+from helpers import networks, parse_routes, run
+from translator.backends import MemoryBackend
+from translator.batcher import PathBatcher
+from translator.reconcile import Reconciler
+
+
+@given("a reconciler with {routes} announced")
+def reconciler(context, routes):
+    """Reconcile a memory backend that's already announcing some routes."""
+    context.backend = MemoryBackend()
+    for network in networks(routes):
+        context.backend.rib.add(network)
+    context.g = Reconciler(PathBatcher(context.backend))
+
+
+class RecordingBackend(MemoryBackend):
+    """A memory backend that remembers the event data each route was last announced with."""
+
+    def __init__(self):
+        """Start with nothing announced."""
+        super().__init__()
+        self.event_data = {}
+
+    async def add_paths(self, routes):
+        """Announce many routes, remembering their event data."""
+        await super().add_paths(routes)
+        for ip, event_data in routes:
+            self.event_data[ip.network] = event_data
+
+
+def replayed(route, community):
+    """Return a route, and the event data Django would send it with.
+
+    Returns:
+        tuple: The route as an ip_interface, and the event data.
+    """
+    return ipaddress.ip_interface(route), {"route": route, "community": community}
+
+
+@given("a reconciler that has announced {routes} with community {community:d}")
+def announced_reconciler(context, routes, community):
+    """Reconcile a memory backend that we've announced some routes to, and forget that we called it."""
+    context.backend = RecordingBackend()
+    context.g = Reconciler(PathBatcher(context.backend))
+    for route in parse_routes(routes):
+        run(context, context.g.add_path(*replayed(route, community)))
+    run(context, context.g.flush())
+    context.backend.calls.clear()
+    context.backend.routes.clear()
+
+
+@when("Django replays {routes} with community {community:d}")
+def replay(context, routes, community):
+    """Send routes with their event data, as Django does in a replay."""
+    for route in parse_routes(routes):
+        run(context, context.g.add_path(*replayed(route, community)))
+
+
+@when("we start reconciling")
+def begin(context):
+    """Start collecting routes."""
+    context.g.begin()
+
+
+@when("we cancel reconciling")
+def cancel(context):
+    """Stop collecting routes without applying them."""
+    context.g.cancel()
+
+
+@when("we finish reconciling")
+def end(context):
+    """Apply the difference between the routes we collected and what's announced."""
+    context.result = run(context, context.g.end())
+
+
+@when("we flush the reconciler")
+def flush(context):
+    """Send whatever the batcher has pending."""
+    run(context, context.g.flush())
+
+
+@then("the reconciliation wanted {desired:d} routes, added {added:d} and removed {removed:d}")
+def result(context, desired, added, removed):
+    """Check what the reconciliation did."""
+    assert (context.result["desired"], context.result["added"], context.result["removed"]) == (
+        desired,
+        added,
+        removed,
+    ), context.result
+
+
+@then("the reconciliation changed {changed:d} routes")
+def changed(context, changed):
+    """Check how many routes were announced again with new event data."""
+    assert context.result["changed"] == changed, context.result
+
+
+@then("{route} was last announced with community {community:d}")
+def announced_with(context, route, community):
+    """Check the event data a route was last announced with."""
+    event_data = context.backend.event_data[ipaddress.ip_network(route)]
+    assert event_data["community"] == community, event_data
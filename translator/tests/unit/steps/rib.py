@@ -0,0 +1,109 @@
+"""Define the steps for RibMirror, and GoBGP keeping it current from the WatchEvent stream."""
+
+import asyncio
+import ipaddress
+
+from behave import given, then, when
+from fake_gobgp import serve
+from grpc import RpcError
+from helpers import eventually, networks, parse_routes, run
+from translator.gobgp import GoBGP
+
+from translator import gobgp
+
+
+async def _connect(address):  # noqa: RUF029
+    # The channel binds to the running event loop, so it has to be created from within it
+    return GoBGP(address)
+
+
+@given("a fake GoBGP")
+def fake_gobgp(context):
+    """Start a fake GoBGP, and connect to it as the translator and as another client."""
+    context.server, context.fake, address = run(context, serve())
+    context.gobgp = run(context, _connect(address))
+    context.other = run(context, _connect(address))
+    context.g = context.backend = context.gobgp
+    context.closers += [lambda: context.server.stop(None), context.gobgp.close, context.other.close]
+    # The fake doesn't say when a watch has started, so don't wait long for it to
+    context.add_cleanup(setattr, gobgp, "WATCH_SETUP_SECONDS", gobgp.WATCH_SETUP_SECONDS)
+    gobgp.WATCH_SETUP_SECONDS = 0.05
+
+
+@given("another client has announced {routes}")
+@when("another client announces {routes}")
+def other_announces(context, routes):
+    """Announce routes to GoBGP behind our back."""
+    for route in parse_routes(routes):
+        run(context, context.other.add_path(ipaddress.ip_interface(route), {}))
+
+
+@when("another client withdraws {routes}")
+def other_withdraws(context, routes):
+    """Withdraw routes from GoBGP behind our back."""
+    for route in parse_routes(routes):
+        run(context, context.other.del_path(ipaddress.ip_interface(route), {}))
+
+
+@when("we follow GoBGP")
+def follow(context):
+    """Start mirroring GoBGP, and wait until the mirror is ready."""
+    context.following = context.loop.create_task(context.gobgp.follow())
+
+    async def stop():
+        # Before we close the channel, which would end it with an error nobody's waiting for
+        context.following.cancel()
+        await asyncio.gather(context.following, return_exceptions=True)
+
+    context.closers.append(stop)
+    eventually(context, lambda: context.gobgp.rib.ready)
+
+
+@when("GoBGP goes away")
+def goes_away(context):
+    """Stop the fake GoBGP."""
+    run(context, context.server.stop(None))
+
+
+@then("the mirror holds only {routes}")
+def mirror_holds(context, routes):
+    """Check the mirror has exactly these networks, once it's caught up."""
+    eventually(context, lambda: set(context.gobgp.rib) == networks(routes))
+
+
+@then("the mirror counts {v4:d} IPv4 and {v6:d} IPv6 routes")
+def mirror_counts(context, v4, v6):
+    """Check the mirror's count of each IP version."""
+    assert (context.gobgp.rib.count(4), context.gobgp.rib.count(6)) == (v4, v6)
+
+
+@then("the mirror covers {covered} but not {uncovered}")
+def mirror_covers(context, covered, uncovered):
+    """Check which addresses the mirror's networks contain."""
+    assert context.gobgp.rib.covers(covered)
+    assert not context.gobgp.rib.covers(uncovered)
+
+
+@then("the mirror has been seeded {count:d} times")
+def mirror_seeded(context, count):
+    """Check how many times the mirror has been replaced with GoBGP's table."""
+    assert context.gobgp.rib.generation == count
+
+
+@then("GoBGP is announcing only {routes}")
+def gobgp_announcing(context, routes):
+    """Check the fake GoBGP's own table."""
+    assert {ipaddress.ip_network(network) for network in context.fake.table} == networks(routes)
+
+
+@then("the mirror isn't ready")
+def mirror_not_ready(context):
+    """Check the mirror has stopped answering for GoBGP."""
+    eventually(context, lambda: not context.gobgp.rib.ready)
+
+
+@then("following GoBGP ends with a GoBGP error")
+def follow_fails(context):
+    """Check the watch ended because GoBGP went away, so Fanout knows to start it again."""
+    eventually(context, context.following.done)
+    assert isinstance(context.following.exception(), RpcError)
@@ -0,0 +1,138 @@
+"""Define the steps for WorkQueue."""
+
+import asyncio
+import random
+
+from behave import given, then, when
+from grpc import RpcError
+from helpers import parse_routes, run
+from translator.workqueue import WorkQueue
+
+
+def work_queue(context, workers, apply):
+    """Start a work queue applying messages with apply, and recording them in context.applied."""
+    context.applied = []
+
+    async def record(item):
+        await apply(item)
+        context.applied.append(item)
+
+    async def start():  # noqa: RUF029 (the workers need a running event loop)
+        context.queue.start()
+
+    context.queue = WorkQueue(record, workers=workers, size=100)
+    run(context, start())
+    context.closers.append(context.queue.stop)
+
+
+@given("a work queue with {workers:d} workers that takes a random time over each message")
+def random_work_queue(context, workers):
+    """Apply messages after a random delay, so the workers finish out of order."""
+    rng = random.Random(0)  # noqa: S311
+
+    async def apply(item):
+        await asyncio.sleep(rng.uniform(0, 0.005))
+
+    work_queue(context, workers, apply)
+
+
+@given("a work queue with {workers:d} workers that holds on to messages about {route}")
+def holding_work_queue(context, workers, route):
+    """Apply messages straight away, except those about the route, which wait until we let go of them."""
+    context.held = asyncio.Event()
+
+    async def apply(item):
+        if item[0] == route:
+            await context.held.wait()
+
+    work_queue(context, workers, apply)
+
+
+@given("a work queue with {workers:d} workers that fails messages about {route}")
+def failing_work_queue(context, workers, route):
+    """Apply messages straight away, except those about the route, which GoBGP fails."""
+
+    async def apply(item):  # noqa: RUF029
+        if item[0] == route:
+            raise RpcError(route)
+
+    work_queue(context, workers, apply)
+
+
+@given("a work queue with {workers:d} workers that breaks on messages about {route}")
+def breaking_work_queue(context, workers, route):
+    """Apply messages straight away, except those about the route, which we can't apply at all."""
+
+    async def apply(item):  # noqa: RUF029
+        if item[0] == route:
+            raise ValueError(route)
+
+    work_queue(context, workers, apply)
+
+
+@when("we submit an add and then a remove for each of {count:d} routes")
+def submit_adds_and_removes(context, count):
+    """Submit an add for each route, each followed some time later by a remove."""
+    routes = [f"192.0.2.{host}/32" for host in range(count)]
+    for action in ("add", "remove"):
+        for route in routes:
+            run(context, context.queue.submit(route, (route, action)))
+
+
+@when("we submit messages about {routes}")
+def submit(context, routes):
+    """Submit a message about each route."""
+    for route in parse_routes(routes):
+        run(context, context.queue.submit(route, (route, "add")))
+
+
+@when("we submit a message about every route")
+def submit_everything(context):
+    """Submit a message that isn't about any one route, which waits for the others."""
+    run(context, context.queue.submit(None, (None, "remove_all")))
+
+
+@when("the work queue drains")
+def drain(context):
+    """Wait until everything queued has been applied."""
+    run(context, context.queue.drain())
+
+
+@when("the work queue lets go of {route}")
+def let_go(context, route):
+    """Let the messages we were holding on to be applied."""
+    context.held.set()
+
+
+@then("each route's messages were applied in the order they were submitted")
+def in_order(context):
+    """Check every route's add was applied before its remove."""
+    actions = {}
+    for route, action in context.applied:
+        actions.setdefault(route, []).append(action)
+    assert all(applied == ["add", "remove"] for applied in actions.values()), actions
+    # With random delays, the workers can't all have finished in the order the messages were submitted
+    assert [route for route, _ in context.applied] != sorted(route for route, _ in context.applied)
+
+
+@then("the message about every route was applied last")
+def everything_last(context):
+    """Check the message about every route waited for the others."""
+    assert context.applied[-1] == (None, "remove_all"), context.applied
+
+
+@then("the work queue has applied {count:d} messages")
+def applied(context, count):
+    """Check how many messages have been applied along with everything before them."""
+    assert context.queue.applied == count, context.queue.applied
+
+
+@then("draining the work queue fails with a GoBGP error")
+def drain_fails(context):
+    """Check the GoBGP error is raised."""
+    raised = False
+    try:
+        run(context, context.queue.drain())
+    except RpcError:
+        raised = True
+    assert raised, "No error was raised"